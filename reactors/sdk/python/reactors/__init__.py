@@ -0,0 +1,20 @@
+"""
+TACC Reactors SDK
+
+Submodules are imported on first attribute access, so `import reactors`
+costs almost nothing.
+"""
+import importlib
+
+SUBMODULES = ('agaveutils', 'aio', 'aliases', 'aliasindex', 'cache',
+              'circuit', 'claimcheck', 'codec', 'executions', 'hostinfo',
+              'identity', 'idempotency', 'jsonmessages', 'lazyimport',
+              'logtypes', 'outbox', 'process', 'ratelimit', 'runtime',
+              'scatter', 'storage', 'uniqueid', 'utils', 'zygote')
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module '{}' has no attribute '{}'".format(
+        __name__, name))
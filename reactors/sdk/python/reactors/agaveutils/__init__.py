@@ -1,6 +1,7 @@
 from . import entity
 from . import recursive
-from .utils import get_api_server, get_api_token, get_api_username
+from .utils import get_api_server, get_api_token, get_api_username, \
+    size_connection_pool
 from .reactors import message_reactor
 from .files import agave_mkdir, agave_download_file, agave_upload_file, \
     wait_for_file_status, process_agave_httperror
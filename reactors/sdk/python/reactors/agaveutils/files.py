@@ -8,6 +8,8 @@ from random import random
 from agavepy.agave import Agave, AgaveError
 from requests.exceptions import HTTPError
 
+from .. import ratelimit
+
 PWD = os.getcwd()
 MAX_ELAPSED = 300
 MAX_RETRIES = 5
@@ -39,7 +41,7 @@ def get(agaveClient, agaveAbsolutePath, systemId, localFilename,
                                     localFilename)
             return f
         except Exception:
-            if attempt < retries:
+            if attempt < retries and ratelimit.allow_retry('files'):
                 attempt = attempt + 1
                 time.sleep(pause)
                 pause = pause * multiplier
@@ -70,7 +72,7 @@ def mkdir(agaveClient, dirName, systemId, basePath='/',
                         basePath)
             return True
         except Exception:
-            if attempt < retries:
+            if attempt < retries and ratelimit.allow_retry('files'):
                 attempt = attempt + 1
                 time.sleep(pause)
                 pause = pause * multiplier
@@ -139,6 +141,7 @@ def agave_mkdir(agaveClient, dirName, systemId, basePath='/',
     nothing if all directories are already in place.
     """
     try:
+        ratelimit.request('files')
         agaveClient.files.manage(systemId=systemId,
                                  body={'action': 'mkdir', 'path': dirName},
                                  filePath=basePath)
@@ -167,6 +170,7 @@ def agave_download_file(agaveClient,
     downloadFileName = os.path.join(PWD, localFilename)
     with open(downloadFileName, 'wb') as f:
         try:
+            ratelimit.request('files')
             rsp = agaveClient.files.download(systemId=systemId,
                                              filePath=agaveAbsolutePath)
         except HTTPError as h:
@@ -205,6 +209,7 @@ def agave_upload_file(agaveClient,
     # that file, then do a mv operation at the end. Formally, its no differnt
     # for provenance than uploading in place.
     try:
+        ratelimit.request('files')
         agaveClient.files.importData(systemId=systemId,
                                      filePath=agaveDestPath,
                                      fileToUpload=open(uploadFile))
@@ -253,6 +258,7 @@ def wait_for_file_status(agaveClient, agaveWatchPath,
 
     while (time.time() < expires):
         try:
+            ratelimit.request('files')
             hist = agaveClient.files.getHistory(systemId=systemId,
                                                 filePath=agaveWatchPath)
             stat = hist[-1]['status']
@@ -7,6 +7,8 @@ import time
 from agavepy.agave import Agave
 from attrdict import AttrDict
 
+from .. import ratelimit
+
 
 MAX_ELAPSED = 300
 MAX_RETRIES = 5
@@ -39,6 +41,7 @@ def message_reactor(agaveClient, actorId, message,
 
     execution = {}
     try:
+        ratelimit.request('actors')
         execution = agaveClient.actors.sendMessage(actorId=actorId,
                                                    body={'message': message},
                                                    environment=pass_envs)
@@ -2,8 +2,9 @@
 import os
 import sys
 import logging
-from time import sleep
-from random import random
+
+from .. import ratelimit
+from ..logtypes import add_stderr_handler
 
 __version__ = '0.1.0'
 
@@ -30,10 +31,7 @@ class PemAgent(object):
         self.client = agaveClient
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(loglevel)
-        stderrLogger = logging.StreamHandler()
-        stderrLogger.setFormatter(
-            logging.Formatter(FORMAT, datefmt=DATEFORMAT))
-        self.logger.addHandler(stderrLogger)
+        add_stderr_handler(self.logger, FORMAT, DATEFORMAT)
         self.version = __version__
 
     def grant(self, system, abspath, username='world',
@@ -78,13 +76,13 @@ class PemAgent(object):
         '''Send an pems update request'''
 
         try:
+            # pace pems calls through the process-wide files limiter
+            ratelimit.request('files')
             self.client.files.updatePermissions(systemId=system,
                                                 filePath=fpath,
                                                 body={'username': username,
                                                       'permission': pem,
                                                       'recursive': rec})
-            # introduce pseudo-random delay between pems calls
-            sleep(0.5 * random())
         except Exception as e:
             if permissive is True:
                 self.logger.error(
@@ -105,6 +103,7 @@ class PemAgent(object):
     def listdir(self, system, fpath):
         dirs, files, links = [], [], []
         try:
+            ratelimit.request('files')
             for file_obj in self.client.files.list(systemId=system,
                                                    filePath=fpath):
                     if file_obj['format'] == 'folder':
@@ -78,3 +78,51 @@ def get_api_username(ag):
     else:
         print("No username could be determined")
         return None
+
+
+def size_connection_pool(ag, maxsize):
+    '''Let up to maxsize threads share the client's keep-alive connections
+
+    AgavePy sends every request through one requests.Session, whose
+    default pool keeps only 10 connections per host. The session's own
+    adapters are resized in place, so their retry and other settings are
+    kept. AgavePy builds a new session when it refreshes its resources,
+    so the size is applied again after each refresh. Returns True if the
+    pool was resized.
+    '''
+    # Agave answers any unknown attribute, so read ours from __dict__
+    if maxsize > vars(ag).get('_reactors_pool_size', 0):
+        ag._reactors_pool_size = maxsize
+    _reapply_after_refresh(ag)
+    return _resize_session(ag, ag._reactors_pool_size)
+
+
+def _resize_session(ag, maxsize):
+    try:
+        session = ag.all.http_client.session
+    except Exception:
+        return False
+    for prefix in ('https://', 'http://'):
+        adapter = session.get_adapter(prefix)
+        if not hasattr(adapter, 'init_poolmanager') or \
+                getattr(adapter, '_pool_maxsize', 0) >= maxsize:
+            continue
+        # Connections already checked out of the old pool finish normally
+        adapter._pool_connections = maxsize
+        adapter._pool_maxsize = maxsize
+        adapter.init_poolmanager(maxsize, maxsize,
+                                 block=getattr(adapter, '_pool_block', False))
+    return True
+
+
+def _reapply_after_refresh(ag):
+    refresh = getattr(ag, 'refresh_aris', None)
+    if refresh is None or getattr(refresh, '_reactors_pool_sizing', False):
+        return
+
+    def refresh_aris(*args, **kwargs):
+        result = refresh(*args, **kwargs)
+        _resize_session(ag, ag._reactors_pool_size)
+        return result
+    refresh_aris._reactors_pool_sizing = True
+    ag.refresh_aris = refresh_aris
@@ -0,0 +1,267 @@
+"""
+Non-blocking Abaco messaging for reactors built on asyncio
+
+Messages are posted directly to the Abaco messages endpoint over one
+aiohttp session, so thousands of sends can be in flight on a single
+event loop. Alias resolution, sender tags, and retries with jittered
+exponential backoff behave as they do in Reactor.send_message.
+
+Requires Python 3.5+ and aiohttp.
+
+Usage:
+    async with r.aio:
+        execution_id = await r.aio.send_message('my-alias', {'key': 'value'})
+"""
+import asyncio
+import os
+
+import aiohttp
+
+from agavepy.agave import AgaveError
+
+from . import idempotency, identity, ratelimit
+from .circuit import OPEN
+from .utils import MAX_RETRIES, next_retry_delay
+
+# Ceiling on simultaneous connections held by the session
+MAX_CONNECTIONS = 100
+MESSAGES_PATH = '/actors/v2/{}/messages'
+
+
+class AsyncMessenger(object):
+    """
+    Asyncio counterpart to Reactor.send_message and send_messages
+
+    Positional parameters:
+    reactor - Reactor - supplies the API client, aliases, and logger
+
+    Keyword parameters:
+    max_connections - int - maximum concurrent connections to the API
+    """
+
+    def __init__(self, reactor, max_connections=MAX_CONNECTIONS):
+        self.reactor = reactor
+        self.max_connections = max_connections
+        # Build these now rather than from inside the event loop
+        self.logger = reactor.logger
+        self.client = reactor.client
+        self.breaker = reactor.circuit_breaker
+        self.limiter = ratelimit.get_limiter('actors')
+        self.message_codec = reactor.message_codec
+        self.claim_check = reactor.claim_check
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        # A session is bound to the loop it was made on, so make a new one
+        # if the caller has moved to a different loop
+        loop = asyncio.get_event_loop()
+        if self._session is None or self._session.closed or \
+                self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections))
+            self._loop = loop
+        return self._session
+
+    def _messages_url(self, actor_id):
+        api_server = os.environ.get('_abaco_api_server',
+                                    getattr(self.client, 'api_server', None))
+        if not api_server:
+            raise AgaveError('Unable to determine API server')
+        return api_server.rstrip('/') + MESSAGES_PATH.format(actor_id)
+
+    def _headers(self):
+        headers = {'Content-Type': 'application/json'}
+        token = identity.get_token(self.client)
+        if token:
+            headers['Authorization'] = 'Bearer {}'.format(token)
+        return headers
+
+    async def send_message(self, actorId, message, environment={},
+                           ignoreErrors=True, senderTags=True,
+                           retryMaxAttempts=MAX_RETRIES, retryDelay=1,
+                           idempotencyKey=None):
+        """
+        Send a message to an Abaco actor by ID, platform alias, or alias
+
+        Takes the same arguments as Reactor.send_message, except sync and
+        outbox.
+
+        Returns:
+            str: The excecutionId of the resulting execution
+
+        Raises:
+            AgaveError: Raised if ignoreErrors is False
+        """
+        try:
+            # Resolving an alias may call the metadata service, and
+            # compressing or claim checking a message takes a while, so
+            # keep them off the loop
+            resolved_actor_id, environment_vars, message = \
+                await self._run_blocking(self._prepare, actorId, message,
+                                         environment, senderTags,
+                                         idempotencyKey)
+            return await self._send_with_retries(resolved_actor_id, message,
+                                                 environment_vars,
+                                                 retryMaxAttempts, retryDelay)
+        except AgaveError as err:
+            if ignoreErrors:
+                self.logger.error(str(err))
+            else:
+                raise
+
+    def _prepare(self, actorId, message, environment, senderTags,
+                 idempotencyKey):
+        """Resolve the recipient, build the environment, encode a message"""
+        self.logger.info("Message.to: {}".format(actorId))
+        self.logger.debug("Message.body: {}".format(message))
+        environment_vars = self.reactor._get_environment(
+            dict(environment), senderTags=senderTags)
+        resolved_actor_id = self.reactor.resolve_actor_alias(actorId)
+        self.reactor._set_idempotency_key(environment_vars, resolved_actor_id,
+                                          message, idempotencyKey)
+        return (resolved_actor_id, environment_vars,
+                self.reactor._encode_message(message))
+
+    async def _run_blocking(self, func, *args):
+        """Run a blocking call on the loop's default executor"""
+        return await asyncio.get_event_loop().run_in_executor(None, func,
+                                                              *args)
+
+    async def _breaker(self, method, actor_id):
+        """Call a circuit breaker method, off the loop if it uses a file"""
+        call = getattr(self.breaker, method)
+        if self.breaker.shared:
+            return await self._run_blocking(call, actor_id)
+        return call(actor_id)
+
+    async def send_messages(self, messages, senderTags=True,
+                            retryMaxAttempts=MAX_RETRIES, retryDelay=1,
+                            idempotencyKey=None):
+        """
+        Send many messages concurrently
+
+        If ratelimit.rate is set in config.yml, sends are paced to that
+        many per second, however many are in flight.
+
+        Arguments:
+            messages (list): (actorId, message) or
+                             (actorId, message, environment) tuples
+
+        Keyword Arguments:
+            idempotencyKey: bool - as for Reactor.send_messages. A string
+                    raises TypeError.
+
+        Returns:
+            list: For each message, in input order, its executionId or the
+            AgaveError raised while sending it
+        """
+        idempotency.check_bulk_key(idempotencyKey)
+        sends = []
+        for item in messages:
+            environment = {}
+            if len(item) > 2 and item[2] is not None:
+                environment = item[2]
+            sends.append(self.send_message(item[0], item[1],
+                                           environment=environment,
+                                           ignoreErrors=False,
+                                           senderTags=senderTags,
+                                           retryMaxAttempts=retryMaxAttempts,
+                                           retryDelay=retryDelay,
+                                           idempotencyKey=idempotencyKey))
+        return await asyncio.gather(*sends, return_exceptions=True)
+
+    async def _send_with_retries(self, resolved_actor_id, message,
+                                 environment_vars, retryMaxAttempts,
+                                 retryDelay):
+        retry = retryDelay
+        attempts = 0
+        exceptions = []
+        noexecid_err = 'Response received from {} but no executionId was found'
+        http_err = 'HTTP {} messaging {}: {}'
+        exception_err = 'Exception encountered messaging {}'
+        terminal_err = 'Message to {} failed after {} tries with errors: {}'
+        open_err = 'Message to {} not sent: circuit open after {} ' + \
+            'consecutive failures'
+        budget_err = 'Message to {} not retried: actors retry budget ' + \
+            'spent. Errors: {}'
+
+        url = self._messages_url(resolved_actor_id)
+        params = dict((k, str(v)) for (k, v) in environment_vars.items())
+        session = self._get_session()
+
+        # Wait for the shared rate limiter without blocking the loop
+        await asyncio.sleep(self.limiter.reserve_request())
+        if not await self._breaker('allow', resolved_actor_id):
+            raise AgaveError(open_err.format(resolved_actor_id,
+                                             self.breaker.threshold))
+        counted = True
+        while attempts <= retryMaxAttempts:
+            # Stop retrying if another send has opened the circuit
+            if attempts > 0 and \
+                    await self._breaker('state', resolved_actor_id) == OPEN:
+                raise AgaveError(open_err.format(resolved_actor_id,
+                                                 self.breaker.threshold))
+            try:
+                async with session.post(url, params=params,
+                                        json={'message': message},
+                                        headers=self._headers()) as resp:
+                    if resp.status == 404:
+                        # Agave never returns 404 unless the thing isn't
+                        # there so might as well bail out early
+                        exceptions.append(http_err.format(
+                            resp.status, resolved_actor_id,
+                            await resp.text()))
+                        attempts = retryMaxAttempts + 1
+                        counted = False
+                    elif resp.status >= 400:
+                        self.logger.error(http_err.format(
+                            resp.status, resolved_actor_id,
+                            await resp.text()))
+                    else:
+                        body = await resp.json(content_type=None)
+                        result = {}
+                        if isinstance(body, dict):
+                            result = body.get('result', body) or {}
+                        execution_id = None
+                        if isinstance(result, dict):
+                            execution_id = result.get('executionId')
+                        if execution_id is not None:
+                            await self._breaker('success',
+                                                resolved_actor_id)
+                            return execution_id
+                        self.logger.error(
+                            noexecid_err.format(resolved_actor_id))
+            except (aiohttp.ClientError, asyncio.TimeoutError,
+                    ValueError) as e:
+                exceptions.append(e)
+                self.logger.error(exception_err.format(resolved_actor_id))
+
+            attempts = attempts + 1
+            if attempts <= retryMaxAttempts:
+                wait = self.limiter.reserve_retry()
+                if wait is None:
+                    await self._breaker('failure', resolved_actor_id)
+                    raise AgaveError(budget_err.format(resolved_actor_id,
+                                                       exceptions))
+                self.logger.debug('pause {} sec then try again'.format(retry))
+                await asyncio.sleep(retry + wait)
+                retry = next_retry_delay(retry)
+
+        if counted:
+            await self._breaker('failure', resolved_actor_id)
+        raise AgaveError(terminal_err.format(resolved_actor_id,
+                                             retryMaxAttempts,
+                                             exceptions))
+
+    async def close(self):
+        """Close the HTTP session and its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
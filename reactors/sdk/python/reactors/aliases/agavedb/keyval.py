@@ -26,6 +26,15 @@ from agavepy.agave import AgaveError
 sys.path.insert(0, os.path.dirname(__file__))
 import uniqueid
 
+try:
+    # Shared with the Reactors SDK when running inside it
+    from reactors import identity, ratelimit
+    from reactors.logtypes import add_stderr_handler
+except ImportError:
+    identity = None
+    ratelimit = None
+    add_stderr_handler = None
+
 __version__ = '0.15a'
 
 PREFIX = 'kvs_v3'
@@ -34,11 +43,41 @@ SEP = '/'
 TTL = 86400
 VALID_PEMS = ['read', 'write', 'execute']
 VALID_ROLE_USERNAMES = ['world', 'public']
+# Metadata objects fetched per listMetadata call by _query
+LIST_PAGE = 1000
 
 _MAX_VAL_BYTES = 32768
 _MIN_KEY_BYTES = 4
 _MAX_KEY_BYTES = 2048
 _RE_KEY_NAMES = re.compile('^[\S]+$', re.UNICODE)
+LOGGER = 'AgaveKeyValStore'
+LOG_FORMAT = "[%(levelname)s] %(asctime)s: %(message)s"
+LOG_DATEFORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _get_logger(name, level):
+    '''Logger for one store under a parent that holds the STDERR handler
+
+    Stores are named by their prefixes, so each kind of store keeps its
+    own level while every one of them prints through one handler.
+    '''
+    parent = logging.getLogger(LOGGER)
+    if add_stderr_handler is not None:
+        add_stderr_handler(parent, LOG_FORMAT, LOG_DATEFORMAT)
+    elif len(parent.handlers) == 0:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT,
+                                               datefmt=LOG_DATEFORMAT))
+        parent.addHandler(handler)
+    logger = parent.getChild(name)
+    logger.setLevel(level)
+    return logger
+
+
+def _pace():
+    '''Wait on the SDK's meta rate limiter, if running inside the SDK'''
+    if ratelimit is not None:
+        ratelimit.request('meta')
 
 
 class AgaveKeyValStore(object):
@@ -53,14 +92,8 @@ class AgaveKeyValStore(object):
         self.prefix = keyPrefix
         self.alias_prefix = aliasPrefix
         self.separator = SEP
-        FORMAT = "[%(levelname)s] %(asctime)s: %(message)s"
-        DATEFORMAT = "%Y-%m-%dT%H:%M:%SZ"
-        self.logging = logging.getLogger('AgaveKeyValStore')
-        stderrLogger = logging.StreamHandler()
-        stderrLogger.setLevel(logLevel)
-        stderrLogger.setFormatter(
-            logging.Formatter(FORMAT, datefmt=DATEFORMAT))
-        self.logging.addHandler(stderrLogger)
+        name = '{}{}'.format(keyPrefix, aliasPrefix).replace('.', '_')
+        self.logging = _get_logger(name, logLevel)
 
     def set(self, key, value):
         '''Set the string or numeric value of a key'''
@@ -78,6 +111,10 @@ class AgaveKeyValStore(object):
             self.logging.debug("get failed {}".format(e))
             raise ValueError("Failed to get value of {}: {}".format(key, e))
 
+    def getvalue(self, key):
+        '''Get the value of a key without the quotes it is stored in'''
+        return self.unquote(self.get(key))
+
     def getall(self, sort_aliases=True):
         '''Return a list of all keys user owns or has access to'''
         namespaces = False
@@ -87,6 +124,15 @@ class AgaveKeyValStore(object):
             self.logging.debug("failed to getall".format(e))
             raise ValueError("Error in getall: {}".format(e))
 
+    def getprefix(self, prefix):
+        '''Return a dict of every key the user owns that starts with prefix
+        and its value, fetched in one query'''
+        try:
+            return self._getprefix(prefix)
+        except Exception as e:
+            self.logging.debug("failed to getprefix {}: {}".format(prefix, e))
+            raise ValueError("Error in getprefix {}: {}".format(prefix, e))
+
     def rem(self, key):
         '''Delete a key (assuming it is owned by the user)'''
         try:
@@ -246,6 +292,7 @@ class AgaveKeyValStore(object):
             query = json.dumps({'name': key_name})
 
         try:
+            _pace()
             key_objs = self.client.meta.listMetadata(q=query)
             assert isinstance(key_objs, list)
         except Exception as e:
@@ -312,6 +359,7 @@ class AgaveKeyValStore(object):
         if key_uuid is None:
             # Create
             try:
+                _pace()
                 self.client.meta.addMetadata(body=meta)
             except Exception as e:
                 self.logging.debug("Error writing key {}: {}".format(key, e))
@@ -319,6 +367,7 @@ class AgaveKeyValStore(object):
         else:
             # Update
             try:
+                _pace()
                 self.client.meta.updateMetadata(uuid=key_uuid, body=meta)
             except Exception as e:
                 self.logging.debug("Error updating key {}: {}".format(key, e))
@@ -333,6 +382,7 @@ class AgaveKeyValStore(object):
         query = json.dumps({'name': {'$regex': _regex, '$options': 'i'}})
         # collection of Agave metadata objects
         try:
+            _pace()
             key_objs = self.client.meta.listMetadata(q=query)
             assert isinstance(key_objs, list)
         except Exception as e:
@@ -352,6 +402,42 @@ class AgaveKeyValStore(object):
 
         return all_keys
 
+    def _query(self, query, page_size=LIST_PAGE):
+        '''Fetch every metadata object matching query, a page at a time'''
+        key_objs = []
+        offset = 0
+        while True:
+            try:
+                _pace()
+                page = self.client.meta.listMetadata(q=query,
+                                                     limit=page_size,
+                                                     offset=offset)
+                assert isinstance(page, list)
+            except Exception as e:
+                self.logging.debug("Failed to listMetadata")
+                raise AgaveError("Failed at meta.listMetadata: {}".format(e))
+            key_objs.extend(page)
+            if len(page) < page_size:
+                return key_objs
+            offset = offset + len(page)
+
+    def _getprefix(self, prefix):
+        '''Fetch owned keys starting with prefix, with their values'''
+        username = self._username()
+        head = self.prefix + self.separator + prefix
+        tail = '#' + username
+        query = json.dumps({'name': {
+            '$regex': '^{}.*{}$'.format(re.escape(head), re.escape(tail))}})
+        values = {}
+        for key_obj in self._query(query):
+            name = key_obj.get('name', '')
+            if key_obj.get('owner') != username or \
+                    not name.startswith(head) or not name.endswith(tail):
+                continue
+            values[name[len(self.prefix + self.separator):-len(tail)]] = \
+                key_obj.get('value')
+        return values
+
     def _rem(self, key):
         '''Delete a key from a user's namespace'''
         key_uuid = None
@@ -372,6 +458,7 @@ class AgaveKeyValStore(object):
     def _rem_by_uuid(self, key_uuid):
         '''Delete key by its UUID'''
         try:
+            _pace()
             self.client.meta.deleteMetadata(uuid=key_uuid)
             return True
         except Exception as e:
@@ -403,6 +490,7 @@ class AgaveKeyValStore(object):
         pem = self.to_text_pem(acl)
         meta = json.dumps(pem, indent=0)
         try:
+            _pace()
             self.client.meta.updateMetadataPermissions(
                 uuid=key_uuid, body=meta)
             return True
@@ -424,6 +512,7 @@ class AgaveKeyValStore(object):
             self.logging.debug("Key {} not found".format(key))
             raise KeyError("Key {} not found".format(key))
         try:
+            _pace()
             resp = self.client.meta.listMetadataPermissions(uuid=key_uuid)
             for acl in resp:
                 formatted_acl = {'username': acl.get('username'),
@@ -480,6 +569,13 @@ class AgaveKeyValStore(object):
         '''Coerce a value to a string type before sending to MongoDB'''
         return '"' + value + '"'
 
+    @classmethod
+    def unquote(cls, value):
+        '''Undo _stringify. Values come back wrapped in their quotes.'''
+        if value is None:
+            return None
+        return u'{}'.format(value).strip('"')
+
     @classmethod
     def create_key_name(cls):
         '''Create a unique, human-friendly key name'''
@@ -571,8 +667,11 @@ class AgaveKeyValStore(object):
             return os.environ.get('_abaco_username')
         elif self.client.username is not None:
             return self.client.username
-        else:
-            raise AgaveError("No username could be determined")
+        elif identity is not None:
+            username = identity.get_username(self.client)
+            if username is not None:
+                return username
+        raise AgaveError("No username could be determined")
 
     def __get_api_token(self):
         '''Determine API access_token'''
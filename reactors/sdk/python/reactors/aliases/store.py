@@ -9,21 +9,77 @@ from __future__ import absolute_import
 from future.standard_library import install_aliases
 install_aliases()
 
+import json
 import os
 import re
 import sys
+import threading
 
 from past.builtins import basestring
 
 sys.path.insert(0, os.path.dirname(__file__))
 from agavedb.keyval import AgaveKeyValStore, AgaveError
+from agavedb.keyval import PREFIX as KEY_PREFIX, LOGLEVEL
 from agavedb.uniqueid import get_id
 
+try:
+    # Shared with the Reactors SDK when running inside it
+    from reactors.cache import TTLCache
+    from reactors.process import thread_running
+except ImportError:
+    TTLCache = None
+
+    def thread_running(thread, pid):
+        return thread is not None and pid == os.getpid() and \
+            thread.is_alive()
+
 PREFIX = 'tacc-alias-'
+# Seconds a resolved alias, and an alias found not to exist, are cached
+CACHE_TTL = 300
+NEGATIVE_TTL = 30
+CACHE_ENTRIES = 1024
+CACHE_FILE = '.reactors-aliases.json'
+REFRESH_THREAD = 'reactors-alias-refresh'
 
 
 class AliasStore(AgaveKeyValStore):
 
+    def __init__(self, agaveClient, keyPrefix=KEY_PREFIX,
+                 aliasPrefix='', logLevel=LOGLEVEL, cacheTTL=CACHE_TTL,
+                 negativeTTL=NEGATIVE_TTL, cacheEntries=CACHE_ENTRIES,
+                 sharedCache=False, preload=False, refreshInterval=0):
+        '''Initialize with an Agave API client and a name cache
+
+        sharedCache keeps resolved names in _REACTOR_TEMP for other
+        executions in the same container. A cacheTTL of 0 turns the
+        cache off. preload loads every alias in one query on the first
+        lookup, and refreshInterval reloads them every so many seconds
+        in the background.
+        '''
+        super(AliasStore, self).__init__(agaveClient, keyPrefix=keyPrefix,
+                                         aliasPrefix=aliasPrefix,
+                                         logLevel=logLevel)
+        self.names = None
+        if TTLCache is not None:
+            self.names = TTLCache(
+                ttl=cacheTTL, negative_ttl=negativeTTL,
+                max_entries=cacheEntries,
+                filename=CACHE_FILE if sharedCache else None)
+        self.preload = preload
+        self.refresh_interval = refreshInterval
+        # alias key => name for every alias, once loaded
+        self._snapshot = None
+        # identifier => set of aliases, built alongside the snapshot
+        self._reverse = None
+        # alias key => name for aliases owned by someone else, which
+        # resolve again once an owned alias hiding them is removed
+        self._shared = {}
+        self._snapshot_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refresh_thread = None
+        self._refresh_pid = None
+        self._stop = threading.Event()
+
     def _createkey(self, alias):
         '''Creates the internal key name for an alias'''
         # Python2/3 compatible coercion to a "stringy" key name
@@ -31,15 +87,177 @@ class AliasStore(AgaveKeyValStore):
             alias = str(alias)
         return self.alias_prefix + alias.lower()
 
+    def _cachekey(self, alias_key):
+        '''Key a name is cached under, unique to the key prefix'''
+        return self.prefix + self.separator + alias_key
+
+    def _changed(self, alias_key, value=None):
+        '''Bring cached names up to date after an alias is set or removed
+
+        value is the stored value, or None if the alias was removed or
+        its state is unknown.
+        '''
+        if self.names is not None:
+            self.names.invalidate(self._cachekey(alias_key))
+        with self._snapshot_lock:
+            if self._snapshot is None:
+                return
+            old = self._snapshot.pop(alias_key, None)
+            if value is None and self._shared.get(alias_key) is not None:
+                value = self._shared[alias_key]
+            if old is not None and self._reverse is not None:
+                self._reindex(self._reverse, old)
+            if value is not None:
+                self._snapshot[alias_key] = value
+                if self._reverse is not None:
+                    self._index(self._reverse, alias_key, value)
+
+    def _index(self, reverse, alias_key, value):
+        identifier = self.unquote(value)
+        reverse.setdefault(identifier, set()).add(
+            alias_key[len(self.alias_prefix):])
+
+    def _reindex(self, reverse, value):
+        '''Rebuild the reverse entry for value from the snapshot
+
+        Other keys in the snapshot may still name the same identifier
+        under the same alias, so nothing is discarded by name.
+        '''
+        identifier = self.unquote(value)
+        reverse.pop(identifier, None)
+        for alias_key, other in self._snapshot.items():
+            if other is not None and self.unquote(other) == identifier:
+                self._index(reverse, alias_key, other)
+
+    def load_snapshot(self):
+        '''Fetch every alias the user can resolve in one query
+
+        Replaces the snapshot that get_name answers from, and returns it
+        as a dict of alias key => name. Owned aliases take precedence, as
+        they do in get.
+        '''
+        username = self._username()
+        head = self.prefix + self.separator + self.alias_prefix
+        tail = '#' + username
+        query = json.dumps({'name': {
+            '$regex': '^{}.*{}$'.format(re.escape(head), re.escape(tail))}})
+        owned = {}
+        others = {}
+        for key_obj in self._query(query):
+            name = key_obj.get('name', '')
+            if not name.startswith(head) or not name.endswith(tail):
+                continue
+            alias_key = name[len(self.prefix + self.separator):-len(tail)]
+            if key_obj.get('owner') == username:
+                owned.setdefault(alias_key, key_obj.get('value'))
+            else:
+                others.setdefault(alias_key, key_obj.get('value'))
+        snapshot = dict(others)
+        snapshot.update(owned)
+        with self._snapshot_lock:
+            self._snapshot = snapshot
+            self._shared = others
+            self._reverse = self._build_reverse(snapshot)
+        self._start_refresh()
+        return dict(snapshot)
+
+    def _build_reverse(self, snapshot):
+        reverse = {}
+        for alias_key, value in snapshot.items():
+            if value is not None:
+                self._index(reverse, alias_key, value)
+        return reverse
+
+    def get_aliases_for(self, identifier):
+        '''Aliases, without prefix, that resolve to an identifier
+
+        The first call loads every alias in one query. Later calls are
+        answered from memory, which set_alias and rem_alias keep current.
+        '''
+        with self._load_lock:
+            if self._reverse is None:
+                try:
+                    self.load_snapshot()
+                except Exception as e:
+                    raise ValueError(
+                        "Failed to load aliases: {}".format(e))
+        with self._snapshot_lock:
+            return sorted(self._reverse.get(identifier, ()))
+
+    def get_reverse_index(self):
+        '''Every identifier with the aliases that resolve to it'''
+        self.get_aliases_for(None)
+        with self._snapshot_lock:
+            return dict((identifier, sorted(aliases))
+                        for (identifier, aliases) in self._reverse.items())
+
+    def lookup_snapshot(self, alias):
+        '''Name for an alias from the preloaded snapshot, else None
+
+        Loads the snapshot on first use if preload is set. Never looks up
+        a single alias.
+        '''
+        if not self.preload:
+            return None
+        if self._snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    try:
+                        self.load_snapshot()
+                    except Exception as e:
+                        self.logging.debug(
+                            "failed to preload aliases: {}".format(e))
+                        # Look aliases up one by one until a refresh works
+                        with self._snapshot_lock:
+                            self._snapshot = {}
+                        self._start_refresh()
+        with self._snapshot_lock:
+            return self._snapshot.get(self._createkey(alias), None)
+
+    def stop_refresh(self):
+        '''Stop refreshing the snapshot in the background'''
+        self._stop.set()
+
+    def _start_refresh(self):
+        if not self.refresh_interval:
+            return
+        with self._snapshot_lock:
+            if thread_running(self._refresh_thread, self._refresh_pid):
+                return
+            self._stop.clear()
+            self._refresh_thread = threading.Thread(target=self._refresh,
+                                                    name=REFRESH_THREAD)
+            self._refresh_thread.daemon = True
+            self._refresh_pid = os.getpid()
+            self._refresh_thread.start()
+
+    def _refresh(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.load_snapshot()
+            except Exception as e:
+                self.logging.debug(
+                    "failed to refresh aliases: {}".format(e))
+
     def rem_alias(self, alias):
         '''Delete an alias from the database'''
         alias_key = self._createkey(alias)
-        return self.rem(alias_key)
+        try:
+            return self.rem(alias_key)
+        finally:
+            self._changed(alias_key)
 
     def set_alias(self, alias, name):
         '''Create or update actor => alias mapping'''
         alias_key = self._createkey(alias)
-        return self.set(alias_key, name)
+        value = None
+        try:
+            result = self.set(alias_key, name)
+            # As _set stores it
+            value = self._stringify(str(name))
+            return result
+        finally:
+            self._changed(alias_key, value)
 
     def put_alias_acl(self, alias, acl):
         '''Add ACLs to an alias'''
@@ -70,9 +288,18 @@ class AliasStore(AgaveKeyValStore):
             else:
                 raise ValueError("Failed to resolve {}".format(alias))
 
+        name = self.lookup_snapshot(alias)
+        if name is not None:
+            return name
+        alias_key = self._createkey(alias)
         try:
-            return self.get(self._createkey(alias))
-        except ValueError as e:
+            if self.names is None:
+                return self.get(alias_key)
+            # Call _get, not get, so a missing alias raises KeyError and
+            # is cached as missing, while service errors are not cached
+            return self.names.fetch(self._cachekey(alias_key),
+                                    lambda: self._get(alias_key)['value'])
+        except Exception as e:
             raise ValueError("Failed to look up alias {}: {}".format(
                 alias, e))
 
@@ -95,7 +322,17 @@ class AliasStore(AgaveKeyValStore):
 
     def rem_all_aliases(self):
         '''Removes all aliases owned by current user'''
-        all_keys = self.deldb()
+        try:
+            all_keys = self.deldb()
+        finally:
+            if self.names is not None:
+                self.names.clear()
+            with self._snapshot_lock:
+                # Aliases shared by other users are not removed
+                if self._snapshot is not None:
+                    self._snapshot = dict(self._shared)
+                if self._reverse is not None:
+                    self._reverse = self._build_reverse(self._shared)
         return all_keys
 
 
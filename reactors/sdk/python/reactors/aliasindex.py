@@ -0,0 +1,141 @@
+"""
+Alias snapshot files that resolve aliases without network calls
+
+dump() writes every alias in an AliasStore to a compact JSON file,
+which can be added to a reactor image alongside config.yml:
+
+  python -m reactors.aliasindex -o aliases.json
+  # Dockerfile
+  ADD aliases.json /aliases.json
+
+Reactor.resolve_actor_alias reads the file once and checks it before
+the live store. The file records when it was made, and once it is
+older than max_age its entries are ignored in favour of the live store.
+
+File format:
+  {"version": 1, "created": <epoch seconds>, "username": <str>,
+   "prefix": <alias prefix>, "aliases": {<alias>: <identifier>}}
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from time import time
+
+VERSION = 1
+DEFAULT_PATH = '/aliases.json'
+DEFAULT_PREFIX = 'v1-alias-'
+# 0 trusts a snapshot however old it is
+DEFAULT_MAX_AGE = 0
+
+
+class AliasIndex(object):
+    """
+    Aliases loaded from a snapshot file
+
+    Parameters:
+    aliases - dict - alias => identifier
+    created - float - when the snapshot was made, in epoch seconds
+    max_age - float - seconds the snapshot is trusted. 0 is forever.
+    """
+
+    def __init__(self, aliases, created=None, max_age=DEFAULT_MAX_AGE):
+        self.aliases = aliases
+        self.created = created
+        self.max_age = max_age
+
+    def __len__(self):
+        return len(self.aliases)
+
+    @property
+    def fresh(self):
+        if not self.max_age:
+            return True
+        if self.created is None:
+            return False
+        return time() - self.created <= self.max_age
+
+    def get(self, alias):
+        """Identifier for alias, or None if unknown or stale"""
+        if not self.fresh:
+            return None
+        return self.aliases.get(alias.lower(), None)
+
+
+def dump(store, path=DEFAULT_PATH):
+    """
+    Write every alias in an AliasStore to a snapshot file
+
+    Aliases are fetched in one query. Returns the number written.
+    """
+    snapshot = store.load_snapshot()
+    aliases = {}
+    for alias_key, name in snapshot.items():
+        if alias_key.startswith(store.alias_prefix) and name is not None:
+            aliases[alias_key[len(store.alias_prefix):]] = \
+                store.unquote(name)
+    document = {'version': VERSION,
+                'created': int(time()),
+                'username': store._username(),
+                'prefix': store.alias_prefix,
+                'aliases': aliases}
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.aliases', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(document, tmp, sort_keys=True, separators=(',', ':'))
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(aliases)
+
+
+def load(path=DEFAULT_PATH, max_age=DEFAULT_MAX_AGE):
+    """
+    Read a snapshot file
+
+    Returns an AliasIndex, or None if there is no readable snapshot.
+    """
+    try:
+        with open(path, 'r') as snapshot:
+            document = json.load(snapshot)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(document, dict) or \
+            document.get('version') != VERSION or \
+            not isinstance(document.get('aliases'), dict):
+        return None
+    return AliasIndex(dict((k.lower(), v)
+                           for (k, v) in document['aliases'].items()),
+                      created=document.get('created', None),
+                      max_age=max_age)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write every alias visible to the current Agave user '
+                    'to a snapshot file')
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH,
+                        help='snapshot file [{}]'.format(DEFAULT_PATH))
+    parser.add_argument('-p', '--prefix', default=DEFAULT_PREFIX,
+                        help='alias prefix [{}]'.format(DEFAULT_PREFIX))
+    args = parser.parse_args(argv)
+
+    from .aliases.store import AliasStore
+    from .utils import get_client_with_mock_support
+    store = AliasStore(get_client_with_mock_support(),
+                       aliasPrefix=args.prefix, cacheTTL=0)
+    count = dump(store, args.output)
+    print('Wrote {} aliases to {}'.format(count, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
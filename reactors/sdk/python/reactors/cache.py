@@ -0,0 +1,194 @@
+"""
+In-process TTL cache with LRU eviction and an optional on-disk tier
+
+Entries expire ttl seconds after they are stored. Lookups that found
+nothing are cached too, for negative_ttl seconds, so repeated lookups
+of a missing key do not each cost an API call. Once the cache holds
+max_entries, the least recently used entry is evicted. Threads that
+fetch the same missing key at once share a single load.
+
+Given a filename, entries are also kept in a JSON document in
+_REACTOR_TEMP, which other executions in the container consult before
+loading a key themselves. Values must then serialize to JSON.
+"""
+import threading
+
+from collections import OrderedDict
+from time import time
+
+from . import storage
+
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 30
+MAX_ENTRIES = 1024
+# Most entries kept in an on-disk tier
+MAX_DISK_ENTRIES = 4096
+
+
+class _Flight(object):
+    """A load in progress, which other callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache(object):
+    """
+    Cache of values that expire
+
+    Keyword parameters:
+    ttl - float - seconds a value is kept. 0 turns caching off.
+    negative_ttl - float - seconds a miss is kept. 0 does not keep misses.
+    max_entries - int - most entries kept in memory
+    filename - str - JSON document in _REACTOR_TEMP shared with other
+               executions. None keeps entries in memory only.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 max_entries=MAX_ENTRIES, filename=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        # key => (expires, found, value), least recently used first
+        self._entries = OrderedDict()
+        # key => _Flight for loads in progress
+        self._flights = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        """
+        Return (found, value) for a live entry, or None if not cached
+
+        found is False for a cached miss.
+        """
+        now = time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= now:
+                entry = self._read_disk(key, now)
+            if entry is None:
+                self.misses = self.misses + 1
+                return None
+            self._entries[key] = entry
+            self.hits = self.hits + 1
+            return entry[1], entry[2]
+
+    def get(self, key, default=None):
+        """Cached value of key, or default if it is not cached or missing"""
+        entry = self.lookup(key)
+        if entry is None or not entry[0]:
+            return default
+        return entry[1]
+
+    def put(self, key, value):
+        """Cache a value for key"""
+        self._store(key, True, value, self.ttl)
+
+    def put_missing(self, key):
+        """Remember that key was looked up and not found"""
+        self._store(key, False, None, self.negative_ttl)
+
+    def fetch(self, key, loader):
+        """
+        Cached value of key, calling loader() to load it on a miss
+
+        loader raises KeyError if there is nothing to find. Cached misses
+        raise KeyError without calling it. Any other exception from
+        loader is passed on and nothing is cached. Callers that ask for a
+        key while it is loading wait for, and share, that load's outcome.
+        """
+        with self._lock:
+            entry = self.lookup(key)
+            flight = None
+            if entry is None:
+                flight = self._flights.get(key, None)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._flights[key] = flight
+        if entry is not None:
+            if not entry[0]:
+                raise KeyError('No such key: {} (cached)'.format(key))
+            return entry[1]
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = loader()
+            self.put(key, flight.value)
+            return flight.value
+        except KeyError as exc:
+            self.put_missing(key)
+            flight.error = exc
+            raise
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key):
+        """Forget key here and in the on-disk tier"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._update_disk(key, None)
+
+    def clear(self):
+        """Forget every entry here and in the on-disk tier"""
+        with self._lock:
+            self._entries.clear()
+            if self.filename is not None:
+                storage.write_cache(self.filename, {})
+
+    def _store(self, key, found, value, ttl):
+        if not ttl:
+            return
+        entry = (time() + ttl, found, value)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > max(self.max_entries, 1):
+                self._entries.popitem(last=False)
+            self._update_disk(key, entry)
+
+    def _read_disk(self, key, now):
+        if self.filename is None:
+            return None
+        cached = storage.read_cache(self.filename, default={})
+        entry = cached.get(key) if isinstance(cached, dict) else None
+        if isinstance(entry, list) and len(entry) == 3 and entry[0] > now:
+            return tuple(entry)
+        return None
+
+    def _update_disk(self, key, entry):
+        """Write an entry, or remove it if entry is None, on disk"""
+        if self.filename is None:
+            return
+        cached = storage.read_cache(self.filename, default={})
+        if not isinstance(cached, dict):
+            cached = {}
+        now = time()
+        cached = dict((k, v) for (k, v) in cached.items()
+                      if isinstance(v, list) and len(v) == 3 and v[0] > now)
+        if entry is None:
+            if cached.pop(key, None) is None:
+                return
+        else:
+            cached[key] = list(entry)
+        if len(cached) > MAX_DISK_ENTRIES:
+            # Keep the entries that will live longest
+            keep = sorted(cached, key=lambda k: cached[k][0])
+            cached = dict((k, cached[k]) for k in keep[-MAX_DISK_ENTRIES:])
+        storage.write_cache(self.filename, cached)
@@ -0,0 +1,164 @@
+"""
+Stop sending to actors that keep failing
+
+A circuit opens for an actor after a number of consecutive failed sends.
+A send counts once, after all of its retries. While a circuit is open,
+sends to that actor fail at once instead of retrying. Once the cool-down
+passes, the circuit is half-open: one probe send is let through, and its
+outcome closes the circuit or opens it again for another cool-down.
+Breakers are off unless a threshold is configured.
+
+State can be shared with other executions in the same container through
+a file in _REACTOR_TEMP. Updates to it are made under a file lock where
+fcntl is available.
+"""
+import threading
+
+from contextlib import contextmanager
+from time import time
+
+from . import storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CACHE_FILE = '.reactors-circuits.json'
+LOCK_FILE = '.reactors-circuits.lock'
+DEFAULT_THRESHOLD = 0
+DEFAULT_COOLDOWN = 60
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """
+    Per-key circuit breaker
+
+    Keyword parameters:
+    threshold - int - consecutive failures that open a circuit. 0 disables.
+    cooldown - float - seconds an open circuit stays open
+    shared - bool - keep state in _REACTOR_TEMP for other executions
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, cooldown=DEFAULT_COOLDOWN,
+                 shared=False):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.shared = shared
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _sharing(self):
+        return self.shared and storage.cache_path(CACHE_FILE) is not None
+
+    @contextmanager
+    def _updating(self):
+        """Hold the lock, and the file lock if sharing, for an update"""
+        with self._lock:
+            path = storage.cache_path(LOCK_FILE) if self._sharing() else None
+            if path is None or fcntl is None:
+                yield
+                return
+            with open(path, 'a') as lockfile:
+                fcntl.flock(lockfile, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+    def _load(self, key):
+        # The shared file, when there is one, is the source of truth, as
+        # another execution may have opened or closed the circuit
+        if self._sharing():
+            cached = storage.read_cache(CACHE_FILE, default={})
+            if isinstance(cached, dict) and isinstance(cached.get(key), dict):
+                self._circuits[key] = cached[key]
+            else:
+                self._circuits.pop(key, None)
+        return dict(self._circuits.get(key, {'failures': 0,
+                                             'opened': None,
+                                             'probing': None}))
+
+    def _save(self, key, circuit):
+        closed = circuit['failures'] == 0 and circuit['opened'] is None
+        if closed:
+            self._circuits.pop(key, None)
+        else:
+            self._circuits[key] = circuit
+        if self._sharing():
+            cached = storage.read_cache(CACHE_FILE, default={})
+            if not isinstance(cached, dict):
+                cached = {}
+            if closed:
+                if key not in cached:
+                    return
+                cached.pop(key, None)
+            else:
+                cached[key] = circuit
+            storage.write_cache(CACHE_FILE, cached)
+
+    def state(self, key):
+        """Report whether the circuit for key is closed, open, or half-open"""
+        with self._lock:
+            circuit = self._load(key)
+        if circuit['opened'] is None:
+            return CLOSED
+        if time() - circuit['opened'] < self.cooldown:
+            return OPEN
+        return HALF_OPEN
+
+    def allow(self, key):
+        """
+        Whether a send to key may go ahead
+
+        In the half-open state only one caller at a time is let through
+        to probe the target.
+        """
+        if not self.threshold:
+            return True
+        with self._updating():
+            circuit = self._load(key)
+            if circuit['opened'] is None:
+                return True
+            now = time()
+            if now - circuit['opened'] < self.cooldown:
+                return False
+            if circuit['probing'] is not None and \
+                    now - circuit['probing'] < self.cooldown:
+                return False
+            circuit['probing'] = now
+            self._save(key, circuit)
+            return True
+
+    def success(self, key):
+        """Record a successful send, closing the circuit"""
+        if not self.threshold:
+            return
+        with self._updating():
+            circuit = self._load(key)
+            if circuit['failures'] or circuit['opened'] is not None:
+                self._save(key, {'failures': 0,
+                                 'opened': None,
+                                 'probing': None})
+
+    def failure(self, key):
+        """
+        Record a send that failed after all of its retries
+
+        Returns True if the circuit is now open.
+        """
+        if not self.threshold:
+            return False
+        with self._updating():
+            circuit = self._load(key)
+            circuit['failures'] = circuit['failures'] + 1
+            if circuit['probing'] is not None or \
+                    circuit['failures'] >= self.threshold:
+                circuit['opened'] = time()
+                circuit['probing'] = None
+            self._save(key, circuit)
+            return circuit['opened'] is not None
@@ -0,0 +1,243 @@
+"""
+Send oversized messages by reference
+
+Abaco hands a message to its actor in an environment variable, so large
+messages are slow to send or fail outright. A message whose JSON is
+larger than a threshold is written to a store instead, and a small
+envelope naming the stored payload, its size, and its SHA-256 digest is
+sent in its place. On the receiving side, Reactor.message fetches,
+verifies, and caches the payload. Receivers need an SDK that reads
+claim checks, so they are off unless a threshold is configured.
+
+Stores:
+keyval - the Agave metadata key/value store, split across as many keys
+         as it takes. Needs no configuration.
+files - a JSON file in a directory on an Agave storage system
+
+Payloads are stored as the sending user, so only actors running as the
+same user can claim them. Envelopes name that user as owner, and a
+receiver that cannot fetch a payload stored by someone else says so.
+
+Once a payload has been fetched and verified it is removed from its
+store, so each envelope can be claimed by one receiver. Set cleanup to
+False to keep payloads, e.g. for messages sent to several actors.
+"""
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import re
+import threading
+
+from . import agaveutils, storage, uniqueid
+from .codec import to_json
+
+ENVELOPE_KEY = '__claim_check__'
+VERSION = 1
+DEFAULT_THRESHOLD = 0
+STORES = ('keyval', 'files')
+# Base64 characters per key/value store entry, under its 32 KB limit
+CHUNK_CHARS = 32000
+CACHE_FILE = '.reactors-claim-{}.json'
+_RE_DIGEST = re.compile('^[0-9a-f]{64}$')
+
+
+def is_envelope(message):
+    """Whether a received message is a claim check envelope"""
+    return isinstance(message, dict) and len(message) == 1 and \
+        isinstance(message.get(ENVELOPE_KEY), dict)
+
+
+class ClaimCheck(object):
+    """
+    Stores oversized outgoing messages and fetches claimed ones
+
+    Positional parameters:
+    client - Agave - API client for the store
+
+    Keyword parameters:
+    threshold - int - largest message, in bytes of JSON, sent as is.
+                0 turns claim checks off.
+    store - str - where to put payloads: keyval or files
+    system - str - storage system for the files store
+    path - str - directory on system for the files store
+    cleanup - bool - remove payloads once they have been claimed
+    logger - logging.Logger - where to report payloads left behind
+    """
+
+    def __init__(self, client, threshold=DEFAULT_THRESHOLD, store='keyval',
+                 system=None, path=None, cleanup=True, logger=None):
+        if store not in STORES:
+            raise ValueError('Unknown claim check store: {}'.format(store))
+        self.client = client
+        self.threshold = threshold
+        self.store = store
+        self.system = system
+        self.path = path
+        self.cleanup = cleanup
+        self.logger = logger
+        self._keyval = None
+        self._claimed = {}
+        self._lock = threading.Lock()
+
+    @property
+    def keyval(self):
+        with self._lock:
+            if self._keyval is None:
+                from .aliases.agavedb import AgaveKeyValStore
+                self._keyval = AgaveKeyValStore(self.client)
+            return self._keyval
+
+    def oversized(self, message):
+        """Whether a message is too large to send as is"""
+        if not self.threshold or is_envelope(message):
+            return False
+        return len(to_json(message)) > self.threshold
+
+    def check(self, message):
+        """
+        Store a message and return the envelope to send in its place
+
+        Messages that are not oversized are returned unchanged.
+        """
+        if not self.oversized(message):
+            return message
+        data = to_json(message)
+        claim_id = 'claim-' + uniqueid.get_id()
+        if self.store == 'files':
+            claim = self._put_file(claim_id, data)
+        else:
+            claim = self._put_keyval(claim_id, data)
+        claim.update({'version': VERSION,
+                      'owner': self._username(),
+                      'store': self.store,
+                      'size': len(data),
+                      'sha256': hashlib.sha256(data).hexdigest()})
+        return {ENVELOPE_KEY: claim}
+
+    def claim(self, envelope):
+        """
+        Fetch the message an envelope stands for
+
+        Payloads are cached in memory and in _REACTOR_TEMP, and removed
+        from their store if cleanup is on. Raises ValueError if the
+        envelope is malformed or the payload does not match its digest.
+        """
+        claim = envelope[ENVELOPE_KEY]
+        digest = str(claim.get('sha256', ''))
+        if not _RE_DIGEST.match(digest):
+            raise ValueError('Claim check has no valid sha256 digest')
+        if digest in self._claimed:
+            return self._claimed[digest]
+        cached = storage.read_cache(CACHE_FILE.format(digest))
+        if isinstance(cached, dict) and 'message' in cached:
+            message = cached['message']
+        else:
+            store = claim.get('store')
+            if store not in STORES:
+                raise ValueError(
+                    'Unknown claim check store: {}'.format(store))
+            try:
+                if store == 'files':
+                    data = self._get_file(claim)
+                else:
+                    data = self._get_keyval(claim)
+            except Exception as exc:
+                raise ValueError(self._fetch_error(claim, exc))
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise ValueError('Payload for claim check {} does not '
+                                 'match its digest'.format(claim.get('ref')))
+            message = json.loads(data.decode('utf-8'))
+            storage.write_cache(CACHE_FILE.format(digest),
+                                {'message': message})
+            if self.cleanup:
+                self._remove(claim)
+        self._claimed[digest] = message
+        return message
+
+    def _put_keyval(self, claim_id, data):
+        encoded = base64.b64encode(data).decode('ascii')
+        parts = [encoded[i:i + CHUNK_CHARS]
+                 for i in range(0, len(encoded), CHUNK_CHARS)]
+        for index, part in enumerate(parts):
+            self.keyval.set('{}.{}'.format(claim_id, index), part)
+        return {'ref': claim_id, 'parts': len(parts)}
+
+    def _get_keyval(self, claim):
+        parts = []
+        for index in range(int(claim.get('parts', 0))):
+            parts.append(self.keyval.getvalue(
+                '{}.{}'.format(claim.get('ref'), index)))
+        return base64.b64decode(''.join(parts).encode('ascii'))
+
+    def _username(self):
+        """User payloads are stored as, or None if it cannot be told"""
+        try:
+            return self.keyval._username()
+        except Exception:
+            return None
+
+    def _fetch_error(self, claim, exc):
+        message = 'Failed to fetch claim check {}: {}'.format(
+            claim.get('ref'), exc)
+        owner = claim.get('owner')
+        username = self._username()
+        if owner and username and owner != username:
+            message = message + '. It was stored by {}, and claim checks ' \
+                'can only be read by the same user, not {}'.format(
+                    owner, username)
+        return message
+
+    def _remove(self, claim):
+        """Delete a claimed payload. Failures are logged, not raised."""
+        try:
+            if claim.get('store') == 'files':
+                system, dir_path, filename = agaveutils.from_agave_uri(
+                    claim.get('ref'))
+                self.client.files.delete(
+                    systemId=system,
+                    filePath=posixpath.join(dir_path, filename))
+            else:
+                for index in range(int(claim.get('parts', 0))):
+                    self.keyval.rem('{}.{}'.format(claim.get('ref'), index))
+        except Exception as exc:
+            self._log('Failed to remove claim check {}: {}'.format(
+                claim.get('ref'), exc))
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.warning(message)
+
+    def _put_file(self, claim_id, data):
+        if not self.system or not self.path:
+            raise ValueError('The files claim check store needs a system '
+                             'and a path')
+        filename = claim_id + '.json'
+        storage.check_quota(len(data))
+        local_file = os.path.join(storage.paths.reactor.temp, filename)
+        with open(local_file, 'wb') as payload:
+            payload.write(data)
+        try:
+            agaveutils.files.mkdir(self.client, self.path.strip('/'),
+                                   self.system)
+            agaveutils.files.agave_upload_file(self.client, self.path,
+                                               self.system, local_file,
+                                               sync=False)
+        finally:
+            os.unlink(local_file)
+        return {'ref': agaveutils.to_agave_uri(self.system, self.path,
+                                               filename)}
+
+    def _get_file(self, claim):
+        system, dir_path, filename = agaveutils.from_agave_uri(
+            claim.get('ref'))
+        storage.check_quota(int(claim.get('size', 0)))
+        local_file = os.path.join(storage.paths.reactor.temp, filename)
+        agaveutils.files.get(self.client, posixpath.join(dir_path, filename),
+                             system, local_file)
+        try:
+            with open(local_file, 'rb') as payload:
+                return payload.read()
+        finally:
+            os.unlink(local_file)
@@ -0,0 +1,85 @@
+"""
+Compress large messages on the wire
+
+A message whose JSON is larger than a threshold is zlib-compressed,
+base64-encoded, and sent inside a small versioned envelope. Messages the
+codec cannot shrink are sent as they are. Reactor.message decodes
+envelopes on the receiving side, and messages that were never encoded
+read the same as before.
+
+Receivers need a version of the SDK that understands the envelope, so
+compression is off unless a threshold is configured.
+"""
+import base64
+import json
+import zlib
+
+ENVELOPE_KEY = '__encoded__'
+VERSION = 1
+CODECS = ('zlib',)
+# 0 leaves every message uncompressed
+DEFAULT_THRESHOLD = 0
+DEFAULT_LEVEL = 6
+
+
+def to_json(message):
+    """Compact JSON text of a message, as UTF-8 bytes"""
+    return json.dumps(message, separators=(',', ':')).encode('utf-8')
+
+
+def is_envelope(message):
+    """Whether a message is an encoded envelope"""
+    return isinstance(message, dict) and len(message) == 1 and \
+        isinstance(message.get(ENVELOPE_KEY), dict)
+
+
+def decode(message):
+    """
+    Return the message an envelope stands for
+
+    Anything that is not an envelope is returned unchanged. Raises
+    ValueError for an envelope that cannot be decoded.
+    """
+    if not is_envelope(message):
+        return message
+    envelope = message[ENVELOPE_KEY]
+    if envelope.get('codec') not in CODECS:
+        raise ValueError('Unsupported message codec: {}'.format(
+            envelope.get('codec')))
+    try:
+        data = zlib.decompress(base64.b64decode(envelope['data']))
+    except (KeyError, TypeError, ValueError, zlib.error) as exc:
+        raise ValueError('Failed to decode message: {}'.format(exc))
+    if len(data) != envelope.get('size', len(data)):
+        raise ValueError('Decoded message is not the size it was sent as')
+    return json.loads(data.decode('utf-8'))
+
+
+class Codec(object):
+    """
+    Compresses outgoing messages larger than a threshold
+
+    Keyword parameters:
+    threshold - int - largest message, in bytes of JSON, sent as is.
+                0 turns compression off.
+    level - int - zlib compression level, 1 (fastest) to 9 (smallest)
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, level=DEFAULT_LEVEL):
+        self.threshold = threshold
+        self.level = level
+
+    def encode(self, message):
+        """Return the envelope to send for a message, or the message"""
+        if not self.threshold or is_envelope(message):
+            return message
+        data = to_json(message)
+        if len(data) <= self.threshold:
+            return message
+        packed = base64.b64encode(zlib.compress(data, self.level))
+        if len(packed) >= len(data):
+            return message
+        return {ENVELOPE_KEY: {'version': VERSION,
+                               'codec': 'zlib',
+                               'size': len(data),
+                               'data': packed.decode('ascii')}}
@@ -0,0 +1,235 @@
+"""
+Wait for Abaco executions to finish without a polling loop per message
+
+One background thread checks the status of every execution being waited
+for. Executions of the same actor are checked together with a single
+listing call where possible. The poll interval starts short, doubles
+while nothing changes, and resets when a status changes or a new
+execution is added. The thread exits when there is nothing left to
+watch and is started again on demand.
+"""
+import os
+import threading
+
+from time import time
+
+from . import ratelimit
+from .process import thread_running
+
+# Statuses after which an execution will not change again
+TERMINAL_STATUSES = ('COMPLETE', 'ERROR')
+MIN_INTERVAL = 0.5
+MAX_INTERVAL = 8
+# Seconds between checks of a cancel Event while waiting
+CANCEL_CHECK = 0.1
+THREAD_NAME = 'reactors-execution-poller'
+
+
+class Execution(object):
+    """
+    An execution being waited for
+
+    record holds the most recent execution document returned by the
+    API, or a stub with id, actorId, and status None until the first poll.
+    """
+
+    def __init__(self, actor_id, execution_id):
+        self.actor_id = actor_id
+        self.execution_id = execution_id
+        self.record = {'id': execution_id,
+                       'actorId': actor_id,
+                       'status': None}
+        self.waiters = 0
+        self._done = threading.Event()
+
+    @property
+    def status(self):
+        return self.record.get('status')
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the execution finishes. False if timeout expired."""
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    def _update(self, record):
+        """Store a new record. Returns True if the status changed."""
+        changed = record.get('status') != self.record.get('status')
+        self.record = record
+        if record.get('status') in TERMINAL_STATUSES:
+            self._done.set()
+        return changed
+
+
+class ExecutionPoller(object):
+    """
+    Shared status poller for pending executions
+
+    Positional parameters:
+    client - Agave - API client used for status checks
+
+    Keyword parameters:
+    min_interval - float - seconds between polls while statuses change
+    max_interval - float - longest pause between polls
+    logger - logging.Logger - where to report failed status checks
+    """
+
+    def __init__(self, client, min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL, logger=None):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.logger = logger
+        self._pending = {}
+        self._next_poll = 0
+        self._new_work = False
+        self._thread = None
+        self._pid = None
+        self._cond = threading.Condition()
+
+    def watch(self, actor_id, execution_id):
+        """Start waiting on an execution. Returns its Execution."""
+        key = (actor_id, execution_id)
+        with self._cond:
+            execution = self._pending.get(key)
+            if execution is None:
+                execution = Execution(actor_id, execution_id)
+                self._pending[key] = execution
+                # Poll soon for new work, but not so soon that a burst of
+                # sends turns into a burst of status checks
+                soon = time() + self.min_interval
+                if self._next_poll == 0 or self._next_poll > soon:
+                    self._next_poll = soon
+                self._new_work = True
+            execution.waiters = execution.waiters + 1
+            if not thread_running(self._thread, self._pid):
+                self._thread = threading.Thread(target=self._run,
+                                                name=THREAD_NAME)
+                self._thread.daemon = True
+                self._pid = os.getpid()
+                self._thread.start()
+            self._cond.notify()
+        return execution
+
+    def release(self, execution):
+        """Stop polling for an execution once no caller is waiting on it"""
+        with self._cond:
+            execution.waiters = execution.waiters - 1
+            if execution.waiters <= 0:
+                key = (execution.actor_id, execution.execution_id)
+                if self._pending.get(key) is execution:
+                    del self._pending[key]
+
+    def wait(self, actor_id, execution_id, timeout=None, cancel=None):
+        """
+        Block until an execution finishes or timeout seconds pass
+
+        Setting the threading.Event cancel also ends the wait.
+
+        Returns:
+        The Execution. Check done() to see whether it finished.
+        """
+        execution = self.watch(actor_id, execution_id)
+        try:
+            if cancel is None:
+                execution.wait(timeout)
+            else:
+                deadline = None
+                if timeout is not None:
+                    deadline = time() + timeout
+                while not cancel.is_set():
+                    step = CANCEL_CHECK
+                    if deadline is not None:
+                        step = min(step, deadline - time())
+                        if step <= 0:
+                            break
+                    if execution.wait(step):
+                        break
+        finally:
+            self.release(execution)
+        return execution
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if len(self._pending) == 0:
+                        self._next_poll = 0
+                        if self._thread is threading.current_thread():
+                            self._thread = None
+                        return
+                    delay = self._next_poll - time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                batch = list(self._pending.values())
+                # watch() may bring this forward while the poll runs
+                self._next_poll = float('inf')
+
+            changed = self._poll(batch)
+
+            with self._cond:
+                for execution in batch:
+                    key = (execution.actor_id, execution.execution_id)
+                    if execution.done() and \
+                            self._pending.get(key) is execution:
+                        del self._pending[key]
+                if changed or self._new_work:
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.interval * 2, self.max_interval)
+                self._new_work = False
+                self._next_poll = min(self._next_poll, time() + self.interval)
+
+    def _poll(self, batch):
+        """Refresh statuses for a batch. Returns True if any changed."""
+        changed = False
+        by_actor = {}
+        for execution in batch:
+            by_actor.setdefault(execution.actor_id, []).append(execution)
+        for actor_id, executions in by_actor.items():
+            listed = {}
+            if len(executions) > 1:
+                listed = self._list_statuses(actor_id)
+            for execution in executions:
+                record = listed.get(execution.execution_id)
+                if record is None:
+                    record = self._get_status(actor_id,
+                                              execution.execution_id)
+                if record is not None and execution._update(record):
+                    changed = True
+        return changed
+
+    def _list_statuses(self, actor_id):
+        """Statuses of an actor's executions from one listing call"""
+        try:
+            ratelimit.request('actors')
+            listing = self.client.actors.listExecutions(actorId=actor_id)
+            return dict((e.get('id'), e)
+                        for e in listing.get('executions', [])
+                        if isinstance(e, dict) and e.get('status'))
+        except Exception as exc:
+            self._log('Failed to list executions of {}: {}'.format(
+                actor_id, exc))
+            return {}
+
+    def _get_status(self, actor_id, execution_id):
+        try:
+            ratelimit.request('actors')
+            return self.client.actors.getExecution(actorId=actor_id,
+                                                   executionId=execution_id)
+        except Exception as exc:
+            self._log('Failed to get status of {}: {}'.format(
+                execution_id, exc))
+            return None
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.debug(message)
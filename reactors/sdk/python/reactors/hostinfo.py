@@ -0,0 +1,94 @@
+"""
+Discover the address of the host running a Reactor
+
+The address is found locally from the kernel's routing table or the
+resolver, cached per container in _REACTOR_TEMP, and resolved on a
+background thread so that it never delays startup.
+"""
+import socket
+import threading
+
+from . import storage
+
+CACHE_FILE = '.reactors-hostinfo.json'
+UNKNOWN = 'unknown'
+# Connecting a UDP socket transmits nothing. It only asks the kernel
+# which local address would be used to reach the destination.
+PROBE_ADDRESS = ('10.255.255.255', 1)
+
+_identities = {}
+_lock = threading.Lock()
+
+
+def local_ip():
+    """Return the primary local IP address or None if it can't be found"""
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.connect(PROBE_ADDRESS)
+            address = sock.getsockname()[0]
+        finally:
+            sock.close()
+        if address and not address.startswith('0.'):
+            return address
+    except Exception:
+        pass
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except Exception:
+        return None
+
+
+class HostIdentity(object):
+    """
+    Lazily resolved host address
+
+    Positional parameters:
+    address - str - 'auto' to discover the address or a literal value
+    """
+
+    def __init__(self, address='auto'):
+        self._address = None
+        self._thread = None
+        if address is not None and address not in ('', 'auto'):
+            self._address = address
+        else:
+            cached = storage.read_cache(CACHE_FILE, default={})
+            if isinstance(cached, dict) and cached.get('host_ip'):
+                self._address = cached.get('host_ip')
+            else:
+                self._thread = threading.Thread(target=self._resolve)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _resolve(self):
+        address = local_ip()
+        if address is not None:
+            storage.write_cache(CACHE_FILE, {'host_ip': address})
+            self._address = address
+        else:
+            self._address = UNKNOWN
+
+    def wait(self, timeout=None):
+        """Block until background resolution finishes"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ip
+
+    @property
+    def ip(self):
+        """The host address, or 'unknown' while it is still resolving"""
+        if self._address is None:
+            return UNKNOWN
+        return self._address
+
+    def __str__(self):
+        return self.ip
+
+
+def get_host_identity(address='auto'):
+    """Return the process-wide HostIdentity for a given address setting"""
+    with _lock:
+        if address not in _identities:
+            _identities[address] = HostIdentity(address)
+        return _identities[address]
@@ -0,0 +1,200 @@
+"""
+Idempotency keys for messages that may be delivered more than once
+
+A send that times out may still have gone through, so retrying it can
+start a second execution for the same message. Senders can attach a key
+to each message in the x_idempotency_key environment variable, either
+given by the caller or derived from the recipient, the session, and the
+message. Receivers record the keys they have processed and drop any
+message whose key they have already seen.
+
+Processed keys are kept for a TTL in one of two stores:
+local - SQLite database in _REACTOR_TEMP, shared by executions on a host
+keyval - the Agave key/value store, shared by every execution. Checks
+         are not atomic, so two copies arriving at the same moment may
+         both be processed. About one check in PURGE_ODDS also deletes
+         expired keys, or call SeenKeys.purge() directly.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+
+from contextlib import closing
+from random import randrange
+from time import time
+
+from . import storage
+
+ENV_VAR = 'x_idempotency_key'
+STORES = ('local', 'keyval')
+DEFAULT_TTL = 86400
+# Hex characters of SHA-256 kept for each key
+KEY_CHARS = 32
+SEEN_FILE = '.reactors-idempotency.sqlite'
+KEYVAL_KEY = 'idem-{}'
+# Checks against the keyval store per purge of its expired keys
+PURGE_ODDS = 100
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS seen (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL)"""
+
+
+def derive_key(actor_id, session, message):
+    """Key for a message, the same every time it is sent in a session"""
+    digest = hashlib.sha256()
+    for part in (actor_id, session):
+        digest.update(u'{}\0'.format(part).encode('utf-8'))
+    digest.update(json.dumps(message, sort_keys=True,
+                             separators=(',', ':')).encode('utf-8'))
+    return digest.hexdigest()[:KEY_CHARS]
+
+
+def check_bulk_key(key):
+    """
+    Refuse a fixed key for a bulk send
+
+    One string key on every message would make receivers drop all but
+    the first as duplicates. Bulk sends take True, False, or None; give
+    each message its own key in its environment instead.
+    """
+    if key is not None and not isinstance(key, bool):
+        raise TypeError('idempotencyKey for a bulk send must be True, False, '
+                        'or None, not {!r}. Put per-message keys in each '
+                        'message\'s environment as {}.'.format(key, ENV_VAR))
+    return key
+
+
+def compact(key):
+    """Fixed-length form of a key as it is recorded"""
+    return hashlib.sha256(
+        u'{}'.format(key).encode('utf-8')).hexdigest()[:KEY_CHARS]
+
+
+def default_path():
+    """
+    Where the local store goes if no path is configured
+
+    Keys only outlive the execution if _REACTOR_TEMP is set.
+    """
+    path = storage.cache_path(SEEN_FILE)
+    if path is not None:
+        return path
+    return os.path.join(storage.paths.reactor.temp, SEEN_FILE)
+
+
+class SeenKeys(object):
+    """
+    Set of processed idempotency keys that expire after ttl seconds
+
+    Keyword parameters:
+    store - str - local or keyval
+    ttl - float - seconds a key is remembered
+    path - str - database file for the local store
+    keyval - AgaveKeyValStore - key/value store for the keyval store
+    purge_odds - int - keyval checks per purge of expired keys. 0 never
+                 purges.
+    """
+
+    def __init__(self, store='local', ttl=DEFAULT_TTL, path=None,
+                 keyval=None, purge_odds=PURGE_ODDS):
+        if store not in STORES:
+            raise ValueError('Unknown idempotency store: {}'.format(store))
+        if store == 'keyval' and keyval is None:
+            raise ValueError('The keyval idempotency store needs a '
+                             'key/value store')
+        self.store = store
+        self.ttl = ttl
+        self.path = path
+        self.keyval = keyval
+        self.purge_odds = purge_odds
+        if store == 'local':
+            if self.path is None:
+                self.path = default_path()
+            with self._connect() as conn:
+                conn.execute(SCHEMA)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30,
+                                       isolation_level=None))
+
+    def check_and_add(self, key):
+        """
+        Record a key. Returns False if it was already recorded.
+        """
+        key = compact(key)
+        now = time()
+        if self.store == 'keyval':
+            if self._keyval_expires(key) > now:
+                return False
+            self.keyval.set(KEYVAL_KEY.format(key), str(now + self.ttl))
+            if self.purge_odds and randrange(self.purge_odds) == 0:
+                self.purge()
+            return True
+        storage.check_quota(len(key))
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM seen WHERE expires <= ?', (now,))
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO seen (key, expires) '
+                    'VALUES (?, ?)', (key, now + self.ttl))
+                added = cursor.rowcount == 1
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return added
+
+    def seen(self, key):
+        """Whether a key has been recorded and not yet expired"""
+        key = compact(key)
+        now = time()
+        if self.store == 'keyval':
+            return self._keyval_expires(key) > now
+        with self._connect() as conn:
+            row = conn.execute('SELECT expires FROM seen WHERE key = ?',
+                               (key,)).fetchone()
+        return row is not None and row[0] > now
+
+    def purge(self):
+        """
+        Delete expired keys. Returns how many were deleted.
+
+        The local store purges on every check. For the keyval store this
+        lists every recorded key, so it only runs now and then.
+        """
+        now = time()
+        if self.store == 'local':
+            with self._connect() as conn:
+                return conn.execute('DELETE FROM seen WHERE expires <= ?',
+                                    (now,)).rowcount
+        purged = 0
+        try:
+            values = self.keyval.getprefix(KEYVAL_KEY.format(''))
+        except ValueError:
+            return purged
+        for name, value in values.items():
+            if self._expires(value) > now:
+                continue
+            try:
+                self.keyval.rem(name)
+                purged = purged + 1
+            except KeyError:
+                # Deleted by another execution's purge
+                pass
+        return purged
+
+    def _keyval_expires(self, key):
+        try:
+            return self._expires(self.keyval.get(KEYVAL_KEY.format(key)))
+        except ValueError:
+            return 0
+
+    def _expires(self, value):
+        """Expiry time recorded in a keyval store value, or 0"""
+        try:
+            return float(self.keyval.unquote(value))
+        except (TypeError, ValueError):
+            return 0
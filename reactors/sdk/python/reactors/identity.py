@@ -0,0 +1,124 @@
+"""
+Cache the API identity that goes with an access token
+
+Discovering a username via the profiles service is a slow round trip, so
+the answer is kept in memory and in _REACTOR_TEMP for as long as the
+token is valid. Records are keyed by a hash of the token, never the token
+itself.
+"""
+import hashlib
+import os
+import threading
+
+from time import time
+
+from . import ratelimit, storage
+
+CACHE_FILE = '.reactors-identity.json'
+# Lifetime for records whose token expiry can't be determined
+DEFAULT_TTL = 3600
+
+_identities = {}
+_lock = threading.Lock()
+
+
+def get_token(client):
+    """Current access token for a client, or None"""
+    if os.environ.get('_abaco_access_token'):
+        return os.environ.get('_abaco_access_token')
+    try:
+        return client._token
+    except Exception:
+        pass
+    try:
+        return client.token.token_info.get('access_token')
+    except Exception:
+        return None
+
+
+def get_token_expiry(client):
+    """Epoch time when the client's token expires"""
+    try:
+        token_info = client.token.token_info
+        if token_info.get('expiration') is not None:
+            return float(token_info.get('expiration'))
+        return float(token_info.get('created_at')) + \
+            float(token_info.get('expires_in'))
+    except Exception:
+        pass
+    try:
+        return float(client.created_at) + float(client.expires_in)
+    except Exception:
+        return time() + DEFAULT_TTL
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def lookup(client):
+    """Return the cached {username, api_server, expires} or None"""
+    token = get_token(client)
+    if not token:
+        return None
+    key = _token_key(token)
+    now = time()
+    with _lock:
+        record = _identities.get(key)
+        if record is None:
+            cached = storage.read_cache(CACHE_FILE, default={})
+            if isinstance(cached, dict):
+                record = cached.get(key)
+        if record is not None and record.get('expires', 0) > now:
+            _identities[key] = record
+            return record
+        _identities.pop(key, None)
+    return None
+
+
+def remember(client, username, api_server=None):
+    """Cache the identity for the client's token until it expires"""
+    token = get_token(client)
+    if not token or not username:
+        return None
+    if api_server is None:
+        api_server = os.environ.get('_abaco_api_server',
+                                    getattr(client, 'api_server', None))
+    record = {'username': username,
+              'api_server': api_server,
+              'expires': get_token_expiry(client)}
+    key = _token_key(token)
+    now = time()
+    with _lock:
+        _identities[key] = record
+        cached = storage.read_cache(CACHE_FILE, default={})
+        if not isinstance(cached, dict):
+            cached = {}
+        cached = dict((k, v) for (k, v) in cached.items()
+                      if isinstance(v, dict) and v.get('expires', 0) > now)
+        cached[key] = record
+        storage.write_cache(CACHE_FILE, cached)
+    return record
+
+
+def get_username(client, profiles=True):
+    """
+    Resolve the API username for a client
+
+    Consults, in order, the Abaco environment, the client itself, the
+    identity cache, and finally (if profiles is True) the profiles
+    service, caching what it finds. Returns None if nothing is found.
+    """
+    if os.environ.get('_abaco_username'):
+        return os.environ.get('_abaco_username')
+    username = getattr(client, 'username', None)
+    if username:
+        return username
+    record = lookup(client)
+    if record is not None:
+        return record.get('username')
+    if profiles:
+        ratelimit.request('profiles')
+        username = client.profiles.get()['username']
+        remember(client, username)
+    return username
@@ -0,0 +1,63 @@
+"""
+Defer importing modules until they are first used
+
+Keeps `import reactors.runtime` cheap for reactors that never touch the
+heavier submodules and third-party dependencies.
+"""
+import importlib
+
+
+class LazyModule(object):
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_lazy_name'])
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return "<lazy module '{}'>".format(self.__dict__['_lazy_name'])
+
+
+def resolve(attributes, name):
+    """Import and return the attribute registered under name"""
+    module_name, attr = attributes[name]
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def module_getattr(module_globals, attributes):
+    """
+    Build a PEP 562 module __getattr__ for lazily imported attributes
+
+    Positional parameters:
+    module_globals - dict - globals() of the module being made lazy
+    attributes - dict - {name: (module_name, attribute_name)}
+
+    Resolved values are cached in module_globals, so each is imported once.
+    """
+    def __getattr__(name):
+        if name in attributes:
+            value = resolve(attributes, name)
+            module_globals[name] = value
+            return value
+        raise AttributeError("module '{}' has no attribute '{}'".format(
+            module_globals.get('__name__'), name))
+    return __getattr__
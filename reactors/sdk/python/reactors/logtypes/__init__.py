@@ -1,2 +1,3 @@
 from .main import get_logger, get_screen_logger
 from .main import get_slack_logger
+from .main import add_stderr_handler
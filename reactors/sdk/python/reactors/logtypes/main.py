@@ -9,6 +9,7 @@ import json
 import os
 import time
 import logging
+import threading
 
 from .slack import SlackHandler
 from .logstash import LogstashPlaintextHandler
@@ -58,6 +59,77 @@ class RedactingFormatter(object):
         return getattr(self.orig_formatter, attr)
 
 
+class DynamicFieldsFilter(logging.Filter):
+    """Resolves callable structured log fields as each record is emitted"""
+    def __init__(self, fields):
+        logging.Filter.__init__(self)
+        self.fields = fields
+
+    def filter(self, record):
+        for (k, v) in list(self.fields.items()):
+            try:
+                setattr(record, k, v())
+            except Exception:
+                setattr(record, k, None)
+        return True
+
+
+# Handlers attached by this module, keyed by (logger name, kind)
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def _set_handler(logger, kind, spec, factory, formatter):
+    '''Attach one handler of a given kind to logger, reusing it if possible
+
+    The existing handler is kept, and only its formatter refreshed, if it
+    was built from an equal spec. Otherwise it is closed and replaced with
+    one from factory(). Calling this repeatedly never stacks handlers.
+    '''
+    key = (logger.name, kind)
+    with _handlers_lock:
+        handler = _handlers.get(key)
+        if handler is not None:
+            if handler not in logger.handlers \
+                    or handler._reactors_spec != spec:
+                _drop_handler(logger, handler)
+                handler = None
+        if handler is None:
+            handler = factory()
+            handler._reactors_spec = spec
+            logger.addHandler(handler)
+            _handlers[key] = handler
+        handler.setFormatter(formatter)
+        return handler
+
+
+def add_stderr_handler(logger, fmt, datefmt=None):
+    '''Attach a single STDERR handler with a plain format to logger
+
+    Safe to call every time a component that logs is built. Set the level
+    on the logger rather than on the handler, which is shared.
+    '''
+    return _set_handler(logger, 'stderr', (fmt, datefmt),
+                        logging.StreamHandler,
+                        logging.Formatter(fmt, datefmt=datefmt))
+
+
+def _remove_handler(logger, kind):
+    '''Detach and close the handler of a given kind, if there is one'''
+    with _handlers_lock:
+        handler = _handlers.pop((logger.name, kind), None)
+        if handler is not None:
+            _drop_handler(logger, handler)
+
+
+def _drop_handler(logger, handler):
+    logger.removeHandler(handler)
+    try:
+        handler.close()
+    except Exception:
+        pass
+
+
 def _get_logger(name, subname, log_level):
 
     logger_name = '.'.join([name, subname])
@@ -87,7 +159,11 @@ def _get_logstash_formatter(name, subname, redactions, fields, timestamp):
                  'message': '%(message)s',
                  'level': '%(levelname)s'}
     for (k, v) in list(fields.items()):
-        logstruct[k] = v
+        if callable(v):
+            # Resolved per-record by DynamicFieldsFilter
+            logstruct[k] = '%({})s'.format(k)
+        else:
+            logstruct[k] = v
 
     JSON_FORMAT = json.dumps(logstruct, indent=None, separators=(',', ':'))
     DATEFORMAT = "%Y-%m-%dT%H:%M:%SZ"
@@ -111,17 +187,18 @@ def get_screen_logger(name,
 
     # Create the STDERR logger
     text_formatter = _get_formatter(name, subname, redactions, timestamp)
-    stderrHandler = logging.StreamHandler()
-    stderrHandler.setFormatter(text_formatter)
-    logger.addHandler(stderrHandler)
+    _set_handler(logger, 'stderr', None, logging.StreamHandler,
+                 text_formatter)
 
     # Create FILE logger (mirror)
     log_file = settings.get('logs', {}).get('file', None)
     if log_file is not None:
         log_file_path = os.path.join(PWD, log_file)
-        fileHandler = logging.FileHandler(log_file_path)
-        fileHandler.setFormatter(text_formatter)
-        logger.addHandler(fileHandler)
+        _set_handler(logger, 'file', os.path.abspath(log_file_path),
+                     lambda: logging.FileHandler(log_file_path),
+                     text_formatter)
+    else:
+        _remove_handler(logger, 'file')
 
     # Create NETWORK logger if log_token present
     log_token = settings.get('logs', {}).get('token', None)
@@ -131,10 +208,21 @@ def get_screen_logger(name,
                                                  redactions,
                                                  fields,
                                                  timestamp)
-
-        networkHandler = LogstashPlaintextHandler(config, log_token)
-        networkHandler.setFormatter(json_formatter)
-        logger.addHandler(networkHandler)
+        spec = (json.dumps(config, sort_keys=True, default=str), log_token)
+        networkHandler = _set_handler(
+            logger, 'logstash', spec,
+            lambda: LogstashPlaintextHandler(config, log_token),
+            json_formatter)
+        # Fields may differ between calls, so rebuild the filter each time
+        for existing in list(networkHandler.filters):
+            if isinstance(existing, DynamicFieldsFilter):
+                networkHandler.removeFilter(existing)
+        dynamic_fields = dict((k, v) for (k, v) in list(fields.items())
+                              if callable(v))
+        if len(dynamic_fields) > 0:
+            networkHandler.addFilter(DynamicFieldsFilter(dynamic_fields))
+    else:
+        _remove_handler(logger, 'logstash')
 
     # TODO: Forward to log aggregator if token is set
     return logger
@@ -166,9 +254,9 @@ def get_slack_logger(name, subname,
     logger = _get_logger(name=name, subname=subname, log_level=log_level)
     text_formatter = _get_formatter(name, subname, redactions, timestamp)
     slacksettings = settings.get('slack', {})
-    slackHandler = SlackHandler(slacksettings)
-    slackHandler.setFormatter(text_formatter)
-    logger.addHandler(slackHandler)
+    spec = json.dumps(slacksettings, sort_keys=True, default=str)
+    _set_handler(logger, 'slack', spec,
+                 lambda: SlackHandler(slacksettings), text_formatter)
     return logger
 
 
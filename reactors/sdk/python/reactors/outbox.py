@@ -0,0 +1,303 @@
+"""
+Durable outbox for fire-and-forget messages
+
+Queued messages are appended to a small SQLite database and the sender
+returns at once. A background thread delivers them in batches, backing
+off exponentially after each failed attempt, and gives up on a message
+after max_attempts. Only the newest max_failed of those are kept, for
+failed() to report; older ones are deleted. Messages still queued when an execution ends stay in
+the database. When it lives in _REACTOR_TEMP or another persistent path,
+the next execution that opens the outbox sends them.
+
+Several executions may share one database. Each claims a batch before
+sending it, and claims older than CLAIM_TIMEOUT are presumed abandoned.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from contextlib import closing
+from time import time
+
+from . import storage
+from .process import thread_running
+
+OUTBOX_FILE = '.reactors-outbox.sqlite'
+THREAD_NAME = 'reactors-outbox-drainer'
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 10
+# Failed messages kept for failed(); older ones are deleted
+MAX_FAILED = 100
+FLUSH_TIMEOUT = 30
+MIN_BACKOFF = 1
+MAX_BACKOFF = 60
+# Seconds after which another execution may take over a claimed message
+CLAIM_TIMEOUT = 300
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    actor_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL,
+    failed INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT)"""
+
+
+def default_path():
+    """
+    Where the outbox database goes if no path is configured
+
+    Returns (path, durable). The database is durable if it is kept in
+    _REACTOR_TEMP. Otherwise it goes in the per-execution temp directory
+    and anything left in it at exit is lost.
+    """
+    path = storage.cache_path(OUTBOX_FILE)
+    if path is not None:
+        return path, True
+    return os.path.join(storage.paths.reactor.temp, OUTBOX_FILE), False
+
+
+def backoff(attempts):
+    """Seconds to wait before the next try after attempts failures"""
+    return min(MAX_BACKOFF, MIN_BACKOFF * (2 ** max(attempts - 1, 0)))
+
+
+class Outbox(object):
+    """
+    Queue of messages delivered by a background thread
+
+    Positional parameters:
+    sender - callable - takes a list of (actor_id, message, environment)
+             tuples and returns, in order, an executionId or the exception
+             raised sending each one
+
+    Keyword parameters:
+    path - str - database file. Defaults to default_path().
+    durable - bool - whether path outlives the execution
+    batch_size - int - most messages handed to sender at once
+    max_attempts - int - tries before a message is marked failed
+    max_failed - int - failed messages kept, newest first
+    logger - logging.Logger - where to report delivery failures
+    """
+
+    def __init__(self, sender, path=None, durable=True,
+                 batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS,
+                 max_failed=MAX_FAILED, logger=None):
+        if path is None:
+            path, durable = default_path()
+        self.sender = sender
+        self.path = path
+        self.durable = durable
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_failed = max_failed
+        self.logger = logger
+        self.token = '{}:{}'.format(os.getpid(), id(self))
+        self._closing = False
+        self._new_work = False
+        self._thread = None
+        self._pid = None
+        self._cond = threading.Condition()
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30,
+                                       isolation_level=None))
+
+    def put(self, actor_id, message, environment=None):
+        """Queue a message for delivery. Returns its outbox ID."""
+        now = time()
+        body = json.dumps(message)
+        env = json.dumps(environment or {})
+        storage.check_quota(len(body) + len(env))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO messages (actor_id, message, environment, '
+                'created, next_attempt) VALUES (?, ?, ?, ?, ?)',
+                (actor_id, body, env, now, now))
+            message_id = cursor.lastrowid
+        self.resume()
+        return message_id
+
+    def resume(self):
+        """Make sure the drainer is running if there is anything to send"""
+        with self._cond:
+            self._closing = False
+            self._new_work = True
+            if not thread_running(self._thread, self._pid):
+                self._thread = threading.Thread(target=self._run,
+                                                name=THREAD_NAME)
+                self._thread.daemon = True
+                self._pid = os.getpid()
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self, before=None):
+        """
+        Count messages not yet delivered or given up on
+
+        If before is set, only count those due to be tried by then.
+        """
+        query = 'SELECT COUNT(*) FROM messages WHERE failed = 0'
+        params = ()
+        if before is not None:
+            query = query + ' AND next_attempt <= ?'
+            params = (before,)
+        with self._connect() as conn:
+            return conn.execute(query, params).fetchone()[0]
+
+    def failed(self):
+        """Messages that were given up on, oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, actor_id, message, attempts, last_error '
+                'FROM messages WHERE failed = 1 ORDER BY id').fetchall()
+        return [{'id': row[0],
+                 'actor_id': row[1],
+                 'message': json.loads(row[2]),
+                 'attempts': row[3],
+                 'last_error': row[4]} for row in rows]
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Deliver what can be delivered within timeout seconds, then stop
+
+        Messages waiting out a backoff that ends after the deadline are
+        not waited for. Claims are released so that whatever is left can
+        be sent by the next execution. Returns the number left.
+        """
+        deadline = time() + (timeout or 0)
+        self.resume()
+        with self._cond:
+            while self.pending(before=deadline) > 0:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, MIN_BACKOFF))
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(max(deadline - time(), 0))
+            if thread.is_alive():
+                # Still sending; its claims will expire on their own
+                return self.pending()
+        with self._connect() as conn:
+            conn.execute('UPDATE messages SET claimed_by = NULL, '
+                         'claimed_at = NULL WHERE claimed_by = ?',
+                         (self.token,))
+        return self.pending()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._new_work = False
+                if self._closing:
+                    self._exit()
+                    return
+            try:
+                batch = self._claim()
+                if batch:
+                    self._deliver(batch)
+                delay = None if batch else self._next_due()
+            except sqlite3.Error as exc:
+                self._log('Outbox database error: {}'.format(exc))
+                batch, delay = [], MIN_BACKOFF
+            if batch:
+                with self._cond:
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                if self._new_work:
+                    continue
+                if delay is None or self._closing:
+                    self._exit()
+                    return
+                self._cond.wait(min(delay, MAX_BACKOFF))
+
+    def _exit(self):
+        if self._thread is threading.current_thread():
+            self._thread = None
+        self._cond.notify_all()
+
+    def _next_due(self):
+        """Seconds until the next message is due, or None if there is none"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT MIN(next_attempt) FROM messages '
+                               'WHERE failed = 0').fetchone()
+        if row is None or row[0] is None:
+            return None
+        return max(row[0] - time(), 0.01)
+
+    def _claim(self):
+        now = time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT id, actor_id, message, environment, attempts '
+                    'FROM messages WHERE failed = 0 AND next_attempt <= ? '
+                    'AND (claimed_by IS NULL OR claimed_at < ?) '
+                    'ORDER BY id LIMIT ?',
+                    (now, now - CLAIM_TIMEOUT, self.batch_size)).fetchall()
+                conn.executemany('UPDATE messages SET claimed_by = ?, '
+                                 'claimed_at = ? WHERE id = ?',
+                                 [(self.token, now, row[0]) for row in rows])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _deliver(self, rows):
+        items = [(row[1], json.loads(row[2]), json.loads(row[3]))
+                 for row in rows]
+        try:
+            results = self.sender(items)
+        except Exception as exc:
+            results = [exc] * len(rows)
+        now = time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._record(conn, rows, results, now)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _record(self, conn, rows, results, now):
+        """Delete sent messages, reschedule or fail the rest"""
+        gave_up = False
+        for row, result in zip(rows, results):
+            if result is not None and not isinstance(result, Exception):
+                conn.execute('DELETE FROM messages WHERE id = ?', (row[0],))
+                continue
+            attempts = row[4] + 1
+            failed = int(attempts >= self.max_attempts)
+            if failed:
+                gave_up = True
+                self._log('Gave up on queued message {} to {} after {} '
+                          'tries: {}'.format(row[0], row[1], attempts,
+                                             result))
+            conn.execute('UPDATE messages SET attempts = ?, '
+                         'next_attempt = ?, failed = ?, last_error = ?, '
+                         'claimed_by = NULL, claimed_at = NULL '
+                         'WHERE id = ?',
+                         (attempts, now + backoff(attempts), failed,
+                          str(result), row[0]))
+        if gave_up:
+            conn.execute('DELETE FROM messages WHERE failed = 1 AND id NOT IN '
+                         '(SELECT id FROM messages WHERE failed = 1 '
+                         'ORDER BY id DESC LIMIT ?)', (self.max_failed,))
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.error(message)
@@ -1,4 +1,5 @@
 """Run subprocesses from within Python"""
+import os
 import subprocess
 from datetime import datetime
 from attrdict import AttrDict
@@ -53,3 +54,13 @@ def run(command_list=[], permissive=False, shell=False, timeout=None):
             raise OSError(e)
 
     return response
+
+
+def thread_running(thread, pid):
+    """
+    Whether a background thread this process started is still running
+
+    Threads do not survive fork, so a thread started before one is gone
+    in the child. Pass the os.getpid() taken when the thread started.
+    """
+    return thread is not None and pid == os.getpid() and thread.is_alive()
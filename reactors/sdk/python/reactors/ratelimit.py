@@ -0,0 +1,235 @@
+"""
+Pace and budget calls to the Abaco and Agave APIs
+
+Every API call the SDK makes draws a token from a bucket for its
+endpoint family (actors, files, meta, profiles). Buckets are shared by
+every client and thread in the process, so a burst of calls is smoothed
+out to the configured rate rather than arriving at the tenant all at
+once.
+
+Retries also draw from a per-family budget: within a sliding window, at
+most retry_ratio retries per request plus retry_minimum are allowed. Once
+the budget is spent, callers give up instead of retrying, so a burst of
+failures does not turn into a retry storm.
+
+Limits are read from the ratelimit stanza of config.yml on first use.
+Pacing is off unless a rate is configured. A rate also caps the fan-out
+of Reactor.send_messages and Reactor.map, which then send at most that
+many messages per second however many workers they use.
+"""
+import threading
+
+from collections import deque
+from time import sleep, time
+
+FAMILIES = ('actors', 'files', 'meta', 'profiles')
+DEFAULT_RATE = 0
+DEFAULT_BURST = 50
+DEFAULT_RETRY_RATIO = 0.2
+DEFAULT_RETRY_MINIMUM = 10
+DEFAULT_WINDOW = 10
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at rate tokens per second up to burst
+
+    A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = float(rate or 0)
+        self.burst = max(float(burst or 0), 1.0)
+        self._tokens = self.burst
+        self._updated = time()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens now and return the seconds to wait before using them
+
+        The balance may go negative, which queues later callers behind
+        this one in the order they reserved.
+        """
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = time()
+            refill = (now - self._updated) * self.rate
+            self._tokens = min(self.burst, self._tokens + refill)
+            self._updated = now
+            self._tokens = self._tokens - tokens
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            sleep(delay)
+        return delay
+
+
+class RetryBudget(object):
+    """
+    Bound retries to a fraction of recent requests
+
+    Keyword parameters:
+    ratio - float - retries allowed per request made in the window
+    minimum - int - retries always allowed per window
+    window - float - length of the sliding window in seconds
+    """
+
+    def __init__(self, ratio=DEFAULT_RETRY_RATIO,
+                 minimum=DEFAULT_RETRY_MINIMUM, window=DEFAULT_WINDOW):
+        self.ratio = float(ratio or 0)
+        self.minimum = int(minimum or 0)
+        self.window = float(window or 0)
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        horizon = now - self.window
+        for events in (self._requests, self._retries):
+            while events and events[0] < horizon:
+                events.popleft()
+
+    def request(self):
+        """Record a first attempt"""
+        with self._lock:
+            now = time()
+            self._expire(now)
+            self._requests.append(now)
+
+    def retry(self):
+        """Record a retry if the budget allows one. Returns False if not."""
+        with self._lock:
+            now = time()
+            self._expire(now)
+            allowed = self.minimum + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RateLimiter(object):
+    """
+    Token bucket and retry budget for one endpoint family
+
+    Call request() before each first attempt and retry() before each
+    retry. retry() returns False when the budget is spent, in which
+    case the caller should give up.
+    """
+
+    def __init__(self, family, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 retry_ratio=DEFAULT_RETRY_RATIO,
+                 retry_minimum=DEFAULT_RETRY_MINIMUM, window=DEFAULT_WINDOW):
+        self.family = family
+        self.bucket = TokenBucket(rate, burst)
+        self.budget = RetryBudget(retry_ratio, retry_minimum, window)
+
+    def request(self):
+        """Wait for a token for a first attempt"""
+        self.budget.request()
+        return self.bucket.acquire()
+
+    def retry(self):
+        """Wait for a token for a retry. False if the budget is spent."""
+        if not self.budget.retry():
+            return False
+        self.bucket.acquire()
+        return True
+
+    def allow_retry(self):
+        """
+        Spend a retry from the budget without waiting for a token
+
+        For callers whose retried call draws its own token via request().
+        """
+        return self.budget.retry()
+
+    def reserve_request(self):
+        """Like request() but returns the seconds to wait instead"""
+        self.budget.request()
+        return self.bucket.reserve()
+
+    def reserve_retry(self):
+        """Like retry() but returns the seconds to wait, or None if spent"""
+        if not self.budget.retry():
+            return None
+        return self.bucket.reserve()
+
+
+def _settings():
+    # Deferred so agaveutils can use this module without loading utils
+    try:
+        from .utils import read_config
+        return read_config().get('ratelimit', None) or {}
+    except Exception:
+        return {}
+
+
+def _build(family, settings):
+    opts = settings.get(family, None)
+    if not isinstance(opts, dict):
+        opts = {}
+
+    def option(key, default):
+        value = opts.get(key, settings.get(key, None))
+        if value is None:
+            return default
+        return value
+    return RateLimiter(family,
+                       rate=float(option('rate', DEFAULT_RATE)),
+                       burst=float(option('burst', DEFAULT_BURST)),
+                       retry_ratio=float(option('retry_ratio',
+                                                DEFAULT_RETRY_RATIO)),
+                       retry_minimum=int(option('retry_minimum',
+                                                DEFAULT_RETRY_MINIMUM)),
+                       window=float(option('window', DEFAULT_WINDOW)))
+
+
+def configure(settings=None):
+    """
+    (Re)build every family's limiter from a ratelimit settings dict
+
+    Defaults to the ratelimit stanza of the SDK configuration. Each
+    family's own keys override the top-level ones.
+    """
+    if settings is None:
+        settings = _settings()
+    with _lock:
+        for family in FAMILIES:
+            _limiters[family] = _build(family, settings)
+
+
+def get_limiter(family):
+    """Return the process-wide RateLimiter for an endpoint family"""
+    limiter = _limiters.get(family)
+    if limiter is None:
+        if family not in FAMILIES:
+            raise ValueError('Unknown API family: {}'.format(family))
+        configure()
+        limiter = _limiters[family]
+    return limiter
+
+
+def request(family):
+    """Wait for a token before a first call to family"""
+    return get_limiter(family).request()
+
+
+def retry(family):
+    """Wait for a token before retrying family. False if budget is spent."""
+    return get_limiter(family).retry()
+
+
+def allow_retry(family):
+    """Spend one of family's retries. False if the budget is spent."""
+    return get_limiter(family).allow_retry()
@@ -1 +1,7 @@
 from .utils import *
+from . import utils as _utils
+
+
+def __getattr__(name):
+    # Names that reactors.utils resolves lazily (PEP 562)
+    return getattr(_utils, name)
@@ -0,0 +1,67 @@
+"""
+Fan work items out to an actor and gather the results
+
+Reactor.map splits a list of items into chunks and sends each chunk to
+a worker actor as the message {'items': [...]}. Every message carries
+x_map_id and x_map_chunk in its environment. A worker that calls
+Reactor.map_result(value) leaves value in the key/value store for the
+parent, which reads it once the execution has finished. Results are
+yielded as MapResults in the order chunks finish, not the order sent.
+
+Results are stored as the worker's user, so workers must run as the
+same user as the parent. Messages carry the parent's username in
+x_map_user, and map_result refuses to store a result the parent could
+not read.
+
+The parent deletes each result once it has read it. Results of chunks
+the parent stopped waiting for stay in the key/value store, which does
+not expire keys on its own.
+"""
+ITEMS_KEY = 'items'
+MAP_ID_VAR = 'x_map_id'
+CHUNK_VAR = 'x_map_chunk'
+USER_VAR = 'x_map_user'
+RESULT_KEY = 'map-{}.{}'
+
+
+def chunked(items, chunk_size):
+    """Split items into lists of at most chunk_size"""
+    chunk_size = max(1, int(chunk_size))
+    items = list(items)
+    return [items[i:i + chunk_size]
+            for i in range(0, len(items), chunk_size)]
+
+
+def result_key(map_id, chunk):
+    """Key/value store key a worker's result for a chunk is kept under"""
+    return RESULT_KEY.format(map_id, chunk)
+
+
+class MapResult(object):
+    """
+    Outcome of one chunk sent by Reactor.map
+
+    Attributes:
+    index - int - position of the chunk among those sent
+    items - list - the items in the chunk
+    execution_id - str - execution that handled the chunk, if it was sent
+    record - dict - final execution record, if it finished
+    result - the value the worker stored with map_result, else None
+    error - AgaveError - why the chunk failed, else None
+    """
+
+    def __init__(self, index, items):
+        self.index = index
+        self.items = items
+        self.execution_id = None
+        self.record = None
+        self.result = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return 'MapResult(index={}, execution_id={}, ok={})'.format(
+            self.index, self.execution_id, self.ok)
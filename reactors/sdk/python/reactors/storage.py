@@ -2,39 +2,261 @@
 Utility library for supporting container-local,
 global POSIX, and eventually, object and document
 storage for TACC Reactors
+
+Paths are resolved on first use, so importing this module does no
+filesystem work. The per-execution temp directory is only created when
+it is first asked for, and is removed when the interpreter exits.
+
+paths used to be an AttrDict. It keeps the same interface: paths['user'],
+paths.get('user'), keys(), iteration, attribute access, and overriding a
+path by attribute or by item all still work. Code that merged it with +
+or added keys of its own should copy the values it needs instead.
 """
 
+import atexit
+import errno
+import json
 import os
+import shutil
 import tempfile
-from attrdict import AttrDict
+import threading
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Optional cap, in bytes, on what the SDK writes under paths.reactor.temp
+# and _REACTOR_TEMP. Same as storage.quota in config.yml.
+QUOTA_ENV = '_REACTOR_STORAGE_QUOTA'
+
+
+def _env_dir(varname, default):
+    """Value of an environment variable if it names a directory"""
+    value = os.environ.get(varname, None)
+    if value is not None and os.path.isdir(value):
+        return value
+    return default
+
+
+class LazyPaths(Mapping):
+    """
+    Attribute and item access to paths that are resolved on first use
+
+    Positional parameters:
+    resolvers - dict - {name: callable returning the path}
+    """
+
+    def __init__(self, resolvers):
+        self.__dict__['_resolvers'] = resolvers
+        self.__dict__['_resolved'] = {}
+        self.__dict__['_lock'] = threading.RLock()
+
+    def _resolve(self, name):
+        with self._lock:
+            if name not in self._resolved:
+                self._resolved[name] = self._resolvers[name]()
+            return self._resolved[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._resolvers:
+            raise AttributeError(name)
+        return self._resolve(name)
+
+    def __setattr__(self, name, value):
+        if name in self._resolvers:
+            with self._lock:
+                self._resolved[name] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    def __getitem__(self, name):
+        if name not in self._resolvers:
+            raise KeyError(name)
+        return self._resolve(name)
+
+    def __setitem__(self, name, value):
+        if name not in self._resolvers:
+            raise KeyError(name)
+        with self._lock:
+            self._resolved[name] = value
+
+    def __contains__(self, name):
+        return name in self._resolvers
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._resolvers)
+
+    def keys(self):
+        return sorted(self._resolvers.keys())
+
+    def get(self, name, default=None):
+        if name not in self._resolvers:
+            return default
+        return self._resolve(name)
+
+    def __repr__(self):
+        resolved = ', '.join('{}={!r}'.format(k, self._resolved[k])
+                             for k in sorted(self._resolved.keys()))
+        return '<{} {}>'.format(self.__class__.__name__, resolved)
+
+
+class ReactorPaths(LazyPaths):
+    """
+    Reactor-scoped scratch and temp directories
+
+    The temp directory is created on first access and removed at exit by
+    the process that created it. If a quota is set, usage() and
+    check_quota() track how much of it, and of _REACTOR_TEMP, is in use.
+    """
+
+    def __init__(self):
+        LazyPaths.__init__(self, {'scratch': self._get_scratch,
+                                  'default': self._get_scratch,
+                                  'temp': self._make_temp})
+        quota = os.environ.get(QUOTA_ENV, None)
+        self.quota = int(quota) if quota else None
+
+    def _get_scratch(self):
+        return _env_dir('_REACTOR_TEMP', os.getcwd())
+
+    def _make_temp(self):
+        path = tempfile.mkdtemp(prefix='abaco-', dir='/tmp')
+        atexit.register(_remove_temp, path, os.getpid())
+        self.__dict__['_temp_owner'] = os.getpid()
+        return path
+
+    def _resolve(self, name):
+        # A forked child gets its own temp directory rather than the
+        # parent's, which the parent will remove when it exits
+        if name == 'temp' and 'temp' in self._resolved and \
+                self.__dict__.get('_temp_owner') not in (None, os.getpid()):
+            with self._lock:
+                self._resolved.pop('temp', None)
+        return LazyPaths._resolve(self, name)
+
+    def usage(self):
+        """Bytes currently stored under the temp directory and _REACTOR_TEMP"""
+        places = [_env_dir('_REACTOR_TEMP', None)]
+        if 'temp' in self._resolved:
+            places.append(self._resolved['temp'])
+        total = 0
+        for place in places:
+            if place is None:
+                continue
+            for root, dirs, files in os.walk(place):
+                for fname in files:
+                    try:
+                        size = os.lstat(os.path.join(root, fname)).st_size
+                        total = total + size
+                    except OSError:
+                        pass
+        return total
+
+    def check_quota(self, additional=0):
+        """
+        Raise OSError (EDQUOT) if writing additional bytes to the temp
+        directory would exceed the quota. Returns bytes remaining, or None
+        if no quota is set.
+        """
+        if self.quota is None:
+            return None
+        remaining = self.quota - self.usage() - additional
+        if remaining < 0:
+            raise OSError(errno.EDQUOT,
+                          'Reactor temp quota of {} bytes exceeded'.format(
+                              self.quota),
+                          self._resolved.get('temp'))
+        return remaining
+
+
+def configure(settings=None):
+    """
+    Apply the storage stanza of the SDK configuration
+
+    A quota there replaces any set from the environment. read_config
+    calls this each time it reads the configuration.
+    """
+    quota = (settings or {}).get('quota', None)
+    if quota:
+        paths.reactor.quota = int(quota)
+
+
+def check_quota(additional=0):
+    """
+    Raise OSError (EDQUOT) if writing additional bytes would go over the
+    quota. Call before the SDK writes to paths.reactor.temp or
+    _REACTOR_TEMP. Returns bytes remaining, or None if no quota is set.
+    """
+    return paths.reactor.check_quota(additional)
+
+
+def _remove_temp(path, owner):
+    if os.getpid() == owner:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+paths = LazyPaths({
+    'default': os.getcwd,
+    'user': lambda: LazyPaths(
+        {'work': lambda: _env_dir('_USER_WORK', os.getcwd())}),
+    'project': lambda: LazyPaths(
+        {'archive': lambda: _env_dir('_PROJ_CORRAL', os.getcwd()),
+         'data': lambda: _env_dir('_PROJ_STOCKYARD', os.getcwd())}),
+    'reactor': ReactorPaths})
+
 
-HERE = os.getcwd()
-_paffs = AttrDict({'default': HERE,
-                   'user': {'work': HERE},
-                   'project': {'archive': HERE,
-                               'data': HERE},
-                   'reactor': {'scratch': os.getcwd(),
-                               'temp': tempfile.mkdtemp(prefix='abaco-',
-                                                        dir='/tmp')}})
+def cache_path(filename):
+    """
+    Path to filename in the container-persistent _REACTOR_TEMP directory
 
+    Returns None if _REACTOR_TEMP is not set or is not a directory, in
+    which case callers should skip on-disk caching.
+    """
+    scratch = os.environ.get('_REACTOR_TEMP', None)
+    if scratch is not None and os.path.isdir(scratch):
+        return os.path.join(scratch, filename)
+    return None
 
-if os.environ.get('_PROJ_CORRAL') is not None:
-    if os.path.isdir(os.environ.get('_PROJ_CORRAL')):
-        _paffs.project.archive = os.environ.get('_PROJ_CORRAL')
 
-if os.environ.get('_PROJ_STOCKYARD') is not None:
-    if os.path.isdir(os.environ.get('_PROJ_STOCKYARD')):
-        _paffs.project.data = os.environ.get('_PROJ_STOCKYARD')
+def read_cache(filename, default=None):
+    """Load a JSON document cached in _REACTOR_TEMP"""
+    path = cache_path(filename)
+    if path is None:
+        return default
+    try:
+        with open(path, 'r') as cached:
+            return json.load(cached)
+    except (IOError, OSError, ValueError):
+        return default
 
-if os.environ.get('_USER_WORK') is not None:
-    if os.path.isdir(os.environ.get('_USER_WORK')):
-        _paffs.user.work = os.environ.get('_USER_WORK')
 
-if os.environ.get('_REACTOR_TEMP') is not None:
-    if os.path.isdir(os.environ.get('_REACTOR_TEMP')):
-        _paffs.reactor.scratch = os.environ.get('_REACTOR_TEMP')
-        _paffs.reactor.default = _paffs.reactor.scratch
+def write_cache(filename, data):
+    """
+    Atomically write a JSON document to _REACTOR_TEMP
 
-paths = _paffs
+    Returns True if the document was written. Failures are swallowed since
+    these files are only ever a cache.
+    """
+    path = cache_path(filename)
+    if path is None:
+        return False
+    tmp_path = None
+    try:
+        document = json.dumps(data)
+        check_quota(len(document))
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + filename,
+                                        dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(document)
+        os.rename(tmp_path, path)
+        return True
+    except (IOError, OSError, TypeError, ValueError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return False
 
 # Verified Py3 compatible
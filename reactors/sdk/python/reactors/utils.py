@@ -1,41 +1,71 @@
-from __future__ import absolute_import
-
-from . import agaveutils, aliases, logtypes,\
-    jsonmessages, process, storage, uniqueid
 """
 Utility library for building TACC Reactors
 """
+from __future__ import absolute_import
 
+import copy
 import datetime
+import hashlib
 import json
 import os
-import petname
-import pytz
 import re
 import sys
-import validators
-import requests
+import threading
 
+from collections import OrderedDict
 from time import sleep, time
 from random import random
 
 from attrdict import AttrDict
-from agavepy.agave import Agave, AgaveError
-from agavepy.actors import get_context
-from agavepy.actors import get_client
-from requests.exceptions import HTTPError
-
+from .lazyimport import LazyModule, module_getattr, resolve
+
+# Submodules and heavy third-party dependencies are imported on first use
+agaveutils = LazyModule(__package__ + '.agaveutils')
+aio = LazyModule(__package__ + '.aio')
+aliasindex = LazyModule(__package__ + '.aliasindex')
+circuit = LazyModule(__package__ + '.circuit')
+claimcheck = LazyModule(__package__ + '.claimcheck')
+codec = LazyModule(__package__ + '.codec')
+executions = LazyModule(__package__ + '.executions')
+aliases = LazyModule(__package__ + '.aliases')
+cache = LazyModule(__package__ + '.cache')
+hostinfo = LazyModule(__package__ + '.hostinfo')
+identity = LazyModule(__package__ + '.identity')
+idempotency = LazyModule(__package__ + '.idempotency')
+logtypes = LazyModule(__package__ + '.logtypes')
+jsonmessages = LazyModule(__package__ + '.jsonmessages')
+outbox = LazyModule(__package__ + '.outbox')
+process = LazyModule(__package__ + '.process')
+ratelimit = LazyModule(__package__ + '.ratelimit')
+scatter = LazyModule(__package__ + '.scatter')
+storage = LazyModule(__package__ + '.storage')
+uniqueid = LazyModule(__package__ + '.uniqueid')
+petname = LazyModule('petname')
+pytz = LazyModule('pytz')
+validators = LazyModule('validators')
 # config library - replaces legacy config.py
-from tacconfig import config
+config = LazyModule('tacconfig.config')
+
+_agave = LazyModule('agavepy.agave')
+_actors = LazyModule('agavepy.actors')
+_http = LazyModule('requests.exceptions')
+_futures = LazyModule('concurrent.futures')
+
+# Classes and functions historically importable from this module. They
+# resolve on first access via module __getattr__ (PEP 562) where
+# available, and are imported up front on older Pythons.
+LAZY_ATTRIBUTES = {'Agave': ('agavepy.agave', 'Agave'),
+                   'AgaveError': ('agavepy.agave', 'AgaveError'),
+                   'get_context': ('agavepy.actors', 'get_context'),
+                   'get_client': ('agavepy.actors', 'get_client'),
+                   'HTTPError': ('requests.exceptions', 'HTTPError')}
+__getattr__ = module_getattr(globals(), LAZY_ATTRIBUTES)
+if sys.version_info < (3, 7):
+    for _name in LAZY_ATTRIBUTES:
+        globals()[_name] = resolve(LAZY_ATTRIBUTES, _name)
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 CONFIG_LOCS = [HERE, '/', os.getcwd()]
-sys.path.insert(0, os.path.dirname(HERE))
-sys.path.append(os.path.split(os.getcwd())[0])
-# print("sys_path: {}".format(sys.path))
-# sys.path.append('/reactors')
-# from . import agaveutils, alias, logs,\
-#     loggers, jsonmessages, process, storage, uniqueid
 
 VERSION = '0.6.6'
 LOG_LEVEL = 'DEBUG'
@@ -45,6 +75,15 @@ HASH_SALT = '97JFXMGWBDaFWt8a4d9NJR7z3erNcAve'
 MESSAGE_SCHEMA = '/message.jsonschema'
 MAX_ELAPSED = 300
 MAX_RETRIES = 5
+# Default ceiling on concurrent sends in Reactor.send_messages
+MAX_SEND_WORKERS = 8
+CONFIG_FILENAME = 'config.yml'
+CONFIG_SNAPSHOT_FILE = '.reactors-config.json'
+ACTOR_CACHE_FILE = '.reactors-actors.json'
+# Instance attribute holding the lock lazy_property builds under
+LAZY_LOCK_ATTR = '_lazy_lock'
+# Instance attribute tracking time spent in nested lazy_property builds
+LAZY_NESTED_ATTR = '_lazy_nested'
 SPECIAL_VARS_MAP = {'_abaco_actor_id': 'x_src_actor_id',
                     '_abaco_execution_id': 'x_src_execution_id',
                     'APP_ID': 'x_src_app_id',
@@ -61,6 +100,12 @@ ABACO_VARS_MAP = {'content_type': '_abaco_Content-Type',
                   'actor_id': '_abaco_actor_id',
                   'raw_message': 'MSG'}
 
+# (cache key, merged settings) from the most recent read_config
+_config_snapshot = None
+# Client built once by a parent process and inherited by forked children.
+# See reactors.zygote
+_shared_client = None
+
 
 def get_client_with_mock_support():
     '''
@@ -70,17 +115,19 @@ def get_client_with_mock_support():
     bootstrap a client from supplied credentials if running in local or
     debug mode.
     '''
+    if _shared_client is not None:
+        return _shared_client
     client = None
     if '_abaco_access_token' not in os.environ:
         try:
-            client = Agave.restore()
+            client = _agave.Agave.restore()
         except TypeError as err:
-            raise AgaveError('Unable to restore Agave client: {}'.format(err))
+            raise _agave.AgaveError('Unable to restore Agave client: {}'.format(err))
     else:
         try:
-            client = get_client()
+            client = _actors.get_client()
         except Exception as err:
-            raise AgaveError('Unable to get Agave client from context: {}'.format(err))
+            raise _agave.AgaveError('Unable to get Agave client from context: {}'.format(err))
 
     return client
 
@@ -93,7 +140,7 @@ def get_context_with_mock_support(agave_client):
     a test context based on inferred or mocked values if running in local or
     debug mode.
     '''
-    _context = get_context()
+    _context = _actors.get_context()
     if os.environ.get('_abaco_actor_id') is None:
         _phony_actor_id = uniqueid.get_id()
         _phony_exec_id = uniqueid.get_id()
@@ -162,79 +209,324 @@ def set_os_environ_from_client(agave_client):
 
 def read_config(namespace=NAMESPACE, places_list=CONFIG_LOCS,
                 update=True, env=True):
-    """Override tacconfig's broken right-favoring merge"""
+    """Override tacconfig's broken right-favoring merge
+
+    The merged result is cached in memory, keyed by the path, mtime, and
+    size of each config file plus a hash of the namespace's environment
+    overrides, so YAML is only parsed again when one of those changes.
+    """
+    global _config_snapshot
+    cache_key = [namespace, _config_files_key(places_list), env]
+    if env:
+        cache_key.append(_config_env_key(namespace))
+    if _config_snapshot is None or _config_snapshot[0] != cache_key:
+        master_config = _read_config_files(namespace, places_list,
+                                           cache_key[1])
+        if env and master_config is not None:
+            master_config.update(config.read_environment(master_config,
+                                                         namespace))
+        if master_config is not None:
+            storage.configure(master_config.get('storage', None))
+        _config_snapshot = (cache_key, master_config)
+    return copy.deepcopy(_config_snapshot[1])
+
+
+def _read_config_files(namespace, places_list, files_key):
+    """Merge config files, reusing the compiled snapshot in _REACTOR_TEMP
+
+    The snapshot holds only file contents. Environment overrides are
+    applied afterwards so that secrets passed via the environment are
+    never written to disk. If no config file was found there is nothing
+    to snapshot, so none is written.
+    """
+    snapshot = storage.read_cache(CONFIG_SNAPSHOT_FILE, default={})
+    if isinstance(snapshot, dict) and snapshot.get('key') == files_key \
+            and snapshot.get('config'):
+        return AttrDict(snapshot.get('config'))
+
     master_config = None
     for place in places_list:
         new_config = config.read_config(namespace=namespace,
                                         places_list=[place],
-                                        env=env)
+                                        env=False)
         if isinstance(new_config, dict) and master_config is None:
             master_config = new_config.copy()
         master_config = master_config + new_config
+    if master_config:
+        storage.write_cache(CONFIG_SNAPSHOT_FILE, {'key': files_key,
+                                                   'config': master_config})
     return master_config
 
 
+def _config_files_key(places_list):
+    """Path, mtime, and size of each candidate config file"""
+    files_key = []
+    for place in places_list:
+        fname = os.path.join(place, CONFIG_FILENAME)
+        try:
+            fstat = os.stat(fname)
+            files_key.append([fname, fstat.st_mtime, fstat.st_size])
+        except OSError:
+            files_key.append([fname, None, None])
+    return files_key
+
+
+def _config_env_key(namespace):
+    """Hash of all environment variables in the config namespace"""
+    overrides = sorted((k, v) for (k, v) in os.environ.items()
+                       if k.startswith(namespace))
+    return hashlib.sha256(
+        json.dumps(overrides).encode('utf-8')).hexdigest()
+
+
+def next_retry_delay(delay, limit=32):
+    """Random-skew exponential backoff with limit"""
+    return min(delay * (1.0 + random()), limit)
+
+
 def microseconds():
     return int(round(time() * 1000 * 1000))
 
 
+def setting_enabled(value):
+    """Interpret a config.yml or environment override value as a boolean"""
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class lazy_property(object):
+    """
+    Build an attribute on first access and memoize it on the instance
+
+    The computed value is stored in the instance __dict__ under the same
+    name, so later reads are plain attribute lookups and assignment simply
+    replaces the value. If the instance has a _record_phase method, it is
+    passed the name and build time in milliseconds, not counting time spent
+    building other lazy attributes along the way.
+
+    Builds are serialized by a reentrant lock held per instance, so an
+    attribute first read from several threads at once is built only once.
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.__name__ = builder.__name__
+        self.__doc__ = builder.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        values = instance.__dict__
+        # dict.setdefault is atomic, so racing threads get the same lock
+        lock = values.get(LAZY_LOCK_ATTR, None) or \
+            values.setdefault(LAZY_LOCK_ATTR, threading.RLock())
+        with lock:
+            if self.__name__ in values:
+                return values[self.__name__]
+            # Seconds spent in nested builds, innermost last
+            nested = values.setdefault(LAZY_NESTED_ATTR, [])
+            nested.append(0.0)
+            start = time()
+            try:
+                value = self.builder(instance)
+            finally:
+                elapsed = time() - start
+                own = elapsed - nested.pop()
+                if len(nested) > 0:
+                    nested[-1] = nested[-1] + elapsed
+            values[self.__name__] = value
+            record = getattr(instance, '_record_phase', None)
+            if record is not None:
+                record(self.__name__, own * 1000)
+            return value
+
+
 class Reactor(object):
     """
     Helper class providing a client-side API for the Actors service
+
+    Keyword arguments:
+    redactions - list - extra strings to mask in log output
+    lazy - bool - defer building the API client, context, alias store,
+                  loggers, and settings until they are first accessed
     """
 
-    def __init__(self, redactions=[]):
-        self.nickname = petname.Generate(2, '-')
-        self.client = get_client_with_mock_support()
-        self.context = get_context_with_mock_support(agave_client=self.client)
-        self._token = get_token_with_mock_support(self.client)
-        self.uid = self.context.get('actor_id')
-        self.execid = self.context.get('execution_id')
-        self.state = self.context.get('state')
+    # Components built at init unless lazy=True. Order matters, as later
+    # entries consume earlier ones.
+    EAGER_COMPONENTS = ('settings', 'nickname', 'client', 'context',
+                        '_token', 'uid', 'execid', 'state', 'aliases',
+                        'pemagent', 'session', 'username', '_redactions',
+                        'loggers', 'logger')
+
+    def __init__(self, redactions=[], lazy=False):
+        self.created = microseconds()
+        self.lazy = lazy
+        self.startup_profile = AttrDict({'version': VERSION,
+                                         'lazy': lazy,
+                                         'phases': OrderedDict(),
+                                         'total': None})
+        self._init_redactions = []
+        if isinstance(redactions, list):
+            self._init_redactions = list(redactions)
         self.worker_id = os.environ.get('_abaco_worker_id', None)
         self.container_repo = os.environ.get('_abaco_container_repo', None)
         self.actor_name = os.environ.get('_abaco_actor_name', None)
-        self.created = microseconds()
-        self.aliases = aliases.store.AliasStore(self.client,
-                                                aliasPrefix='v1-alias-')
-#        self.aliascache = {}
-        self.loggers = AttrDict({'screen': None, 'slack': None})
-        self.pemagent = agaveutils.recursive.PemAgent(self.client)
 
+        # Used by reactor implemetors to build conditionals for local testing
+        localonly = str(os.environ.get('LOCALONLY', 0))
+        if localonly == '1':
+            self.local = True
+        else:
+            self.local = False
+
+        if lazy is not True:
+            for component in self.EAGER_COMPONENTS:
+                getattr(self, component)
+            self.startup_profile['total'] = self.elapsed() / 1000.0
+            self.report_startup_profile()
+
+    def _record_phase(self, name, msec):
+        """Add a component build time to startup_profile
+
+        Only the components in EAGER_COMPONENTS are startup phases. Ones
+        built on demand later, such as the outbox, are not recorded.
+        """
+        if name not in self.EAGER_COMPONENTS:
+            return
+        self.startup_profile['phases'][name.lstrip('_')] = round(msec, 3)
+
+    def report_startup_profile(self):
+        """
+        Emit startup_profile as configured in settings
+
+        If logs.profile_log is true, the profile is logged as a single
+        JSON record. If logs.profile_file is set, the profile is written as
+        JSON to that filename in the reactor scratch directory.
+        """
+        log_settings = self.settings.get('logs', {})
+        profile_json = json.dumps(self.startup_profile,
+                                  separators=(',', ':'))
+        if setting_enabled(log_settings.get('profile_log', None)):
+            self.logger.info('startup_profile: {}'.format(profile_json))
+        profile_file = log_settings.get('profile_file', None)
+        if profile_file:
+            try:
+                path = os.path.join(storage.paths.reactor.scratch,
+                                    profile_file)
+                with open(path, 'w') as pfile:
+                    pfile.write(profile_json)
+            except (IOError, OSError) as exc:
+                self.logger.warning(
+                    'Failed to write startup profile: {}'.format(exc))
+
+    @lazy_property
+    def nickname(self):
+        """Human-friendly name for this execution"""
+        return petname.Generate(2, '-')
+
+    @lazy_property
+    def client(self):
+        """Agave API client"""
+        return get_client_with_mock_support()
+
+    @lazy_property
+    def context(self):
+        """Abaco execution context"""
+        return get_context_with_mock_support(agave_client=self.client)
+
+    @lazy_property
+    def _token(self):
+        return get_token_with_mock_support(self.client)
+
+    @lazy_property
+    def uid(self):
+        """Actor ID"""
+        return self.context.get('actor_id')
+
+    @lazy_property
+    def execid(self):
+        """Execution ID"""
+        return self.context.get('execution_id')
+
+    @lazy_property
+    def state(self):
+        """Actor state"""
+        return self.context.get('state')
+
+    @lazy_property
+    def aliases(self):
+        """AliasStore for resolving actor aliases, with a name cache"""
+        opts = self.settings.get('aliases', None) or {}
+        store = aliases.store
+        ttl = opts.get('ttl', None)
+        if ttl is None:
+            ttl = store.CACHE_TTL
+        negative_ttl = opts.get('negative_ttl', None)
+        if negative_ttl is None:
+            negative_ttl = store.NEGATIVE_TTL
+        entries = opts.get('max_entries', None) or store.CACHE_ENTRIES
+        return store.AliasStore(
+            self.client, aliasPrefix='v1-alias-', cacheTTL=float(ttl),
+            negativeTTL=float(negative_ttl), cacheEntries=int(entries),
+            sharedCache=setting_enabled(opts.get('shared', True)),
+            preload=setting_enabled(opts.get('preload', False)),
+            refreshInterval=float(opts.get('refresh', None) or 0))
+
+    @lazy_property
+    def alias_index(self):
+        """Aliases from the image's snapshot file, or None if it has none"""
+        opts = self.settings.get('aliases', None) or {}
+        path = opts.get('snapshot', None) or aliasindex.DEFAULT_PATH
+        max_age = opts.get('max_age', None) or aliasindex.DEFAULT_MAX_AGE
+        return aliasindex.load(path, max_age=float(max_age))
+
+    @lazy_property
+    def pemagent(self):
+        """PemAgent for managing file permissions"""
+        return agaveutils.recursive.PemAgent(self.client)
+
+    @lazy_property
+    def session(self):
+        """Session identifier shared by a linked set of executions"""
         # A session in the Reactors context is a linked set of executions
         # that inherit an identifier from their parent. If a reactor doesn't
         # detect a session on init, it creates one from its nickname.
-        self.session = self.context.get('x_session',
-                                        self.context.get(
-                                            'SESSION',
-                                            self.nickname))
+        return self.context.get('x_session',
+                                self.context.get('SESSION', self.nickname))
 
+    @lazy_property
+    def username(self):
+        """Username of the requester"""
         # Abaco injects the requester's username into context. If it's not
         # present, we assume the code is running under local emulation or j
         # inside a unit test. Bootstrap by polling the profiles
-        # service to get username, a slow but reliabe operation.
+        # service to get username, a slow but reliabe operation, so the
+        # answer is cached for the lifetime of the access token.
         _username = self.context.get('username', None)
         if (_username is None) or (_username == ''):
             try:
                 # In testing mode, username is a private attribute of client
-                _username = self.client.profiles.get()['username']
+                _username = identity.get_username(self.client)
             except Exception:
-                _username = 'none'
-        self.username = _username
-
-        # Used by reactor implemetors to build conditionals for local testing
-        localonly = str(os.environ.get('LOCALONLY', 0))
-        if localonly == '1':
-            self.local = True
-        else:
-            self.local = False
+                _username = None
+        if (_username is None) or (_username == ''):
+            _username = 'none'
+        return _username
 
+    @lazy_property
+    def settings(self):
+        """Configuration merged from config.yml files and environment"""
         # Bootstrap configuration via tacconfig module
-        self.settings = read_config(namespace=NAMESPACE,
-                                    places_list=CONFIG_LOCS,
-                                    update=True,
-                                    env=True)
+        return read_config(namespace=NAMESPACE,
+                           places_list=CONFIG_LOCS,
+                           update=True,
+                           env=True)
 
+    @lazy_property
+    def _redactions(self):
         # Build up a list of text strings to redact in logs. We start with
         # redaction passed at init, then append values of any varable passed
         # as a tacconfig environment variable override. The assumption is that
@@ -242,10 +534,9 @@ class Reactor(object):
         # should thus not be easily discoverable.
         #
         # TODO - Integrate this with the eventual TACC secrets API
-        # TODO - Break out into a function to support unit testing
         envstrings = []
-        if len(redactions) > 0 and isinstance(redactions, list):
-            envstrings = redactions
+        if len(self._init_redactions) > 0:
+            envstrings = list(self._init_redactions)
         # The Oauth access token
         try:
             if len(self._token) > 3:
@@ -261,10 +552,11 @@ class Reactor(object):
             env_config_vals = []
         envstrings.extend(env_config_vals)
         # remove duplicates
-        envstrings = list(set(envstrings))
-
-        # Set up loggers
+        return list(set(envstrings))
 
+    @lazy_property
+    def loggers(self):
+        """Screen and Slack loggers"""
         # Dict of fields that we want to send with each logstash
         # structured log response
         extras = {'agent': self.uid,
@@ -273,33 +565,172 @@ class Reactor(object):
                   'username': self.username,
                   'session': self.session,
                   'resource': self.container_repo,
-                  'subtask': self.worker_id,
-                  'host_ip': requests.request('GET', 'http://myip.dnsomatic.com').text
-                  }
+                  'subtask': self.worker_id}
+
+        # The host address is discovered locally in the background and
+        # filled in as each record is sent. Set logs.host_ip to 'off' to
+        # leave it out or to a literal value to skip discovery.
+        host_ip = str(self.settings.get('logs', {}).get('host_ip', 'auto'))
+        if host_ip.lower() not in ('off', 'none', 'false', '0'):
+            host = hostinfo.get_host_identity(host_ip)
+            extras['host_ip'] = lambda: host.ip
+
+        loggers = AttrDict({'screen': None, 'slack': None})
 
         # Screen logger prints to the following, depending on configuration
         # STDERR - Always
         # FILE   - If log_file is provided
         # AGGREGATOR - If log_token is provided
-        self.loggers.screen = logtypes.get_screen_logger(
+        loggers.screen = logtypes.get_screen_logger(
             self.uid,
             self.execid,
             settings=self.settings,
-            redactions=envstrings,
+            redactions=self._redactions,
             fields=extras)
 
         # assuming either env or config.yml is set up
         # correctly, post messages from here to Slack
-        self.loggers.slack = logtypes.get_slack_logger(
+        loggers.slack = logtypes.get_slack_logger(
             self.uid, 'slack', settings=self.settings,
-            redactions=envstrings)
+            redactions=self._redactions)
+
+        return loggers
+
+    @lazy_property
+    def logger(self):
+        """Alias to the screen logger so that r.logger continues to work"""
+        return self.loggers.screen
+
+    @lazy_property
+    def circuit_breaker(self):
+        """Per-actor circuit breaker consulted before each send attempt"""
+        opts = self.settings.get('breaker', None) or {}
+        threshold = opts.get('threshold', circuit.DEFAULT_THRESHOLD)
+        cooldown = opts.get('cooldown', circuit.DEFAULT_COOLDOWN)
+        return circuit.CircuitBreaker(
+            threshold=int(threshold or 0),
+            cooldown=float(cooldown or 0),
+            shared=setting_enabled(opts.get('shared', False)))
+
+    @lazy_property
+    def claim_check(self):
+        """Sends oversized messages by reference. See reactors.claimcheck."""
+        opts = self.settings.get('claimcheck', None) or {}
+        threshold = opts.get('threshold', None)
+        if threshold is None:
+            threshold = claimcheck.DEFAULT_THRESHOLD
+        return claimcheck.ClaimCheck(self.client,
+                                     threshold=int(threshold or 0),
+                                     store=opts.get('store', None) or 'keyval',
+                                     system=opts.get('system', None),
+                                     path=opts.get('path', None),
+                                     cleanup=setting_enabled(
+                                         opts.get('cleanup', True)),
+                                     logger=self.logger)
+
+    @lazy_property
+    def message_codec(self):
+        """Compresses large outgoing messages. See reactors.codec."""
+        opts = self.settings.get('compression', None) or {}
+        level = opts.get('level', None) or codec.DEFAULT_LEVEL
+        return codec.Codec(threshold=int(opts.get('threshold', None) or 0),
+                           level=int(level))
+
+    @lazy_property
+    def message(self):
+        """
+        The message this execution received
 
-        # Alias to stderr logger so that r.logger continues to work
-        self.logger = self.loggers.screen
+        A dict for JSON messages, otherwise the raw string. If the
+        message was sent by claim check, the payload is fetched, verified,
+        and cached on first access. Compressed messages are decoded.
+        """
+        raw_message = self.context.get('raw_message', None)
+        message = raw_message
+        try:
+            message = json.loads(raw_message)
+        except (TypeError, ValueError):
+            message_dict = self.context.get('message_dict', None)
+            if message_dict:
+                message = dict(message_dict)
+        return self._decode_message(message)
+
+    @lazy_property
+    def idempotency_key(self):
+        """Idempotency key the sender attached to this message, if any"""
+        return self.context.get(idempotency.ENV_VAR, None) or None
+
+    @lazy_property
+    def seen_keys(self):
+        """Processed idempotency keys. See reactors.idempotency."""
+        opts = self.settings.get('idempotency', None) or {}
+        store = opts.get('store', None) or 'local'
+        path = None
+        if opts.get('path', None):
+            path = os.path.join(opts.get('path'), idempotency.SEEN_FILE)
+        keyval = None
+        if store == 'keyval':
+            keyval = self.claim_check.keyval
+        ttl = opts.get('ttl', None) or idempotency.DEFAULT_TTL
+        return idempotency.SeenKeys(store=store, ttl=float(ttl), path=path,
+                                    keyval=keyval)
+
+    @lazy_property
+    def actor_cache(self):
+        """Actor descriptions fetched by get_attr, keyed by actor ID"""
+        opts = self.settings.get('actors', None) or {}
+        ttl = opts.get('ttl', None)
+        if ttl is None:
+            ttl = cache.DEFAULT_TTL
+        negative_ttl = opts.get('negative_ttl', None)
+        if negative_ttl is None:
+            negative_ttl = cache.DEFAULT_NEGATIVE_TTL
+        entries = opts.get('max_entries', None) or cache.MAX_ENTRIES
+        filename = None
+        if setting_enabled(opts.get('shared', False)):
+            filename = ACTOR_CACHE_FILE
+        return cache.TTLCache(ttl=float(ttl), negative_ttl=float(negative_ttl),
+                              max_entries=int(entries), filename=filename)
+
+    @lazy_property
+    def execution_poller(self):
+        """Shared background poller used by send_message(sync=True)"""
+        return executions.ExecutionPoller(self.client, logger=self.logger)
+
+    @lazy_property
+    def outbox(self):
+        """Durable queue used by send_message(outbox=True)"""
+        opts = self.settings.get('outbox', None) or {}
+        path = None
+        if opts.get('path', None):
+            path = os.path.join(opts.get('path'), outbox.OUTBOX_FILE)
+        batch_size = opts.get('batch_size', None) or outbox.BATCH_SIZE
+        max_attempts = opts.get('max_attempts', None) or outbox.MAX_ATTEMPTS
+        max_failed = opts.get('max_failed', None)
+        if max_failed is None:
+            max_failed = outbox.MAX_FAILED
+        queue = outbox.Outbox(self._send_outbox_batch, path=path,
+                              batch_size=int(batch_size),
+                              max_attempts=int(max_attempts),
+                              max_failed=int(max_failed),
+                              logger=self.logger)
+        # Pick up anything left queued by earlier executions
+        queue.resume()
+        return queue
+
+    @lazy_property
+    def aio(self):
+        """Asyncio messaging client. Requires Python 3.5+ and aiohttp."""
+        if sys.version_info < (3, 5):
+            raise ImportError('Reactor.aio requires Python 3.5 or newer')
+        return aio.AsyncMessenger(self)
 
     def get_attr(self, attribute=None, actorId=None):
         """Retrieve dict of attributes for an actor
 
+        Descriptions are cached for actors.ttl seconds, and concurrent
+        callers asking for the same actor share one request.
+
         Parameters:
         attribute - str - Any top-level key in the Actor API model
         actorId   - str - Which actor (if not self) to fetch. Defaults to
@@ -327,7 +758,7 @@ class Reactor(object):
         else:
             fetch_id = actorId
         try:
-            myself = self.client.actors.get(actorId=fetch_id)
+            myself = self._get_actor(fetch_id)
             if attribute is None:
                 return myself
             else:
@@ -338,11 +769,55 @@ class Reactor(object):
             else:
                 return default_attr
 
+    def get_attrs(self, actorIds, attribute=None,
+                  maxWorkers=MAX_SEND_WORKERS):
+        """Retrieve attributes for many actors in parallel
+
+        Parameters:
+        actorIds - list - actor IDs to fetch
+        attribute - str - Any top-level key in the Actor API model
+
+        Returns:
+        dict - actor ID => its description, or the attribute, as get_attr
+               returns them, including its defaults for actors that
+               could not be fetched
+        """
+        unique_ids = []
+        for actor_id in actorIds:
+            if actor_id not in unique_ids:
+                unique_ids.append(actor_id)
+        if len(unique_ids) == 0:
+            return {}
+        workers = max(1, min(maxWorkers, len(unique_ids)))
+        agaveutils.size_connection_pool(self.client, workers)
+
+        def fetch(actor_id):
+            return self.get_attr(attribute, actorId=actor_id)
+
+        with _futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(unique_ids, pool.map(fetch, unique_ids)))
+
+    def _get_actor(self, actor_id):
+        """Cached actor description. KeyError if there is no such actor."""
+        def load():
+            ratelimit.request('actors')
+            try:
+                return self.client.actors.get(actorId=actor_id)
+            except _http.HTTPError as herr:
+                if herr.response is not None and \
+                        herr.response.status_code == 404:
+                    raise KeyError('No such actor: {}'.format(actor_id))
+                raise
+
+        # Callers get their own copy to change as they like
+        return copy.deepcopy(self.actor_cache.fetch(actor_id, load))
+
     def on_success(self, successMessage="Success"):
         """
         Log message and exit 0
         """
         self.logger.info(successMessage)
+        self.flush_outbox()
         sys.exit(0)
 
     def on_failure(self, failMessage="Failure", exceptionObject=None):
@@ -351,8 +826,62 @@ class Reactor(object):
         """
         self.logger.critical("{} : {}".format(
             failMessage, exceptionObject))
+        self.flush_outbox()
         sys.exit(1)
 
+    def flush_outbox(self, timeout=None):
+        """
+        Send messages queued in the outbox before the execution ends
+
+        Waits up to timeout seconds [outbox.flush_timeout in config].
+        Whatever is left stays queued for the next execution if the
+        outbox is durable. Returns the number of messages left.
+        """
+        opts = self.settings.get('outbox', None) or {}
+        if 'outbox' not in self.__dict__ and \
+                not setting_enabled(opts.get('enabled', False)):
+            return 0
+        if timeout is None:
+            timeout = opts.get('flush_timeout', None)
+            if timeout is None:
+                timeout = outbox.FLUSH_TIMEOUT
+        try:
+            left = self.outbox.flush(float(timeout))
+        except Exception as exc:
+            self.logger.error('Failed to flush outbox: {}'.format(exc))
+            return None
+        if left and self.outbox.durable:
+            self.logger.info(
+                '{} queued messages left for the next execution'.format(left))
+        elif left:
+            self.logger.warning(
+                '{} queued messages could not be sent'.format(left))
+        return left
+
+    def is_duplicate(self, key=None):
+        """
+        Whether this message has already been processed
+
+        Call before doing any expensive work. The key, by default the
+        sender's idempotency key, is recorded the first time it is seen,
+        so a repeat delivery within the TTL returns True. Messages with no
+        key are never duplicates. If the store cannot be reached, the
+        message is treated as new.
+        """
+        if key is None:
+            key = self.idempotency_key
+        if not key:
+            return False
+        try:
+            duplicate = not self.seen_keys.check_and_add(key)
+        except Exception as exc:
+            self.logger.warning(
+                'Failed to check idempotency key {}: {}'.format(key, exc))
+            return False
+        if duplicate:
+            self.logger.info('Duplicate message {} dropped'.format(key))
+        return duplicate
+
     def _make_sender_tags(self, senderTags=True):
         """
         Internal function for capturing actor and app provenance attributes
@@ -377,6 +906,27 @@ class Reactor(object):
         env_vars.update(sender_envs)
         return env_vars
 
+    def _set_idempotency_key(self, environment_vars, actor_id, message,
+                             key=None):
+        """
+        Add an idempotency key to a send's environment
+
+        key may be a string to use as is, True to derive one from the
+        recipient, session, and message, or False for none. None follows
+        idempotency.enabled in config. A key already in the environment
+        is kept.
+        """
+        if idempotency.ENV_VAR in environment_vars:
+            return environment_vars
+        if key is None:
+            opts = self.settings.get('idempotency', None) or {}
+            key = setting_enabled(opts.get('enabled', False))
+        if key is True:
+            key = idempotency.derive_key(actor_id, self.session, message)
+        if key:
+            environment_vars[idempotency.ENV_VAR] = str(key)
+        return environment_vars
+
     def resolve_actor_alias(self, alias):
         """
         Look up the identifier for a alias string
@@ -393,6 +943,8 @@ class Reactor(object):
         Note:
             Does basic optimization of returning an app ID or abaco actorId
             if they are passed, as we can safely assume those are not aliases.
+            With aliases.live_fallback on, an alias in the alias store takes
+            priority over an Abaco platform alias of the same name.
         """
 
         # Optimizations
@@ -419,6 +971,30 @@ class Reactor(object):
         except KeyError:
             pass
 
+        # Aliases in a snapshot file shipped with the image resolve with no
+        # network calls at all. See reactors.aliasindex
+        if self.alias_index is not None:
+            identifier = self.alias_index.get(alias)
+            if identifier:
+                return identifier
+
+        # With preloading on, aliases in the AliasStore snapshot resolve
+        # from memory. Nothing is looked up one alias at a time.
+        opts = self.settings.get('aliases', None) or {}
+        if setting_enabled(opts.get('preload', False)):
+            identifier = self.aliases.lookup_snapshot(alias)
+            if identifier:
+                return self.aliases.unquote(identifier)
+        # Opting in to live_fallback asks the alias store about the rest,
+        # with or without a snapshot file. That is a lookup per send
+        # (misses are cached for negative_ttl), and an alias in the store
+        # takes priority over an Abaco platform alias of the same name.
+        elif setting_enabled(opts.get('live_fallback', False)):
+            try:
+                return self.aliases.unquote(self.aliases.get_name(alias))
+            except ValueError:
+                pass
+
         # Resolution has not failed but rather has identified a value that is
         # likely to be an Abaco platform alias
         return alias
@@ -426,7 +1002,8 @@ class Reactor(object):
     def send_message(self, actorId, message,
                      environment={}, ignoreErrors=True,
                      senderTags=True, retryMaxAttempts=MAX_RETRIES,
-                     retryDelay=1, sync=False):
+                     retryDelay=1, sync=False, syncTimeout=None,
+                     outbox=None, idempotencyKey=None):
         """
         Send a message to an Abaco actor by ID, platform alias, or defined alias
 
@@ -440,20 +1017,376 @@ class Reactor(object):
             senderTags: bool - send provenance and session vars along
             retryDelay: int - seconds between retries on send failure
             retryMax: int - number of times (up to global MAX_RETRIES) to retry
-            sync: bool - not implemented - wait for message to execute
+            sync: bool - wait for the resulting execution to finish
+            syncTimeout: float - seconds to wait if sync is True [forever]
+            outbox: bool - queue the message and send it in the background.
+                    Ignored if sync is True. [outbox.enabled in config
+                    if ignoreErrors is True]
+            idempotencyKey: str/bool - key receivers use to drop repeats,
+                    or True to derive one from the message and session
+                    [idempotency.enabled in config]
 
         Returns:
             str: The excecutionId of the resulting execution
+            dict: If sync is True, the final execution record. Its status
+                  is not yet COMPLETE or ERROR if syncTimeout expired.
+            None: If the message was queued in the outbox
 
         Raises:
-            AgaveError: Raised if ignoreErrors is True
+            AgaveError: Raised if ignoreErrors is False
         """
 
         # Build dynamic list of variables. This is how attributes like
         # session and sender-id are propagated
-        environment_vars = self._get_environment(environment, senderTags)
+        environment_vars = self._get_environment(dict(environment),
+                                                 senderTags=senderTags)
         resolved_actor_id = self.resolve_actor_alias(actorId)
+        self._set_idempotency_key(environment_vars, resolved_actor_id,
+                                  message, idempotencyKey)
+
+        self.logger.info("Message.to: {}".format(actorId))
+        self.logger.debug("Message.body: {}".format(message))
+
+        if outbox is None:
+            opts = self.settings.get('outbox', None) or {}
+            outbox = ignoreErrors is True and \
+                setting_enabled(opts.get('enabled', False))
+        if outbox is True and sync is not True:
+            try:
+                queued = self.outbox.put(resolved_actor_id, message,
+                                         environment_vars)
+                self.logger.debug('Message queued as {}'.format(queued))
+                return None
+            except Exception as exc:
+                # Better sent late than not at all
+                self.logger.warning(
+                    'Failed to queue message, sending now: {}'.format(exc))
+
+        try:
+            message = self._encode_message(message)
+            execution_id = self._send_with_retries(resolved_actor_id, message,
+                                                   environment_vars,
+                                                   retryMaxAttempts,
+                                                   retryDelay)
+            if sync is not True:
+                return execution_id
+            return self._wait_for_execution(resolved_actor_id, execution_id,
+                                            syncTimeout, ignoreErrors)
+        except _agave.AgaveError as err:
+            # Maximum attempts have passed and execution_id was not returned
+            if ignoreErrors:
+                self.logger.error(str(err))
+            else:
+                raise
+
+    def send_messages(self, messages, senderTags=True,
+                      retryMaxAttempts=MAX_RETRIES, retryDelay=1,
+                      maxWorkers=MAX_SEND_WORKERS, sync=False,
+                      syncTimeout=None, idempotencyKey=None):
+        """
+        Send many messages concurrently
+
+        Each message is sent, and retried, as send_message would, on a pool
+        of at most maxWorkers threads sharing the API client's connections.
+        If ratelimit.rate is set in config.yml, sends are also paced to
+        that many per second, however many workers there are.
+
+        Arguments:
+            messages (list): (actorId, message) or
+                             (actorId, message, environment) tuples
+
+        Keyword Arguments:
+            senderTags: bool - send provenance and session vars along
+            retryDelay: int - seconds between retries on send failure
+            retryMaxAttempts: int - number of times to retry each message
+            maxWorkers: int - maximum number of sends in flight
+            sync: bool - wait for every resulting execution to finish
+            syncTimeout: float - seconds to wait for each if sync is True
+            idempotencyKey: bool - derive an idempotency key for each
+                    message [idempotency.enabled in config]. A string
+                    raises TypeError. Set a message's own key as
+                    x_idempotency_key in its environment.
+
+        Returns:
+            list: For each message, in input order, its executionId (its
+            final execution record if sync is True) or the AgaveError that
+            send_message would have raised
+        """
+        idempotency.check_bulk_key(idempotencyKey)
+        # Resolve aliases and build sender tags up front
+        logger = self.logger
+        jobs = []
+        for item in messages:
+            environment = {}
+            if len(item) > 2 and item[2] is not None:
+                environment = dict(item[2])
+            resolved_actor_id = self.resolve_actor_alias(item[0])
+            environment_vars = self._set_idempotency_key(
+                self._get_environment(environment, senderTags=senderTags),
+                resolved_actor_id, item[1], idempotencyKey)
+            jobs.append((item[0], resolved_actor_id, item[1],
+                         environment_vars))
+        if len(jobs) == 0:
+            return []
+        workers = max(1, min(maxWorkers, len(jobs)))
+        agaveutils.size_connection_pool(self.client, workers)
+
+        def send(job):
+            actor_id, resolved_actor_id, message, environment_vars = job
+            logger.info("Message.to: {}".format(actor_id))
+            logger.debug("Message.body: {}".format(message))
+            try:
+                execution_id = self._send_with_retries(
+                    resolved_actor_id, self._encode_message(message),
+                    environment_vars, retryMaxAttempts, retryDelay)
+                if sync is not True:
+                    return execution_id
+                return self._wait_for_execution(resolved_actor_id,
+                                                execution_id, syncTimeout,
+                                                ignoreErrors=False)
+            except _agave.AgaveError as err:
+                logger.error(str(err))
+                return err
+
+        with _futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(send, jobs))
+
+    def map(self, actorId, items, chunk_size=1, timeout=None,
+            environment={}, senderTags=True, maxWorkers=MAX_SEND_WORKERS,
+            retryMaxAttempts=MAX_RETRIES, retryDelay=1):
+        """
+        Fan items out to an actor in chunks and gather the results
+
+        Each chunk is sent as the message {'items': [...]}. At most
+        maxWorkers chunks are in flight at once, each waiting on its
+        execution via the shared poller. Workers return a value to the
+        caller with map_result. As with send_messages, a ratelimit.rate
+        in config.yml caps how many chunks are sent per second. See
+        reactors.scatter.
+
+        Arguments:
+            actorId (str): An actorId or alias of the worker actor
+            items (list): Work items. Each must serialize to JSON.
+
+        Keyword Arguments:
+            chunk_size: int - items per message
+            timeout: float - seconds to wait for the whole map [forever]
+            environment: dict - environment variables to pass to workers
+            senderTags: bool - send provenance and session vars along
+            maxWorkers: int - maximum number of chunks in flight
+            retryMaxAttempts: int - number of times to retry each send
+            retryDelay: int - seconds between retries on send failure
 
+        Yields:
+            MapResult: For each chunk, as its execution finishes. Chunks
+            that could not be sent or did not finish in time carry the
+            AgaveError in error.
+        """
+        logger = self.logger
+        resolved_actor_id = self.resolve_actor_alias(actorId)
+        base_env = self._get_environment(dict(environment),
+                                         senderTags=senderTags)
+        map_id = uniqueid.get_id()
+        chunks = scatter.chunked(items, chunk_size)
+        if len(chunks) == 0:
+            return
+        try:
+            # Workers check that they can leave results where we can read
+            base_env[scatter.USER_VAR] = \
+                self.claim_check.keyval._username()
+        except Exception as exc:
+            logger.debug('Map {}: username unknown: {}'.format(map_id, exc))
+        deadline = None
+        if timeout is not None:
+            deadline = time() + timeout
+        workers = max(1, min(maxWorkers, len(chunks)))
+        agaveutils.size_connection_pool(self.client, workers)
+        logger.info('Map {}: {} chunks to {}'.format(
+            map_id, len(chunks), actorId))
+        # Set when the caller stops iterating, so chunks stop waiting
+        stop = threading.Event()
+
+        def run(index):
+            outcome = scatter.MapResult(index, chunks[index])
+            environment_vars = dict(base_env)
+            environment_vars[scatter.MAP_ID_VAR] = map_id
+            environment_vars[scatter.CHUNK_VAR] = str(index)
+            environment_vars[idempotency.ENV_VAR] = '{}.{}'.format(map_id,
+                                                                   index)
+            try:
+                if stop.is_set() or \
+                        (deadline is not None and time() >= deadline):
+                    raise _agave.AgaveError(
+                        'Chunk {} of map {} not sent before timeout'.format(
+                            index, map_id))
+                message = {scatter.ITEMS_KEY: chunks[index]}
+                outcome.execution_id = self._send_with_retries(
+                    resolved_actor_id, self._encode_message(message),
+                    environment_vars, retryMaxAttempts, retryDelay)
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - time(), 0)
+                outcome.record = self._wait_for_execution(
+                    resolved_actor_id, outcome.execution_id, remaining,
+                    ignoreErrors=False, cancel=stop)
+                if outcome.record.get('status') != 'COMPLETE':
+                    raise _agave.AgaveError(
+                        'Execution {} of {} ended with status {}'.format(
+                            outcome.execution_id, resolved_actor_id,
+                            outcome.record.get('status')))
+                outcome.result = self._get_map_result(map_id, index)
+            except _agave.AgaveError as err:
+                logger.error(str(err))
+                outcome.error = err
+            return outcome
+
+        pool = _futures.ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(run, index) for index in range(len(chunks))]
+        try:
+            for future in _futures.as_completed(futures):
+                yield future.result()
+        finally:
+            # The caller may stop early. Chunks not yet sent are dropped
+            # and those in flight stop waiting.
+            stop.set()
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def map_result(self, result):
+        """
+        Return a value to the execution that sent this one work via map
+
+        The value is compressed and claim checked as a message would be,
+        and stored in the key/value store until the sender reads it.
+        Returns the key it was stored under, or None if this execution
+        was not started by map. Raises ValueError if this execution runs
+        as a different user than the sender, who could not read it.
+        """
+        map_id = self.context.get(scatter.MAP_ID_VAR, None)
+        chunk = self.context.get(scatter.CHUNK_VAR, None)
+        if not map_id or chunk is None:
+            self.logger.warning('map_result: not running as part of a map')
+            return None
+        owner = self.context.get(scatter.USER_VAR, None)
+        if owner:
+            username = self.claim_check.keyval._username()
+            if username != owner:
+                raise ValueError(
+                    'map_result: map {} was sent by {}, who cannot read '
+                    'results stored by {}'.format(map_id, owner, username))
+        key = scatter.result_key(map_id, chunk)
+        # Wrapped in an object so the stored text is never a bare string
+        value = json.dumps({'result': self._encode_message(result)},
+                           separators=(',', ':'))
+        self.claim_check.keyval.set(key, value)
+        return key
+
+    def _get_map_result(self, map_id, chunk):
+        """Fetch and delete a worker's stored result for a chunk, if any"""
+        key = scatter.result_key(map_id, chunk)
+        keyval = self.claim_check.keyval
+        try:
+            value = keyval.getvalue(key)
+        except ValueError as exc:
+            self.logger.debug('No result at {}: {}'.format(key, exc))
+            return None
+        try:
+            stored = json.loads(value)
+            result = self._decode_message(stored.get('result'))
+        except Exception as exc:
+            raise _agave.AgaveError(
+                'Failed to read result at {}: {}'.format(key, exc))
+        try:
+            keyval.rem(key)
+        except KeyError as exc:
+            self.logger.debug('Result at {} not removed: {}'.format(
+                key, exc))
+        return result
+
+    def _wait_for_execution(self, actor_id, execution_id, timeout,
+                            ignoreErrors=True, cancel=None):
+        """
+        Wait via the shared poller for an execution to finish
+
+        Returns the final execution record. If timeout expires, or the
+        threading.Event cancel is set, first, the latest record is
+        returned if ignoreErrors is True, otherwise AgaveError is raised.
+        """
+        execution = self.execution_poller.wait(actor_id, execution_id,
+                                               timeout=timeout,
+                                               cancel=cancel)
+        if execution.done():
+            return execution.record
+        if cancel is not None and cancel.is_set():
+            timeout_err = 'Stopped waiting for execution {} of {}'.format(
+                execution_id, actor_id)
+        else:
+            timeout_err = \
+                'Execution {} of {} did not finish within {} sec'.format(
+                    execution_id, actor_id, timeout)
+        if ignoreErrors:
+            self.logger.error(timeout_err)
+            return execution.record
+        raise _agave.AgaveError(timeout_err)
+
+    def asend_message(self, actorId, message, **kwargs):
+        """
+        Awaitable send_message for use from asyncio code
+
+        Accepts the same arguments as send_message, except sync, and is
+        shorthand for r.aio.send_message(). See reactors.aio.
+        """
+        return self.aio.send_message(actorId, message, **kwargs)
+
+    def _encode_message(self, message):
+        """Compress, then claim check, a message as configured"""
+        return self._claim_check(self.message_codec.encode(message))
+
+    def _decode_message(self, message):
+        """Undo what _encode_message did to a message"""
+        if claimcheck.is_envelope(message):
+            message = self.claim_check.claim(message)
+        return codec.decode(message)
+
+    def _claim_check(self, message):
+        """Swap an oversized message for a claim check envelope"""
+        if not self.claim_check.oversized(message):
+            return message
+        try:
+            return self.claim_check.check(message)
+        except Exception as exc:
+            raise _agave.AgaveError(
+                'Failed to store oversized message: {}'.format(exc))
+
+    def _send_outbox_batch(self, batch):
+        """
+        Send a batch for the outbox drainer, one attempt per message
+
+        The outbox backs off and tries failed messages again later.
+        """
+        workers = max(1, min(MAX_SEND_WORKERS, len(batch)))
+        agaveutils.size_connection_pool(self.client, workers)
+
+        def send(item):
+            try:
+                return self._send_with_retries(
+                    item[0], self._encode_message(item[1]), item[2], 0, 0)
+            except _agave.AgaveError as err:
+                return err
+
+        with _futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(send, batch))
+
+    def _send_with_retries(self, resolved_actor_id, message,
+                           environment_vars, retryMaxAttempts, retryDelay):
+        """
+        Send one message, retrying with random-skew exponential backoff
+
+        Returns the executionId. Raises AgaveError once retries run out.
+        The circuit breaker counts a send that fails after all of its
+        retries as one failure. A 404 is not counted.
+        """
         retry = retryDelay
         attempts = 0
         execution_id = None
@@ -461,11 +1394,24 @@ class Reactor(object):
         noexecid_err = 'Response received from {} but no executionId was found'
         exception_err = 'Exception encountered messaging {}'
         terminal_err = 'Message to {} failed after {} tries with errors: {}'
-
-        self.logger.info("Message.to: {}".format(actorId))
-        self.logger.debug("Message.body: {}".format(message))
-
+        open_err = 'Message to {} not sent: circuit open after {} ' + \
+            'consecutive failures'
+        budget_err = 'Message to {} not retried: actors retry budget ' + \
+            'spent. Errors: {}'
+        breaker = self.circuit_breaker
+        limiter = ratelimit.get_limiter('actors')
+
+        limiter.request()
+        if not breaker.allow(resolved_actor_id):
+            raise _agave.AgaveError(open_err.format(resolved_actor_id,
+                                                    breaker.threshold))
+        counted = True
         while attempts <= retryMaxAttempts:
+            # Stop retrying if another send has opened the circuit
+            if attempts > 0 and \
+                    breaker.state(resolved_actor_id) == circuit.OPEN:
+                raise _agave.AgaveError(open_err.format(resolved_actor_id,
+                                                        breaker.threshold))
             try:
                 response = self.client.actors.sendMessage(
                     actorId=resolved_actor_id,
@@ -475,6 +1421,7 @@ class Reactor(object):
                 if 'executionId' in response:
                     execution_id = response.get('executionId')
                     if execution_id is not None:
+                        breaker.success(resolved_actor_id)
                         return execution_id
                     else:
                         self.logger.error(
@@ -483,11 +1430,13 @@ class Reactor(object):
                     self.logger.error(
                         noexecid_err.format(resolved_actor_id))
 
-            except HTTPError as herr:
+            except _http.HTTPError as herr:
                 if herr.response.status_code == 404:
                     # Agave never returns 404 unless the thing isn't there
-                    # so might as well bail out early if we see one
+                    # so might as well bail out early if we see one. A
+                    # mistyped actor ID says nothing about the service.
                     attempts = retryMaxAttempts + 1
+                    counted = False
                 else:
                     http_err_resp = agaveutils.process_agave_httperror(herr)
                     self.logger.error(http_err_resp)
@@ -500,23 +1449,20 @@ class Reactor(object):
                 self.logger.error(exception_err.format(resolved_actor_id))
 
             attempts = attempts + 1
-            # random-skew exponential backoff with limit
             if attempts <= retryMaxAttempts:
+                if not limiter.retry():
+                    breaker.failure(resolved_actor_id)
+                    raise _agave.AgaveError(
+                        budget_err.format(resolved_actor_id, exceptions))
                 self.logger.debug('pause {} sec then try again'.format(retry))
                 sleep(retry)
-                retry = retry * (1.0 + random())
-                if retry > 32:
-                    retry = 32
+                retry = next_retry_delay(retry)
 
-        # Maximum attempts have passed and execution_id was not returned
-        if ignoreErrors:
-            self.logger.error(terminal_err.format(resolved_actor_id,
-                                                  retryMaxAttempts,
-                                                  exceptions))
-        else:
-            raise AgaveError(terminal_err.format(resolved_actor_id,
-                                                 retryMaxAttempts,
-                                                 exceptions))
+        if counted:
+            breaker.failure(resolved_actor_id)
+        raise _agave.AgaveError(terminal_err.format(resolved_actor_id,
+                                                    retryMaxAttempts,
+                                                    exceptions))
 
     def validate_message(self,
                          messagedict,
@@ -558,11 +1504,11 @@ class Reactor(object):
                 return uri
             else:
                 raise ValueError("Webhook URI {} is not valid".format(uri))
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def delete_webhook(self, webhook, actorId=None):
@@ -585,11 +1531,11 @@ class Reactor(object):
             m = re.search('x-nonce=([A-Z0-9a-z\\.]+_[A-Z0-9a-z]+)', webhook)
             nonce_id = m.groups(0)[0]
             self.delete_nonce(nonceId=nonce_id, actorId=_actorId)
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def add_nonce(self, permission='READ', maxuses=1, actorId=None):
@@ -617,14 +1563,15 @@ class Reactor(object):
         try:
             body = {'level': permission,
                     'maxUses': maxuses}
+            ratelimit.request('actors')
             resp = self.client.actors.addNonce(actorId=_actorId,
                                                body=json.dumps(body))
             return resp
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def get_nonce(self, nonceId, actorId=None):
@@ -643,14 +1590,15 @@ class Reactor(object):
             _actorId = self.uid
 
         try:
+            ratelimit.request('actors')
             resp = self.client.actors.getNonce(
                 actorId=_actorId, nonceId=nonceId)
             return resp
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def delete_nonce(self, nonceId, actorId=None):
@@ -669,14 +1617,15 @@ class Reactor(object):
             _actorId = self.uid
 
         try:
+            ratelimit.request('actors')
             resp = self.client.actors.deleteNonce(
                 actorId=_actorId, nonceId=nonceId)
             return resp
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def list_nonces(self, actorId=None):
@@ -695,14 +1644,15 @@ class Reactor(object):
             _actorId = self.uid
 
         try:
+            ratelimit.request('actors')
             resp = self.client.actors.listNonces(
                 actorId=_actorId)
             return resp
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def delete_all_nonces(self, actorId=None):
@@ -722,11 +1672,11 @@ class Reactor(object):
             assert isinstance(nonces, list)
             for nonce in nonces:
                 self.delete_nonce(nonce.get('id'), actorId=_actorId)
-        except HTTPError as h:
+        except _http.HTTPError as h:
             http_err_resp = agaveutils.process_agave_httperror(h)
-            raise AgaveError(http_err_resp)
+            raise _agave.AgaveError(http_err_resp)
         except Exception as e:
-            raise AgaveError(
+            raise _agave.AgaveError(
                 "Unknown error: {}".format(e))
 
     def _get_nonce_vals(self):
@@ -0,0 +1,209 @@
+"""
+Replay a backlog of messages through a reactor without paying interpreter
+startup for every message
+
+The SDK is imported, and settings and the API client are built, once in
+a parent process. The parent then forks one child per message. Each
+child runs the reactor script with that message as MSG.
+
+Usage:
+  python -m reactors.zygote [-s /reactor.py] [-j 4] [-o results.json] MESSAGES
+
+MESSAGES is a file, or - for stdin, holding one message per line.
+"""
+from __future__ import print_function
+
+import argparse
+import atexit
+import json
+import os
+import random
+import sys
+import traceback
+
+from time import time
+
+DEFAULT_SCRIPT = '/reactor.py'
+DEFAULT_PARALLELISM = 1
+# Modules every reactor execution ends up importing
+WARM_MODULES = ('agaveutils', 'aliases', 'hostinfo', 'jsonmessages',
+                'logtypes', 'uniqueid', 'petname', 'pytz', 'validators',
+                '_agave', '_actors', '_http')
+
+
+def warm():
+    """
+    Import the SDK and build state that children would otherwise rebuild
+
+    Returns the elapsed time in milliseconds.
+    """
+    start = time()
+    from . import utils
+    for name in WARM_MODULES:
+        getattr(utils, name)._load()
+    utils.read_config()
+    try:
+        utils._shared_client = utils.get_client_with_mock_support()
+    except Exception as exc:
+        print('zygote: unable to warm API client: {}'.format(exc),
+              file=sys.stderr)
+    return (time() - start) * 1000
+
+
+def read_messages(source):
+    """Read one message per non-blank line from a file or - for stdin"""
+    if source == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(source, 'r') as messages:
+            lines = messages.readlines()
+    return [line.rstrip('\r\n') for line in lines if line.strip() != '']
+
+
+class ExitHandlers(object):
+    """
+    Exit handlers registered by a forked child
+
+    A child ends with os._exit, which runs no atexit handlers, so those
+    inherited from the parent are never run there. While installed, this
+    takes the place of atexit.register and atexit.unregister so that the
+    child's own handlers are kept here and run by run().
+    """
+
+    def __init__(self):
+        self.handlers = []
+
+    def install(self):
+        atexit.register = self.register
+        atexit.unregister = self.unregister
+
+    def register(self, func, *args, **kwargs):
+        self.handlers.append((func, args, kwargs))
+        return func
+
+    def unregister(self, func):
+        self.handlers = [h for h in self.handlers if h[0] != func]
+
+    def run(self):
+        """Call the handlers, last registered first, reporting failures"""
+        while self.handlers:
+            func, args, kwargs = self.handlers.pop()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                traceback.print_exc()
+
+
+def _run_child(code, script, message):
+    """Execute the reactor script in a forked child. Never returns."""
+    exit_code = 0
+    handlers = ExitHandlers()
+    try:
+        handlers.install()
+        # Forked children would otherwise share nicknames and sessions
+        random.seed()
+        os.environ['MSG'] = message
+        sys.argv = [script]
+        exec(code, {'__name__': '__main__', '__file__': script})
+    except SystemExit as exc:
+        if exc.code is None:
+            exit_code = 0
+        elif isinstance(exc.code, int):
+            exit_code = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    try:
+        handlers.run()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+
+def run(script, messages, parallel=DEFAULT_PARALLELISM):
+    """
+    Fork a child per message, running at most parallel at once
+
+    Positional parameters:
+    script - str - path to the reactor script
+    messages - list - one MSG value per child
+
+    Keyword parameters:
+    parallel - int - maximum number of concurrent children
+
+    Returns:
+    A list of {index, pid, exit_code, elapsed_msec} in message order
+    """
+    with open(script, 'r') as source:
+        code = compile(source.read(), script, 'exec')
+
+    results = [None] * len(messages)
+    running = {}
+    pending = list(range(len(messages)))
+    pending.reverse()
+    while pending or running:
+        while pending and len(running) < max(1, parallel):
+            index = pending.pop()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                _run_child(code, script, messages[index])
+            running[pid] = (index, time())
+
+        pid, status = os.wait()
+        if pid not in running:
+            continue
+        index, started = running.pop(pid)
+        if os.WIFEXITED(status):
+            exit_code = os.WEXITSTATUS(status)
+        else:
+            exit_code = -os.WTERMSIG(status)
+        results[index] = {'index': index,
+                          'pid': pid,
+                          'exit_code': exit_code,
+                          'elapsed_msec': round((time() - started) * 1000, 3)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run a reactor once per message from a pre-forked parent')
+    parser.add_argument('messages',
+                        help='file with one message per line, or - for stdin')
+    parser.add_argument('-s', '--script', default=DEFAULT_SCRIPT,
+                        help='reactor script [{}]'.format(DEFAULT_SCRIPT))
+    parser.add_argument('-j', '--parallel', type=int,
+                        default=DEFAULT_PARALLELISM,
+                        help='maximum concurrent children [{}]'.format(
+                            DEFAULT_PARALLELISM))
+    parser.add_argument('-o', '--output', default=None,
+                        help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    messages = read_messages(args.messages)
+    warm_msec = warm()
+    start = time()
+    results = run(args.script, messages, parallel=args.parallel)
+    summary = {'script': args.script,
+               'messages': len(messages),
+               'parallel': args.parallel,
+               'failed': len([r for r in results if r['exit_code'] != 0]),
+               'warm_msec': round(warm_msec, 3),
+               'elapsed_msec': round((time() - start) * 1000, 3),
+               'results': results}
+    report = json.dumps(summary, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""
+Offline cold-start and hot-path benchmarks for the Reactors SDK
+
+Every case runs against the in-memory client in fakeagave.py, so no
+network access or API credentials are needed. Results are written as
+JSON. Given a saved baseline, the run is compared against it and exits
+non-zero if any case got slower by more than the threshold.
+
+Usage:
+  python tests/benchmarks.py [-n 100] [-k CASE] [-o results.json]
+                             [-b baseline.json] [-t 0.25]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+
+from collections import OrderedDict
+from time import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+from fakeagave import FakeAgave, preserved_environ
+
+DEFAULT_ITERATIONS = 100
+# Relative slowdown of a case's median that counts as a regression
+DEFAULT_THRESHOLD = 0.25
+# Cold imports each start an interpreter, so run fewer of them
+IMPORT_ITERATIONS = 5
+MESSAGE_SCHEMA = os.path.join(PARENT, 'reactors', 'message.jsonschema')
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, iterations=None):
+    """
+    Register a benchmark case
+
+    The decorated function does any setup and returns a callable that
+    performs one timed operation. If iterations is set, it caps how many
+    times the case runs.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, iterations)
+        return setup
+    return register
+
+
+def _fake_reactor(lazy=False):
+    from reactors import utils
+    utils._shared_client = FakeAgave()
+    return utils.Reactor(lazy=lazy)
+
+
+@benchmark('import_runtime', iterations=IMPORT_ITERATIONS)
+def bench_import_runtime():
+    code = ('import sys; from time import time; start = time(); '
+            'import reactors.runtime; '
+            'sys.stdout.write(str((time() - start) * 1000000))')
+
+    def run():
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=PARENT)
+        return float(output.decode('utf-8').strip())
+    return run
+
+
+@benchmark('reactor_init')
+def bench_reactor_init():
+    return lambda: _fake_reactor()
+
+
+@benchmark('reactor_init_lazy')
+def bench_reactor_init_lazy():
+    return lambda: _fake_reactor(lazy=True)
+
+
+@benchmark('read_config')
+def bench_read_config():
+    from reactors import utils
+    return utils.read_config
+
+
+@benchmark('read_config_uncached')
+def bench_read_config_uncached():
+    from reactors import utils
+
+    def run():
+        utils._config_snapshot = None
+        utils.read_config()
+    return run
+
+
+@benchmark('redacting_formatter')
+def bench_redacting_formatter():
+    from reactors.logtypes.main import _get_formatter
+    # An access token, a few secrets from env overrides, and nonces
+    redactions = ['f4k3t0k3nV4lu3b7c1d2e3f4a5b6c7d8']
+    redactions.extend(['sekrit-value-{:04d}-xyzzy'.format(i)
+                       for i in range(25)])
+    redactions.extend(['Nonce{:012d}'.format(i) for i in range(25)])
+    formatter = _get_formatter('bench', 'format', redactions, True)
+    record = logging.LogRecord(
+        'bench.format', logging.INFO, __file__, 1,
+        'Message.body: %s', ({'data': 'x' * 256,
+                              'uri': 'agave://data-sd2e-community/a/b'},),
+        None)
+    return lambda: formatter.format(record)
+
+
+@benchmark('send_message')
+def bench_send_message():
+    r = _fake_reactor()
+    message = {'key': 'value', 'items': list(range(20))}
+    return lambda: r.send_message('fake-actor-id', message)
+
+
+@benchmark('send_messages_x20')
+def bench_send_messages():
+    r = _fake_reactor()
+    messages = [('fake-actor-{}'.format(i), {'key': 'value', 'n': i})
+                for i in range(20)]
+    return lambda: r.send_messages(messages)
+
+
+@benchmark('get_attr')
+def bench_get_attr():
+    r = _fake_reactor()
+    return lambda: r.get_attr('owner', actorId='fake-actor-id')
+
+
+@benchmark('keyval_set')
+def bench_keyval_set():
+    from reactors.aliases.agavedb import AgaveKeyValStore
+    store = AgaveKeyValStore(FakeAgave())
+    return lambda: store.set('benchkey', 'benchvalue')
+
+
+@benchmark('keyval_get')
+def bench_keyval_get():
+    from reactors.aliases.agavedb import AgaveKeyValStore
+    store = AgaveKeyValStore(FakeAgave())
+    for i in range(50):
+        store.set('benchkey{}'.format(i), 'benchvalue{}'.format(i))
+    return lambda: store.get('benchkey25')
+
+
+@benchmark('alias_get_name')
+def bench_alias_get_name():
+    from reactors.aliases.store import AliasStore
+    store = AliasStore(FakeAgave(), aliasPrefix='v1-alias-')
+    for i in range(50):
+        store.set_alias('bench-alias-{}'.format(i), 'actor-{}'.format(i))
+    return lambda: store.get_name('bench-alias-25')
+
+
+@benchmark('message_codec')
+def bench_message_codec():
+    from reactors.codec import Codec, decode
+    codec = Codec(threshold=1024)
+    # A manifest-like message: many similar records
+    message = {'manifest': [{'sample_id': 'sample.{:06d}'.format(i),
+                             'uri': 'agave://data-sd2e-community/uploads/'
+                                    'run-{}/sample.{:06d}.fcs'.format(i // 96,
+                                                                      i),
+                             'type': 'FCS', 'replicate': i % 3}
+                            for i in range(500)]}
+    return lambda: decode(codec.encode(message))
+
+
+@benchmark('validate_message')
+def bench_validate_message():
+    r = _fake_reactor(lazy=True)
+    message = {'key': 'value', 'nested': {'items': list(range(20))}}
+    return lambda: r.validate_message(message,
+                                      messageschema=MESSAGE_SCHEMA,
+                                      permissive=False)
+
+
+@benchmark('uri_to_agave')
+def bench_uri_to_agave():
+    from reactors.agaveutils import uri
+    return lambda: uri.to_agave_uri('data-sd2e-community',
+                                    'sample/jupyter', 'notebook.ipynb')
+
+
+@benchmark('uri_from_agave')
+def bench_uri_from_agave():
+    from reactors.agaveutils import uri
+    return lambda: uri.from_agave_uri(
+        'agave://data-sd2e-community/sample/jupyter/notebook.ipynb')
+
+
+@benchmark('uri_from_tacc_s3')
+def bench_uri_from_tacc_s3():
+    from reactors.agaveutils import uri
+    return lambda: uri.from_tacc_s3_uri(
+        's3://uploads/sample/jupyter/notebook.ipynb')
+
+
+@benchmark('uri_agave_from_http')
+def bench_uri_agave_from_http():
+    from reactors.agaveutils import uri
+    return lambda: uri.agave_uri_from_http(
+        'https://api.sd2e.org/files/v2/media/system/'
+        'data-sd2e-community/sample/jupyter/notebook.ipynb')
+
+
+@benchmark('uri_http_from_agave')
+def bench_uri_http_from_agave():
+    from reactors.agaveutils import uri
+    return lambda: uri.http_uri_from_agave(
+        'agave://data-sd2e-community/sample/jupyter/notebook.ipynb')
+
+
+def _median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2 == 1:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+def measure(func, iterations):
+    """
+    Time func over a number of iterations
+
+    If func returns a number, it is taken as that iteration's duration in
+    microseconds, which lets a case exclude its own overhead.
+
+    Returns:
+    A dict of iterations and min, median, mean, and max microseconds
+    """
+    timings = []
+    for i in range(iterations):
+        start = time()
+        reported = func()
+        elapsed = (time() - start) * 1000000
+        if isinstance(reported, float):
+            elapsed = reported
+        timings.append(elapsed)
+    return OrderedDict([('iterations', iterations),
+                        ('min_usec', round(min(timings), 3)),
+                        ('median_usec', round(_median(timings), 3)),
+                        ('mean_usec', round(sum(timings) / len(timings), 3)),
+                        ('max_usec', round(max(timings), 3))])
+
+
+def _isolate_environment():
+    """Make sure the SDK mocks its context instead of using a live one"""
+    for var in ('_abaco_actor_id', '_abaco_access_token', '_abaco_username',
+                '_abaco_execution_id'):
+        os.environ.pop(var, None)
+    os.environ['LOCALONLY'] = '1'
+
+
+def run(names=None, iterations=DEFAULT_ITERATIONS):
+    """
+    Run the named cases, or all of them
+
+    Log output written while a case runs is discarded so that it does not
+    swamp the report. It is still formatted, so its cost is measured.
+
+    Returns:
+    A dict of run metadata plus {case: measurements} under results
+    """
+    from reactors import ratelimit, utils
+    saved_client = utils._shared_client
+    results = OrderedDict()
+    # Reactor() exports its mocked context to the environment
+    with preserved_environ():
+        try:
+            _isolate_environment()
+            # Measure the SDK, not the pace set for the real API
+            ratelimit.configure({'rate': 0})
+            for name, (setup, max_iterations) in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                count = iterations
+                if max_iterations is not None:
+                    count = min(count, max_iterations)
+                stderr = sys.stderr
+                with open(os.devnull, 'w') as devnull:
+                    sys.stderr = devnull
+                    try:
+                        results[name] = measure(setup(), count)
+                    finally:
+                        sys.stderr = stderr
+        finally:
+            utils._shared_client = saved_client
+            ratelimit.configure()
+    return OrderedDict([('sdk_version', utils.VERSION),
+                        ('python', platform.python_version()),
+                        ('platform', platform.platform()),
+                        ('created', int(time())),
+                        ('results', results)])
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare median timings against a baseline report
+
+    Returns:
+    A list of {name, baseline_usec, current_usec, ratio, status}, where
+    status is one of regressed, improved, ok, or new
+    """
+    rows = []
+    base_results = baseline.get('results', {})
+    for name, result in current.get('results', {}).items():
+        row = OrderedDict([('name', name),
+                           ('baseline_usec', None),
+                           ('current_usec', result['median_usec']),
+                           ('ratio', None),
+                           ('status', 'new')])
+        base = base_results.get(name)
+        if base is not None and base.get('median_usec'):
+            ratio = result['median_usec'] / float(base['median_usec'])
+            row['baseline_usec'] = base['median_usec']
+            row['ratio'] = round(ratio, 3)
+            if ratio > 1 + threshold:
+                row['status'] = 'regressed'
+            elif ratio < 1 / (1 + threshold):
+                row['status'] = 'improved'
+            else:
+                row['status'] = 'ok'
+        rows.append(row)
+    return rows
+
+
+def _print_table(report, comparison=None):
+    if comparison is None:
+        for name, result in report['results'].items():
+            print('{:24} {:>12.1f} usec'.format(name, result['median_usec']),
+                  file=sys.stderr)
+        return
+    for row in comparison:
+        baseline = row['baseline_usec']
+        print('{:24} {:>12} {:>12.1f} usec {:>7} {}'.format(
+            row['name'],
+            '-' if baseline is None else '{:.1f}'.format(baseline),
+            row['current_usec'],
+            '-' if row['ratio'] is None else '{:.2f}x'.format(row['ratio']),
+            row['status']), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Offline benchmarks for the Reactors SDK')
+    parser.add_argument('-n', '--iterations', type=int,
+                        default=DEFAULT_ITERATIONS,
+                        help='iterations per case [{}]'.format(
+                            DEFAULT_ITERATIONS))
+    parser.add_argument('-k', '--case', action='append', dest='cases',
+                        choices=list(BENCHMARKS.keys()),
+                        help='run only this case (repeatable)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='write results as JSON to this file')
+    parser.add_argument('-b', '--baseline', default=None,
+                        help='compare against results saved from a prior run')
+    parser.add_argument('-t', '--threshold', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='slowdown that counts as a regression [{}]'.format(
+                            DEFAULT_THRESHOLD))
+    args = parser.parse_args(argv)
+
+    report = run(names=args.cases, iterations=args.iterations)
+    comparison = None
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as baseline:
+            comparison = compare(report, json.load(baseline),
+                                 threshold=args.threshold)
+        report['baseline'] = args.baseline
+        report['threshold'] = args.threshold
+        report['comparison'] = comparison
+
+    _print_table(report, comparison)
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as outfile:
+            outfile.write(output)
+    else:
+        print(output)
+    if comparison is not None and \
+            any(row['status'] == 'regressed' for row in comparison):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import ratelimit, utils
+from fakeagave import FakeAgave, preserved_environ
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # These use async/await syntax, which Python 2 cannot parse
+    collect_ignore.extend(['test_reactors_aio.py', 'fakeabaco.py'])
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    '''In-memory client used by every Reactor built during the test
+
+    The Abaco identity variables are cleared, so Reactors mock their
+    context, and API pacing is turned off. Whatever the Reactors export
+    to os.environ is undone afterwards.
+    '''
+    monkeypatch.delenv('_abaco_actor_id', raising=False)
+    monkeypatch.delenv('_abaco_access_token', raising=False)
+    monkeypatch.delenv('_abaco_actor_name', raising=False)
+    monkeypatch.setattr(ratelimit, '_limiters', {})
+    ratelimit.configure({'rate': 0})
+    client = FakeAgave()
+    monkeypatch.setattr(utils, '_shared_client', client)
+    with preserved_environ():
+        yield client
+
+
+@pytest.fixture
+def fake_reactor(fake_client):
+    '''Lazy Reactor built on fake_client'''
+    return utils.Reactor(lazy=True)
+
+
+@pytest.fixture
+def no_temp(monkeypatch):
+    '''No _REACTOR_TEMP, so nothing is cached on disk'''
+    monkeypatch.delenv('_REACTOR_TEMP', raising=False)
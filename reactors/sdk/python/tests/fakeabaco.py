@@ -0,0 +1,69 @@
+"""
+Local aiohttp server that imitates the Abaco messages endpoint
+
+Python 3.5+ only. Used to exercise reactors.aio without a live API.
+"""
+import asyncio
+import uuid
+
+from aiohttp import web
+
+
+class FakeAbaco(object):
+    """
+    POST /actors/v2/{actorId}/messages
+
+    Actor 'missing' returns 404. Actor 'flaky' returns 500 on its first
+    flaky_failures attempts. Actor 'odd' answers with a JSON list. Every
+    response is delayed by latency seconds.
+    """
+
+    def __init__(self, latency=0, flaky_failures=1):
+        self.latency = latency
+        self.flaky_failures = flaky_failures
+        self.messages = []
+        self.attempts = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.runner = None
+        self.url = None
+
+    async def handle_message(self, request):
+        actor_id = request.match_info['actorId']
+        self.attempts[actor_id] = self.attempts.get(actor_id, 0) + 1
+        self.in_flight = self.in_flight + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight = self.in_flight - 1
+        if actor_id == 'missing':
+            return web.json_response({'status': 'error'}, status=404)
+        if actor_id == 'flaky' and \
+                self.attempts[actor_id] <= self.flaky_failures:
+            return web.json_response({'status': 'error'}, status=500)
+        if actor_id == 'odd':
+            return web.json_response(['not', 'an', 'object'])
+        self.messages.append({'actorId': actor_id,
+                              'body': await request.json(),
+                              'environment': dict(request.query),
+                              'authorization':
+                                  request.headers.get('Authorization')})
+        return web.json_response(
+            {'status': 'success',
+             'result': {'executionId': uuid.uuid4().hex[:13]}})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/actors/v2/{actorId}/messages',
+                            self.handle_message)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = 'http://127.0.0.1:{}'.format(port)
+        return self.url
+
+    async def stop(self):
+        await self.runner.cleanup()
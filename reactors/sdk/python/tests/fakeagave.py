@@ -0,0 +1,167 @@
+"""
+In-memory stand-in for the parts of an AgavePy client the SDK uses
+
+Lets tests and benchmarks build a Reactor and exercise messaging and the
+key/value store without network access or API credentials.
+
+Usage:
+  from fakeagave import FakeAgave
+  utils._shared_client = FakeAgave()
+"""
+import contextlib
+import json
+import os
+import re
+import uuid
+
+from time import time
+
+
+@contextlib.contextmanager
+def preserved_environ():
+    """Restore os.environ on exit
+
+    A Reactor with a mocked context exports _abaco_* variables, which
+    would otherwise leak into whatever runs next.
+    """
+    saved = dict(os.environ)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+class FakeActors(object):
+    """
+    Accepts messages and reports on the resulting executions
+
+    An execution reads as RUNNING until its status has been checked
+    polls_to_complete times, then as COMPLETE.
+    """
+
+    def __init__(self, polls_to_complete=0):
+        self.polls_to_complete = polls_to_complete
+        self.messages = []
+        self.actors = {}
+        self.executions = {}
+        self.status_calls = 0
+        self.list_calls = 0
+
+    def sendMessage(self, actorId=None, body=None, environment=None):
+        self.messages.append({'actorId': actorId,
+                              'body': body,
+                              'environment': environment})
+        execution_id = uuid.uuid4().hex[:13]
+        self.executions[execution_id] = {'id': execution_id,
+                                         'actorId': actorId,
+                                         'status': 'SUBMITTED',
+                                         'checks': 0}
+        return {'executionId': execution_id,
+                'msg': body}
+
+    def get(self, actorId=None):
+        return self.actors.get(actorId, {'id': actorId,
+                                         'name': 'fake-' + str(actorId),
+                                         'owner': 'taco'})
+
+    def _check(self, execution):
+        execution['checks'] = execution['checks'] + 1
+        if execution['checks'] > self.polls_to_complete:
+            execution['status'] = 'COMPLETE'
+        else:
+            execution['status'] = 'RUNNING'
+        return {'id': execution['id'],
+                'actorId': execution['actorId'],
+                'status': execution['status']}
+
+    def getExecution(self, actorId=None, executionId=None):
+        self.status_calls = self.status_calls + 1
+        execution = self.executions.get(executionId)
+        if execution is None:
+            return {'id': executionId, 'actorId': actorId,
+                    'status': 'COMPLETE'}
+        return self._check(execution)
+
+    def listExecutions(self, actorId=None):
+        self.list_calls = self.list_calls + 1
+        return {'actorId': actorId,
+                'executions': [self._check(e)
+                               for e in list(self.executions.values())
+                               if e['actorId'] == actorId]}
+
+
+class FakeMeta(object):
+    def __init__(self, owner='taco'):
+        self.owner = owner
+        self.records = {}
+
+    def _matches(self, query, record):
+        if query is None:
+            return True
+        name = json.loads(query).get('name')
+        if isinstance(name, dict):
+            flags = re.IGNORECASE if 'i' in name.get('$options', '') else 0
+            return re.search(name['$regex'], record['name'], flags) is not None
+        return record['name'] == name
+
+    def listMetadata(self, q=None, limit=None, offset=None):
+        matched = [dict(r) for r in self.records.values()
+                   if self._matches(q, r)]
+        matched = matched[offset or 0:]
+        if limit is not None:
+            matched = matched[:limit]
+        return matched
+
+    def addMetadata(self, body=None):
+        record = json.loads(body)
+        key_uuid = uuid.uuid4().hex
+        self.records[key_uuid] = {'uuid': key_uuid,
+                                  'owner': self.owner,
+                                  'name': record['name'],
+                                  'value': record.get('value'),
+                                  '_created': record.get('_created'),
+                                  '_expires': record.get('_expires')}
+        return self.records[key_uuid]
+
+    def updateMetadata(self, uuid=None, body=None):
+        record = json.loads(body)
+        self.records[uuid].update({'name': record['name'],
+                                   'value': record.get('value'),
+                                   '_expires': record.get('_expires')})
+        return self.records[uuid]
+
+    def deleteMetadata(self, uuid=None):
+        del self.records[uuid]
+
+    def updateMetadataPermissions(self, uuid=None, body=None):
+        return {}
+
+
+class FakeProfiles(object):
+    def __init__(self, username):
+        self.username = username
+
+    def get(self):
+        return {'username': self.username}
+
+
+class FakeToken(object):
+    def __init__(self, token):
+        self.token_info = {'access_token': token,
+                           'created_at': time(),
+                           'expires_in': 14400}
+
+
+class FakeAgave(object):
+    """Minimal AgavePy client with in-memory actors, meta, and profiles"""
+
+    def __init__(self, username='taco', token='f4k3t0k3nV4lu3',
+                 api_server='https://api.example.com'):
+        self.username = username
+        self._token = token
+        self.api_server = api_server
+        self.token = FakeToken(token)
+        self.actors = FakeActors()
+        self.meta = FakeMeta(owner=username)
+        self.profiles = FakeProfiles(username)
@@ -0,0 +1,152 @@
+import os
+import sys
+from time import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+pytest.importorskip('aiohttp')
+
+import asyncio
+from agavepy.agave import AgaveError
+from reactors import utils
+from fakeabaco import FakeAbaco
+
+LATENCY = 0.2
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def abaco(loop):
+    server = FakeAbaco(latency=LATENCY)
+    loop.run_until_complete(server.start())
+    yield server
+    loop.run_until_complete(server.stop())
+
+
+@pytest.fixture
+def reactor(fake_client, monkeypatch, abaco):
+    monkeypatch.setenv('_abaco_access_token', 'f4k3t0k3nV4lu3')
+    monkeypatch.setenv('_abaco_api_server', abaco.url)
+    fake_client.api_server = abaco.url
+    return utils.Reactor(lazy=True)
+
+
+def test_asend_message(loop, abaco, reactor):
+    '''A message is posted with sender tags and the bearer token'''
+    async def send():
+        async with reactor.aio:
+            return await reactor.asend_message('actor-0', {'key': 'value'},
+                                               environment={'extra': 1})
+    exec_id = loop.run_until_complete(send())
+    assert exec_id is not None
+    sent = abaco.messages[0]
+    assert sent['body'] == {'message': {'key': 'value'}}
+    assert sent['environment']['extra'] == '1'
+    assert sent['environment']['x_session'] == reactor.session
+    assert sent['authorization'] == 'Bearer f4k3t0k3nV4lu3'
+
+
+def test_aio_send_messages_concurrent(loop, abaco, reactor):
+    '''Many sends share one loop and finish in about one round trip'''
+    messages = [('actor-{}'.format(i), {'n': i}) for i in range(50)]
+
+    async def send():
+        async with reactor.aio as aio:
+            return await aio.send_messages(messages)
+    start = time()
+    exec_ids = loop.run_until_complete(send())
+    assert time() - start < LATENCY * 5
+    assert len(set(exec_ids)) == 50
+    assert abaco.max_in_flight > 1
+
+
+def test_aio_retries_and_errors(loop, abaco, reactor):
+    '''Server errors are retried; 404 fails at once'''
+    async def send():
+        async with reactor.aio as aio:
+            return await aio.send_messages(
+                [('flaky', {}), ('missing', {})], retryDelay=0.01)
+    flaky, missing = loop.run_until_complete(send())
+    assert abaco.attempts['flaky'] == 2
+    assert flaky is not None and not isinstance(flaky, Exception)
+    assert isinstance(missing, AgaveError)
+    assert abaco.attempts['missing'] == 1
+
+    async def send_odd():
+        async with reactor.aio as aio:
+            return await aio.send_message('odd', {}, retryMaxAttempts=1,
+                                          retryDelay=0.01,
+                                          ignoreErrors=False)
+    with pytest.raises(AgaveError):
+        loop.run_until_complete(send_odd())
+    assert abaco.attempts['odd'] == 2
+
+
+def test_aio_send_messages_fixed_key(loop, abaco, reactor):
+    '''One string idempotency key for many messages is refused'''
+    async def send():
+        async with reactor.aio as aio:
+            return await aio.send_messages([('actor-0', {}), ('actor-1', {})],
+                                           idempotencyKey='order-42')
+    with pytest.raises(TypeError):
+        loop.run_until_complete(send())
+    assert abaco.messages == []
+
+
+def test_asend_message_ignore_errors(loop, abaco, reactor):
+    '''ignoreErrors controls whether a failed send raises'''
+    async def send(ignore):
+        async with reactor.aio:
+            return await reactor.asend_message('missing', {},
+                                               ignoreErrors=ignore)
+    assert loop.run_until_complete(send(True)) is None
+    with pytest.raises(AgaveError):
+        loop.run_until_complete(send(False))
+
+
+def test_aio_blocking_calls_off_loop(loop, abaco, reactor, monkeypatch):
+    '''Aliases, encoding, and shared breaker state stay off the loop'''
+    import threading
+    main = threading.current_thread()
+    threads = []
+    resolve = reactor.resolve_actor_alias
+    encode = reactor._encode_message
+
+    def resolving(alias):
+        threads.append(threading.current_thread())
+        return resolve(alias)
+
+    def encoding(message):
+        threads.append(threading.current_thread())
+        return encode(message)
+
+    monkeypatch.setattr(reactor, 'resolve_actor_alias', resolving)
+    monkeypatch.setattr(reactor, '_encode_message', encoding)
+    breaker = reactor.circuit_breaker
+    breaker.shared = True
+    allow = breaker.allow
+
+    def allowing(key):
+        threads.append(threading.current_thread())
+        return allow(key)
+
+    monkeypatch.setattr(breaker, 'allow', allowing)
+
+    async def send():
+        async with reactor.aio:
+            return await reactor.asend_message('actor-0', {})
+    assert loop.run_until_complete(send()) is not None
+    assert len(threads) == 3
+    assert main not in threads
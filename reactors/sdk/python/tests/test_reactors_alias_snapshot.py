@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import utils
+from reactors.aliases.store import AliasStore
+
+ALIASES = dict(('worker-{}'.format(i), 'actor-{}'.format(i))
+               for i in range(5))
+
+
+@pytest.fixture
+def client(fake_client, no_temp):
+    client = fake_client
+    listed = client.meta.listMetadata
+    client.meta.list_calls = 0
+
+    def counting(**kwargs):
+        client.meta.list_calls = client.meta.list_calls + 1
+        return listed(**kwargs)
+
+    client.meta.listMetadata = counting
+    writer = AliasStore(client, aliasPrefix='v1-alias-')
+    for alias, name in ALIASES.items():
+        writer.set_alias(alias, name)
+    # Keys under another prefix are not aliases
+    AliasStore(client, aliasPrefix='v2-alias-').set_alias('worker-0', 'x')
+    return client
+
+
+def test_preload(client):
+    '''Every alias resolves after one query'''
+    expected = dict((alias, AliasStore(client, aliasPrefix='v1-alias-')
+                     .get_name(alias)) for alias in ALIASES)
+    store = AliasStore(client, aliasPrefix='v1-alias-', preload=True)
+    calls = client.meta.list_calls
+    for alias in ALIASES:
+        assert store.get_name(alias) == expected[alias]
+    assert client.meta.list_calls == calls + 1
+    assert len(store.load_snapshot()) == len(ALIASES)
+
+
+def test_snapshot_misses_and_changes(client):
+    '''Unknown aliases are looked up one by one; changes are applied'''
+    store = AliasStore(client, aliasPrefix='v1-alias-', preload=True)
+    assert store.lookup_snapshot('unknown') is None
+    with pytest.raises(ValueError):
+        store.get_name('unknown')
+    store.set_alias('worker-0', 'actor-9')
+    assert 'actor-9' in store.lookup_snapshot('worker-0')
+    assert 'actor-9' in store.get_name('worker-0')
+    store.rem_alias('worker-1')
+    assert store.lookup_snapshot('worker-1') is None
+    assert AliasStore(client, aliasPrefix='v1-alias-').lookup_snapshot(
+        'worker-1') is None
+
+
+def test_reverse_index(client):
+    '''Aliases for an actor come from one query and stay current'''
+    store = AliasStore(client, aliasPrefix='v1-alias-')
+    store.set_alias('second-0', 'actor-0')
+    calls = client.meta.list_calls
+    assert store.get_aliases_for('actor-0') == ['second-0', 'worker-0']
+    assert store.get_aliases_for('actor-1') == ['worker-1']
+    assert store.get_aliases_for('unknown') == []
+    assert client.meta.list_calls == calls + 1
+    store.set_alias('worker-0', 'actor-1')
+    store.rem_alias('worker-1')
+    store.set_alias('new', 'actor-7')
+    calls = client.meta.list_calls
+    assert store.get_aliases_for('actor-0') == ['second-0']
+    assert store.get_aliases_for('actor-1') == ['worker-0']
+    assert store.get_aliases_for('actor-7') == ['new']
+    index = store.get_reverse_index()
+    assert index['actor-0'] == ['second-0']
+    assert 'x' not in index
+    assert client.meta.list_calls == calls
+
+
+def test_reverse_index_shared(client):
+    '''Removing an owned alias uncovers one shared under the same name'''
+    for alias, name in (('worker-1', 'actor-1'), ('worker-2', 'actor-9')):
+        record = client.meta.addMetadata(body=json.dumps({
+            'name': 'kvs_v3/v1-alias-{}#taco'.format(alias),
+            'value': '"{}"'.format(name)}))
+        record['owner'] = 'burrito'
+    store = AliasStore(client, aliasPrefix='v1-alias-')
+    assert store.get_aliases_for('actor-1') == ['worker-1']
+    assert store.get_aliases_for('actor-9') == []
+    store.rem_alias('worker-1')
+    store.rem_alias('worker-2')
+    calls = client.meta.list_calls
+    assert store.get_aliases_for('actor-1') == ['worker-1']
+    assert store.get_aliases_for('actor-2') == []
+    assert store.get_aliases_for('actor-9') == ['worker-2']
+    assert client.meta.list_calls == calls
+
+
+def test_background_refresh(client):
+    '''New aliases appear in the snapshot without a lookup'''
+    store = AliasStore(client, aliasPrefix='v1-alias-', preload=True,
+                       refreshInterval=0.05)
+    try:
+        assert store.lookup_snapshot('worker-new') is None
+        AliasStore(client, aliasPrefix='v1-alias-').set_alias(
+            'worker-new', 'actor-new')
+        deadline = time.time() + 5
+        while store.lookup_snapshot('worker-new') is None and \
+                time.time() < deadline:
+            time.sleep(0.01)
+        assert 'actor-new' in store.lookup_snapshot('worker-new')
+    finally:
+        store.stop_refresh()
+
+
+def test_resolve_actor_alias(client, fake_reactor):
+    '''With preload on, resolve_actor_alias answers from the snapshot'''
+    assert fake_reactor.resolve_actor_alias('worker-1') == 'worker-1'
+    fake_reactor.settings = {'aliases': {'live_fallback': True}}
+    assert fake_reactor.resolve_actor_alias('worker-1') == 'actor-1'
+    r = utils.Reactor(lazy=True)
+    r.settings = {'aliases': {'preload': True}}
+    calls = client.meta.list_calls
+    assert r.resolve_actor_alias('worker-1') == 'actor-1'
+    assert r.resolve_actor_alias('worker-2') == 'actor-2'
+    assert r.resolve_actor_alias('platform-alias') == 'platform-alias'
+    assert client.meta.list_calls == calls + 1
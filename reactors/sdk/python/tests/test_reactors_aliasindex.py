@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import aliasindex, utils
+from reactors.aliases.store import AliasStore
+
+
+@pytest.fixture
+def client(fake_client, no_temp):
+    store = AliasStore(fake_client, aliasPrefix='v1-alias-')
+    store.set_alias('worker', 'actor-0')
+    store.set_alias('Reporter', 'actor-1')
+    return fake_client
+
+
+@pytest.fixture
+def snapshot(client, tmpdir):
+    path = str(tmpdir.join('aliases.json'))
+    assert aliasindex.main(['-o', path]) == 0
+    return path
+
+
+def test_dump_and_load(snapshot):
+    '''Aliases are written without prefixes or quotes'''
+    with open(snapshot) as dumped:
+        document = json.load(dumped)
+    assert document['aliases'] == {'worker': 'actor-0',
+                                   'reporter': 'actor-1'}
+    assert document['prefix'] == 'v1-alias-'
+    index = aliasindex.load(snapshot)
+    assert len(index) == 2
+    assert index.get('Worker') == 'actor-0'
+    assert index.get('unknown') is None
+
+
+def test_freshness(tmpdir):
+    '''Snapshots older than max_age are not trusted'''
+    index = aliasindex.AliasIndex({'worker': 'actor-0'}, created=1000,
+                                  max_age=60)
+    assert not index.fresh
+    assert index.get('worker') is None
+    assert aliasindex.AliasIndex({'worker': 'actor-0'},
+                                 created=1000).get('worker') == 'actor-0'
+    assert aliasindex.load(str(tmpdir.join('missing.json'))) is None
+    tmpdir.join('bad.json').write('{"version": 99}')
+    assert aliasindex.load(str(tmpdir.join('bad.json'))) is None
+
+
+def test_resolve_from_snapshot(client, snapshot):
+    '''resolve_actor_alias uses the snapshot, then the live store if asked'''
+    calls = []
+    listed = client.meta.listMetadata
+
+    def counting(**kwargs):
+        calls.append(kwargs)
+        return listed(**kwargs)
+
+    client.meta.listMetadata = counting
+    r = utils.Reactor(lazy=True)
+    r.settings = {'aliases': {'snapshot': snapshot}}
+    assert r.resolve_actor_alias('worker') == 'actor-0'
+    assert r.resolve_actor_alias('reporter') == 'actor-1'
+    AliasStore(client, aliasPrefix='v1-alias-').set_alias('late', 'actor-2')
+    calls[:] = []
+    assert r.resolve_actor_alias('late') == 'late'
+    assert r.resolve_actor_alias('platform-alias') == 'platform-alias'
+    assert calls == []
+    r.settings = {'aliases': {'snapshot': snapshot, 'live_fallback': True}}
+    assert r.resolve_actor_alias('late') == 'actor-2'
+    assert r.resolve_actor_alias('platform-alias') == 'platform-alias'
+    # Without a snapshot file the same aliases resolve from the store
+    r = utils.Reactor(lazy=True)
+    r.settings = {'aliases': {'snapshot': snapshot + '.missing',
+                              'live_fallback': True}}
+    assert r.alias_index is None
+    assert r.resolve_actor_alias('worker') == 'actor-0'
+    assert r.resolve_actor_alias('late') == 'actor-2'
+    assert r.resolve_actor_alias('platform-alias') == 'platform-alias'
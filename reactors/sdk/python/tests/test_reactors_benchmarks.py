@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+import benchmarks
+
+
+def test_benchmarks_run_offline():
+    '''Hot-path cases run against the fake client and report timings'''
+    report = benchmarks.run(names=['reactor_init', 'send_message',
+                                   'keyval_get', 'uri_from_agave'],
+                            iterations=2)
+    assert list(report['results'].keys()) == ['reactor_init',
+                                              'send_message',
+                                              'keyval_get',
+                                              'uri_from_agave']
+    for result in report['results'].values():
+        assert result['iterations'] == 2
+        assert 0 <= result['min_usec'] <= result['median_usec'] \
+            <= result['max_usec']
+    json.dumps(report)
+
+
+def test_benchmarks_compare():
+    '''Comparison flags cases that slowed down past the threshold'''
+    baseline = {'results': {'fast': {'median_usec': 100.0},
+                            'slow': {'median_usec': 100.0},
+                            'same': {'median_usec': 100.0}}}
+    current = {'results': {'fast': {'median_usec': 50.0},
+                           'slow': {'median_usec': 150.0},
+                           'same': {'median_usec': 110.0},
+                           'added': {'median_usec': 1.0}}}
+    rows = benchmarks.compare(current, baseline, threshold=0.25)
+    status = dict((row['name'], row['status']) for row in rows)
+    assert status == {'fast': 'improved', 'slow': 'regressed',
+                      'same': 'ok', 'added': 'new'}
+
+
+def test_benchmarks_baseline_exit_code(tmpdir):
+    '''main() exits non-zero when a case regressed against the baseline'''
+    baseline = tmpdir.join('baseline.json')
+    baseline.write(json.dumps(
+        {'results': {'uri_to_agave': {'median_usec': 0.000001}}}))
+    output = tmpdir.join('results.json')
+    assert benchmarks.main(['-n', '2', '-k', 'uri_to_agave',
+                            '-b', str(baseline), '-o', str(output)]) == 1
+    report = json.loads(output.read())
+    assert report['comparison'][0]['status'] == 'regressed'
@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors.aliases.store import AliasStore
+from reactors.cache import TTLCache
+from fakeagave import FakeAgave
+
+
+class Loader(object):
+    '''Counts calls and returns values from a dict, else KeyError'''
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+
+    def __call__(self, key):
+        self.calls = self.calls + 1
+        return self.values[key]
+
+
+@pytest.fixture
+def temp(monkeypatch, tmpdir):
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeAgave()
+    listed = client.meta.listMetadata
+    client.meta.list_calls = 0
+
+    def counting(**kwargs):
+        client.meta.list_calls = client.meta.list_calls + 1
+        return listed(**kwargs)
+
+    client.meta.listMetadata = counting
+    return client
+
+
+def test_fetch_and_negative_caching():
+    '''Values and misses are each loaded once per TTL'''
+    cache = TTLCache()
+    load = Loader({'a': 1})
+    assert cache.fetch('a', lambda: load('a')) == 1
+    assert cache.fetch('a', lambda: load('a')) == 1
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            cache.fetch('b', lambda: load('b'))
+    assert load.calls == 2
+    assert cache.lookup('b') == (False, None)
+    assert cache.get('b', 'default') == 'default'
+
+
+def test_expiry_and_errors():
+    '''Expired entries are reloaded and failed loads are not cached'''
+    cache = TTLCache(ttl=0, negative_ttl=0)
+    cache.put('a', 1)
+    cache.put_missing('b')
+    assert cache.lookup('a') is None and cache.lookup('b') is None
+
+    def broken():
+        raise RuntimeError('service unavailable')
+
+    cache = TTLCache()
+    with pytest.raises(RuntimeError):
+        cache.fetch('a', broken)
+    assert cache.lookup('a') is None
+
+
+def test_lru_eviction():
+    '''The least recently used entry goes first'''
+    cache = TTLCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.lookup('b') is None
+
+
+def test_single_flight():
+    '''Concurrent fetches of one key share a single load'''
+    cache = TTLCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+
+    def fetch():
+        results.append(cache.fetch('a', slow))
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == ['value'] * 5
+
+
+def test_disk_tier(temp):
+    '''Executions in one container share entries through _REACTOR_TEMP'''
+    first = TTLCache(filename='.reactors-test-cache.json')
+    first.put('a', {'id': 'actor-0'})
+    first.put_missing('b')
+    second = TTLCache(filename='.reactors-test-cache.json')
+    assert second.get('a') == {'id': 'actor-0'}
+    assert second.lookup('b') == (False, None)
+    first.invalidate('a')
+    assert TTLCache(filename='.reactors-test-cache.json').lookup('a') is None
+
+
+def test_alias_cache(client, temp):
+    '''get_name hits the metadata service once per alias per TTL'''
+    aliases = AliasStore(client, aliasPrefix='v1-alias-')
+    aliases.set_alias('worker', 'actor-0')
+    calls = client.meta.list_calls
+    name = aliases.get_name('worker')
+    assert 'actor-0' in name
+    assert aliases.get_name('Worker') == name
+    assert client.meta.list_calls == calls + 1
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            aliases.get_name('missing')
+    assert client.meta.list_calls == calls + 2
+    # Another execution in the container reuses what was resolved
+    shared = AliasStore(client, aliasPrefix='v1-alias-', sharedCache=True)
+    shared.get_name('worker')
+    calls = client.meta.list_calls
+    assert AliasStore(client, aliasPrefix='v1-alias-',
+                      sharedCache=True).get_name('worker') == name
+    assert client.meta.list_calls == calls
+
+
+def test_alias_cache_invalidation(client):
+    '''Changing or removing an alias is seen at once'''
+    aliases = AliasStore(client, aliasPrefix='v1-alias-')
+    aliases.set_alias('worker', 'actor-0')
+    assert 'actor-0' in aliases.get_name('worker')
+    aliases.set_alias('worker', 'actor-1')
+    assert 'actor-1' in aliases.get_name('worker')
+    aliases.rem_alias('worker')
+    with pytest.raises(ValueError):
+        aliases.get_name('worker')
+    aliases.set_alias('worker', 'actor-2')
+    assert 'actor-2' in aliases.get_name('worker')
@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from agavepy.agave import AgaveError
+from requests.exceptions import HTTPError
+from reactors import circuit, utils
+from reactors.circuit import CircuitBreaker
+from fakeagave import FakeActors
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class DeadActors(FakeActors):
+    '''Every message to dead-actor fails; gone-actor does not exist'''
+    def __init__(self):
+        FakeActors.__init__(self)
+        self.attempts = 0
+
+    def sendMessage(self, actorId=None, body=None, environment=None):
+        self.attempts = self.attempts + 1
+        if actorId == 'dead-actor':
+            raise ValueError('service unavailable')
+        if actorId == 'gone-actor':
+            raise HTTPError('404 Not Found', response=FakeResponse(404))
+        return FakeActors.sendMessage(self, actorId, body, environment)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit, 'time', clock)
+    return clock
+
+
+def test_opens_after_threshold(clock, no_temp):
+    '''Consecutive failures open the circuit for the cool-down'''
+    breaker = CircuitBreaker(threshold=3, cooldown=10)
+    for attempt in range(2):
+        assert breaker.failure('a') is False
+    assert breaker.allow('a')
+    assert breaker.failure('a') is True
+    assert breaker.state('a') == circuit.OPEN
+    assert not breaker.allow('a')
+    assert breaker.allow('b')
+
+
+def test_success_resets_count(clock, no_temp):
+    '''Only consecutive failures count'''
+    breaker = CircuitBreaker(threshold=2, cooldown=10)
+    breaker.failure('a')
+    breaker.success('a')
+    breaker.failure('a')
+    assert breaker.state('a') == circuit.CLOSED
+
+
+def test_half_open_probe(clock, no_temp):
+    '''After cool-down one probe goes through; its result decides'''
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.failure('a')
+    clock.now = clock.now + 11
+    assert breaker.state('a') == circuit.HALF_OPEN
+    assert breaker.allow('a')
+    assert not breaker.allow('a')
+    breaker.failure('a')
+    assert breaker.state('a') == circuit.OPEN
+    clock.now = clock.now + 11
+    assert breaker.allow('a')
+    breaker.success('a')
+    assert breaker.state('a') == circuit.CLOSED
+    assert breaker.allow('a')
+
+
+def test_disabled(clock, no_temp):
+    '''A threshold of 0 never opens'''
+    breaker = CircuitBreaker(threshold=0)
+    for attempt in range(10):
+        breaker.failure('a')
+    assert breaker.allow('a')
+
+
+def test_shared_state(clock, tmpdir, monkeypatch):
+    '''Circuits opened by one execution are seen by the next'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    first = CircuitBreaker(threshold=1, cooldown=10, shared=True)
+    first.failure('a')
+    assert tmpdir.join(circuit.CACHE_FILE).check()
+    second = CircuitBreaker(threshold=1, cooldown=10, shared=True)
+    assert not second.allow('a')
+    clock.now = clock.now + 11
+    assert second.allow('a')
+    second.success('a')
+    assert first.allow('a')
+    unshared = CircuitBreaker(threshold=1, cooldown=10, shared=False)
+    unshared.failure('b')
+    assert second.allow('b')
+
+
+@pytest.fixture
+def reactor(fake_client, monkeypatch):
+    fake_client.actors = DeadActors()
+    monkeypatch.setattr(utils, 'sleep', lambda seconds: None)
+    r = utils.Reactor(lazy=True)
+    r.circuit_breaker = CircuitBreaker(threshold=2, cooldown=60)
+    return r
+
+
+def test_send_message_short_circuits(clock, no_temp, reactor):
+    '''Sends to a dead actor count once each and then fail at once'''
+    actors = reactor.client.actors
+    for attempt in range(2):
+        with pytest.raises(AgaveError) as excinfo:
+            reactor.send_message('dead-actor', {}, retryMaxAttempts=5,
+                                 ignoreErrors=False)
+        assert 'circuit open' not in str(excinfo.value)
+    assert actors.attempts == 12
+    with pytest.raises(AgaveError) as excinfo:
+        reactor.send_message('dead-actor', {}, ignoreErrors=False)
+    assert 'circuit open' in str(excinfo.value)
+    assert reactor.send_message('dead-actor', {}) is None
+    assert actors.attempts == 12
+    assert reactor.send_message('live-actor', {}) is not None
+    results = reactor.send_messages([('dead-actor', {}), ('live-actor', {})])
+    assert isinstance(results[0], AgaveError)
+    assert actors.attempts == 14
+
+
+def test_off_by_default(fake_reactor):
+    '''Reactors only short-circuit sends once a threshold is configured'''
+    assert fake_reactor.circuit_breaker.threshold == 0
+    actors = fake_reactor.client.actors = DeadActors()
+    for attempt in range(10):
+        assert fake_reactor.send_message('dead-actor', {},
+                                         retryMaxAttempts=0) is None
+    assert actors.attempts == 10
+
+
+def test_missing_actor_not_counted(clock, no_temp, reactor):
+    '''A 404 from a mistyped actor ID does not open the circuit'''
+    for attempt in range(3):
+        assert reactor.send_message('gone-actor', {}) is None
+    assert reactor.circuit_breaker.state('gone-actor') == circuit.CLOSED
+    assert reactor.client.actors.attempts == 3
+
+
+def test_shared_updates_not_lost(tmpdir, monkeypatch):
+    '''Executions sharing the file see each other's failures'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    breakers = [CircuitBreaker(threshold=10, shared=True) for _ in range(4)]
+    threads = [threading.Thread(
+        target=lambda b=b: [b.failure('a') for _ in range(5)])
+        for b in breakers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert breakers[0].state('a') == circuit.OPEN
+    assert breakers[0]._load('a')['failures'] == 20
@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import claimcheck, codec, utils
+from reactors.claimcheck import ClaimCheck, ENVELOPE_KEY
+
+BIG = {'data': 'x' * 100000, 'items': list(range(100))}
+
+
+class FakeResponse(object):
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, size):
+        for start in range(0, len(self.content), size):
+            yield self.content[start:start + size]
+
+
+class FakeFiles(object):
+    '''In-memory files service keyed by (system, path)'''
+    def __init__(self):
+        self.files = {}
+
+    def manage(self, systemId=None, body=None, filePath=None):
+        return {}
+
+    def importData(self, systemId=None, filePath=None, fileToUpload=None):
+        name = os.path.basename(fileToUpload.name)
+        data = fileToUpload.read()
+        fileToUpload.close()
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self.files[(systemId, os.path.join(filePath, name))] = data
+
+    def download(self, systemId=None, filePath=None):
+        return FakeResponse(self.files[(systemId, filePath)])
+
+    def delete(self, systemId=None, filePath=None):
+        del self.files[(systemId, filePath)]
+
+
+@pytest.fixture
+def client(fake_client):
+    fake_client.files = FakeFiles()
+    return fake_client
+
+
+def test_small_messages_pass(client, no_temp):
+    '''Only messages over the threshold are stored'''
+    checker = ClaimCheck(client, threshold=1024)
+    assert checker.check({'key': 'value'}) == {'key': 'value'}
+    assert checker.check('x' * 100) == 'x' * 100
+    assert not ClaimCheck(client, threshold=0).oversized(BIG)
+    assert client.meta.records == {}
+
+
+def test_keyval_round_trip(client, no_temp):
+    '''Payloads are split across keys and reassembled'''
+    checker = ClaimCheck(client, threshold=1024)
+    envelope = checker.check(BIG)
+    assert claimcheck.is_envelope(envelope)
+    claim = envelope[ENVELOPE_KEY]
+    assert claim['store'] == 'keyval'
+    assert claim['parts'] > 1
+    assert claim['size'] == len(codec.to_json(BIG))
+    assert len(json.dumps(envelope)) < 1024
+    assert ClaimCheck(client, cleanup=False).claim(envelope) == BIG
+    assert len(client.meta.records) == claim['parts']
+
+
+def test_digest_mismatch(client, no_temp):
+    '''A payload that does not match its digest is refused'''
+    envelope = ClaimCheck(client, threshold=1024).check(BIG)
+    envelope[ENVELOPE_KEY]['sha256'] = '0' * 64
+    with pytest.raises(ValueError):
+        ClaimCheck(client).claim(envelope)
+    envelope[ENVELOPE_KEY]['sha256'] = '../../etc/passwd'
+    with pytest.raises(ValueError):
+        ClaimCheck(client).claim(envelope)
+
+
+def test_claim_by_another_user(client, no_temp, monkeypatch):
+    '''Receivers running as another user are told who owns a payload'''
+    envelope = ClaimCheck(client, threshold=1024).check(BIG)
+    assert envelope[ENVELOPE_KEY]['owner'] == 'taco'
+    monkeypatch.setenv('_abaco_username', 'burrito')
+    with pytest.raises(ValueError) as excinfo:
+        ClaimCheck(client).claim(envelope)
+    assert 'stored by taco' in str(excinfo.value)
+    assert 'not burrito' in str(excinfo.value)
+
+
+def test_claims_are_cached(client, tmpdir, monkeypatch):
+    '''Claimed payloads are kept in _REACTOR_TEMP'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    envelope = ClaimCheck(client, threshold=1024).check(BIG)
+    assert ClaimCheck(client).claim(envelope) == BIG
+    client.meta.records.clear()
+    assert ClaimCheck(client).claim(envelope) == BIG
+
+
+def test_files_store(client, no_temp):
+    '''Payloads can be kept on an Agave storage system'''
+    with pytest.raises(ValueError):
+        ClaimCheck(client, threshold=1024, store='files').check(BIG)
+    checker = ClaimCheck(client, threshold=1024, store='files',
+                         system='data-sd2e-community', path='/claims')
+    envelope = checker.check(BIG)
+    ref = envelope[ENVELOPE_KEY]['ref']
+    assert ref.startswith('agave://data-sd2e-community/claims/claim-')
+    assert ClaimCheck(client).claim(envelope) == BIG
+    assert client.files.files == {}
+
+
+def test_claimed_payloads_removed(client, no_temp):
+    '''Claimed payloads are deleted; failing to do so is not an error'''
+    envelope = ClaimCheck(client, threshold=1024).check(BIG)
+    assert client.meta.records
+    assert ClaimCheck(client).claim(envelope) == BIG
+    assert client.meta.records == {}
+    checker = ClaimCheck(client, threshold=1024, store='files',
+                         system='data-sd2e-community', path='/claims')
+    envelope = checker.check(BIG)
+
+    def fail(systemId=None, filePath=None):
+        raise IOError('delete failed')
+
+    client.files.delete = fail
+    assert ClaimCheck(client).claim(envelope) == BIG
+
+
+def test_send_and_receive(client, no_temp):
+    '''send_message stores big messages; r.message fetches them back'''
+    utils.Reactor(lazy=True).send_message('actor-0', BIG)
+    assert client.actors.messages[-1]['body']['message'] == BIG
+    sender = utils.Reactor(lazy=True)
+    sender.settings = {'claimcheck': {'threshold': 65536}}
+    assert sender.send_message('actor-0', BIG) is not None
+    sent = client.actors.messages[-1]['body']['message']
+    assert claimcheck.is_envelope(sent)
+    sender.send_message('actor-0', {'key': 'value'})
+    assert client.actors.messages[-1]['body']['message'] == {'key': 'value'}
+
+    os.environ['MSG'] = json.dumps(sent)
+    receiver = utils.Reactor(lazy=True)
+    assert receiver.message == BIG
+    os.environ['MSG'] = '{"key": "value"}'
+    assert utils.Reactor(lazy=True).message == {'key': 'value'}
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import claimcheck, codec, utils
+from reactors.codec import Codec, ENVELOPE_KEY
+
+MANIFEST = {'manifest': [{'sample_id': 'sample.{:06d}'.format(i),
+                          'type': 'FCS', 'replicate': i % 3}
+                         for i in range(200)]}
+
+
+def test_round_trip():
+    '''Large messages are compressed and decode to the original'''
+    encoded = Codec(threshold=1024).encode(MANIFEST)
+    assert codec.is_envelope(encoded)
+    assert encoded[ENVELOPE_KEY]['size'] == len(codec.to_json(MANIFEST))
+    assert len(codec.to_json(encoded)) < len(codec.to_json(MANIFEST)) / 4
+    assert codec.decode(encoded) == MANIFEST
+
+
+def test_small_and_plain_messages_unchanged():
+    '''Small messages, and messages that would not shrink, go as they are'''
+    assert Codec(threshold=1024).encode({'key': 'value'}) == {'key': 'value'}
+    assert Codec(threshold=0).encode(MANIFEST) is MANIFEST
+    # Too short for zlib and base64 to pay for themselves
+    short = {'key': 'abcdefghijklmnopqrstuvwxyz'}
+    assert Codec(threshold=16).encode(short) is short
+    assert codec.decode(MANIFEST) is MANIFEST
+    assert codec.decode('plain text') == 'plain text'
+
+
+def test_bad_envelopes():
+    '''Envelopes that cannot be decoded raise ValueError'''
+    encoded = Codec(threshold=16).encode(MANIFEST)
+    encoded[ENVELOPE_KEY]['size'] = 1
+    with pytest.raises(ValueError):
+        codec.decode(encoded)
+    with pytest.raises(ValueError):
+        codec.decode({ENVELOPE_KEY: {'codec': 'lzma', 'data': ''}})
+    with pytest.raises(ValueError):
+        codec.decode({ENVELOPE_KEY: {'codec': 'zlib', 'data': 'bm9wZQ=='}})
+
+
+def test_send_and_receive(fake_client, no_temp):
+    '''Compressed sends are decoded by r.message, even via claim check'''
+    sender = utils.Reactor(lazy=True)
+    sender.message_codec = Codec(threshold=1024)
+    sender.send_message('actor-0', MANIFEST)
+    sent = fake_client.actors.messages[-1]['body']['message']
+    assert codec.is_envelope(sent)
+    os.environ['MSG'] = json.dumps(sent)
+    assert utils.Reactor(lazy=True).message == MANIFEST
+
+    sender.claim_check = claimcheck.ClaimCheck(fake_client, threshold=256)
+    sender.send_message('actor-0', MANIFEST)
+    sent = fake_client.actors.messages[-1]['body']['message']
+    assert claimcheck.is_envelope(sent)
+    os.environ['MSG'] = json.dumps(sent)
+    assert utils.Reactor(lazy=True).message == MANIFEST
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 HERE = os.path.dirname(os.path.abspath(__file__))
@@ -22,3 +23,56 @@ def test_read_override(monkeypatch):
     monkeypatch.setenv('_REACTOR_LOGS_LEVEL', 'INFO')
     p = Reactor()
     assert p.settings.logs.level == 'INFO'
+
+
+def test_read_config_cached(monkeypatch):
+    '''Repeat reads return equal but independent copies'''
+    from reactors import utils
+    first = utils.read_config()
+    second = utils.read_config()
+    assert first == second
+    assert first is not second
+    first.logs.level = 'CRITICAL'
+    assert utils.read_config().logs.level != 'CRITICAL'
+
+
+def test_read_config_env_invalidates(monkeypatch):
+    '''Changing an environment override is picked up'''
+    from reactors import utils
+    utils.read_config()
+    monkeypatch.setenv('_REACTOR_LOGS_LEVEL', 'WARNING')
+    assert utils.read_config().logs.level == 'WARNING'
+
+
+def test_read_config_snapshot(tmpdir, monkeypatch):
+    '''Merged file contents are snapshotted to and reused from scratch'''
+    from reactors import utils
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    monkeypatch.setenv('_REACTOR_KEY1', 'VewyVewySekwit')
+    monkeypatch.setattr(utils, '_config_snapshot', None)
+    settings = utils.read_config()
+    assert settings.key1 == 'VewyVewySekwit'
+    snapshot = tmpdir.join(utils.CONFIG_SNAPSHOT_FILE)
+    assert snapshot.check()
+    assert 'VewyVewySekwit' not in snapshot.read()
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError('config.yml was parsed again')
+    monkeypatch.setattr(utils, '_config_snapshot', None)
+    monkeypatch.setattr(utils.config, 'read_config', no_parse)
+    assert utils.read_config() == settings
+
+
+def test_read_config_no_files(tmpdir, monkeypatch):
+    '''Without a config file, no snapshot is written or trusted'''
+    from reactors import utils
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    monkeypatch.setattr(utils, '_config_snapshot', None)
+    empty = [str(tmpdir.mkdir('empty'))]
+    assert not utils.read_config(places_list=empty, env=False)
+    snapshot = tmpdir.join(utils.CONFIG_SNAPSHOT_FILE)
+    assert not snapshot.check()
+    files_key = utils._config_files_key(empty)
+    snapshot.write('{"key": ' + json.dumps(files_key) + ', "config": null}')
+    monkeypatch.setattr(utils, '_config_snapshot', None)
+    assert not utils.read_config(places_list=empty, env=False)
@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+from time import sleep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from agavepy.agave import AgaveError
+from reactors import utils
+from reactors.executions import ExecutionPoller, THREAD_NAME
+from fakeagave import FakeActors
+
+
+def _poller_threads():
+    return [t for t in threading.enumerate() if t.name == THREAD_NAME]
+
+
+@pytest.fixture
+def client(fake_client):
+    fake_client.actors = FakeActors(polls_to_complete=2)
+    return fake_client
+
+
+@pytest.fixture
+def reactor(client):
+    r = utils.Reactor(lazy=True)
+    r.execution_poller = ExecutionPoller(client, min_interval=0.01,
+                                         max_interval=0.05)
+    return r
+
+
+def test_one_poller_for_many_waits(client):
+    '''Concurrent waits share one thread and batch by actor'''
+    # Pollers left by earlier tests exit once they have nothing to watch
+    for _ in range(100):
+        if not _poller_threads():
+            break
+        sleep(0.1)
+    poller = ExecutionPoller(client, min_interval=0.01, max_interval=0.05)
+    exec_ids = [client.actors.sendMessage('actor-0', {})['executionId']
+                for i in range(5)]
+    watched = [poller.watch('actor-0', e) for e in exec_ids]
+    assert len(_poller_threads()) == 1
+    for execution in watched:
+        assert execution.wait(5)
+        assert execution.status == 'COMPLETE'
+        poller.release(execution)
+    assert client.actors.list_calls > 0
+    assert client.actors.status_calls == 0
+    sleep(0.1)
+    assert poller.pending() == 0
+    assert len(_poller_threads()) == 0
+
+
+def test_poller_backs_off(client):
+    '''The interval grows while nothing changes'''
+    client.actors.polls_to_complete = 1000
+    poller = ExecutionPoller(client, min_interval=0.01, max_interval=0.04)
+    exec_id = client.actors.sendMessage('actor-0', {})['executionId']
+    execution = poller.wait('actor-0', exec_id, timeout=0.3)
+    assert not execution.done()
+    assert client.actors.status_calls < 15
+    assert poller.interval == 0.04
+
+
+def test_send_message_sync(reactor):
+    '''sync=True returns the finished execution record'''
+    record = reactor.send_message('actor-0', {'key': 'value'}, sync=True,
+                                  syncTimeout=5)
+    assert record['status'] == 'COMPLETE'
+    assert record['id'] in reactor.client.actors.executions
+
+
+def test_send_message_sync_timeout(reactor):
+    '''An expired syncTimeout returns the latest record or raises'''
+    reactor.client.actors.polls_to_complete = 1000
+    record = reactor.send_message('actor-0', {}, sync=True, syncTimeout=0.1)
+    assert record['status'] != 'COMPLETE'
+    with pytest.raises(AgaveError):
+        reactor.send_message('actor-0', {}, sync=True, syncTimeout=0.1,
+                             ignoreErrors=False)
+    assert reactor.execution_poller.pending() == 0
+
+
+def test_send_messages_sync(reactor):
+    '''Bulk sends can wait on all their executions through one poller'''
+    messages = [('actor-{}'.format(i % 2), {'n': i}) for i in range(6)]
+    records = reactor.send_messages(messages, sync=True, syncTimeout=5)
+    assert [r['status'] for r in records] == ['COMPLETE'] * 6
+    assert [r['actorId'] for r in records] == \
+        ['actor-0', 'actor-1'] * 3
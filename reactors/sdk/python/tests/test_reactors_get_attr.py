@@ -0,0 +1,79 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import utils
+from requests.exceptions import HTTPError
+
+
+class FakeResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def client(fake_client):
+    client = fake_client
+    get = client.actors.get
+    client.actors.get_calls = []
+
+    def counting(actorId=None):
+        client.actors.get_calls.append(actorId)
+        if actorId.startswith('gone-'):
+            raise HTTPError('404 Not Found', response=FakeResponse(404))
+        if actorId.startswith('broken-'):
+            raise HTTPError('502 Bad Gateway', response=FakeResponse(502))
+        return get(actorId=actorId)
+
+    client.actors.get = counting
+    return client
+
+
+@pytest.fixture
+def reactor(client):
+    return utils.Reactor(lazy=True)
+
+
+def test_get_attr_cached(client, reactor):
+    '''Each actor is fetched once per TTL'''
+    assert reactor.get_attr('owner', actorId='actor-0') == 'taco'
+    record = reactor.get_attr(actorId='actor-0')
+    assert record['name'] == 'fake-actor-0'
+    record['name'] = 'changed'
+    assert reactor.get_attr('name', actorId='actor-0') == 'fake-actor-0'
+    assert client.actors.get_calls == ['actor-0']
+
+
+def test_missing_and_failing_actors(client, reactor):
+    '''Missing actors are remembered; failures are not'''
+    for _ in range(2):
+        assert reactor.get_attr('owner', actorId='gone-0') is None
+        assert reactor.get_attr('owner', actorId='broken-0') is None
+    assert client.actors.get_calls == ['gone-0', 'broken-0', 'broken-0']
+
+
+def test_get_attrs(client, reactor):
+    '''Many actors are fetched in parallel, each only once'''
+    ids = ['actor-{}'.format(i) for i in range(10)]
+    owners = reactor.get_attrs(ids + ids[:3] + ['gone-0'], 'owner')
+    assert owners == dict([(i, 'taco') for i in ids] + [('gone-0', None)])
+    assert sorted(client.actors.get_calls) == sorted(ids + ['gone-0'])
+    records = reactor.get_attrs(ids)
+    assert records['actor-3']['name'] == 'fake-actor-3'
+    assert len(client.actors.get_calls) == 11
+    assert reactor.get_attrs([]) == {}
+
+
+def test_shared_tier(client, monkeypatch, tmpdir):
+    '''Executions in one container can share descriptions'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    for _ in range(2):
+        r = utils.Reactor(lazy=True)
+        r.settings = {'actors': {'shared': True}}
+        assert r.get_attr('owner', actorId='actor-0') == 'taco'
+    assert client.actors.get_calls == ['actor-0']
@@ -0,0 +1,37 @@
+import os
+import sys
+from past.builtins import basestring
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.append('/reactors')
+import pytest
+from reactors import hostinfo, storage
+
+
+def test_local_ip():
+    '''Local discovery returns a string without network access'''
+    address = hostinfo.local_ip()
+    assert address is None or isinstance(address, basestring)
+
+
+def test_literal_address():
+    '''A literal address is used as-is and nothing is resolved'''
+    host = hostinfo.HostIdentity('192.0.2.10')
+    assert host.ip == '192.0.2.10'
+    assert host._thread is None
+
+
+def test_background_resolve_is_cached(tmpdir, monkeypatch):
+    '''Resolved address is written to _REACTOR_TEMP and reused'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    monkeypatch.setattr(hostinfo, 'local_ip', lambda: '192.0.2.20')
+    host = hostinfo.HostIdentity('auto')
+    assert host.wait(timeout=5) == '192.0.2.20'
+    cached = storage.read_cache(hostinfo.CACHE_FILE)
+    assert cached['host_ip'] == '192.0.2.20'
+    monkeypatch.setattr(hostinfo, 'local_ip', lambda: '192.0.2.30')
+    again = hostinfo.HostIdentity('auto')
+    assert again._thread is None
+    assert again.ip == '192.0.2.20'
@@ -0,0 +1,109 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import idempotency, utils
+from reactors.aliases.agavedb import AgaveKeyValStore
+from reactors.idempotency import ENV_VAR, SeenKeys
+
+
+@pytest.fixture
+def client(fake_client, monkeypatch, tmpdir):
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    return fake_client
+
+
+def test_derive_key():
+    '''Keys depend on recipient, session, and content, not key order'''
+    key = idempotency.derive_key('actor-0', 'session-0', {'a': 1, 'b': 2})
+    assert len(key) == idempotency.KEY_CHARS
+    assert key == idempotency.derive_key('actor-0', 'session-0',
+                                         {'b': 2, 'a': 1})
+    assert key != idempotency.derive_key('actor-1', 'session-0',
+                                         {'a': 1, 'b': 2})
+    assert key != idempotency.derive_key('actor-0', 'session-1',
+                                         {'a': 1, 'b': 2})
+
+
+def test_local_store(tmpdir):
+    '''Keys are seen once per TTL, by any execution sharing the file'''
+    path = str(tmpdir.join('seen.sqlite'))
+    seen = SeenKeys(path=path)
+    assert not seen.seen('key-0')
+    assert seen.check_and_add('key-0')
+    assert not seen.check_and_add('key-0')
+    assert SeenKeys(path=path).seen('key-0')
+    expiring = SeenKeys(path=path, ttl=0)
+    assert expiring.check_and_add('key-1')
+    assert expiring.check_and_add('key-1')
+    assert expiring.purge() == 1
+
+
+def test_keyval_store(client):
+    '''Keys can be shared between hosts in the key/value store'''
+    with pytest.raises(ValueError):
+        SeenKeys(store='keyval')
+    seen = SeenKeys(store='keyval', keyval=AgaveKeyValStore(client))
+    assert seen.check_and_add('key-0')
+    assert not seen.check_and_add('key-0')
+    assert seen.seen('key-0')
+    assert not seen.seen('key-1')
+
+
+def test_keyval_purge(client):
+    '''Expired keys are deleted from the keyval store now and then'''
+    keyval = AgaveKeyValStore(client)
+    keyval.set('other-key', '0')
+    assert keyval.get('other-key') == '"0"'
+    assert keyval.getvalue('other-key') == '0'
+    expiring = SeenKeys(store='keyval', keyval=keyval, ttl=0, purge_odds=0)
+    for n in range(3):
+        assert expiring.check_and_add('key-{}'.format(n))
+    seen = SeenKeys(store='keyval', keyval=keyval, purge_odds=1)
+    assert seen.check_and_add('key-3')
+    assert sorted(keyval.getall()) == \
+        ['idem-' + idempotency.compact('key-3'), 'other-key']
+    assert not seen.check_and_add('key-3')
+    assert seen.purge() == 0
+
+
+def test_send_message_keys(client):
+    '''Senders attach derived or given keys when asked'''
+    r = utils.Reactor(lazy=True)
+    r.send_message('actor-0', {'n': 1})
+    assert ENV_VAR not in client.actors.messages[-1]['environment']
+    r.send_message('actor-0', {'n': 1}, idempotencyKey=True)
+    r.send_message('actor-0', {'n': 1}, idempotencyKey=True)
+    keys = [m['environment'][ENV_VAR] for m in client.actors.messages[1:]]
+    assert keys[0] == keys[1]
+    r.send_message('actor-0', {'n': 1}, idempotencyKey='order-42')
+    assert client.actors.messages[-1]['environment'][ENV_VAR] == \
+        'order-42'
+    r.send_messages([('actor-0', {'n': 1}), ('actor-0', {'n': 2})],
+                    idempotencyKey=True)
+    keys = [m['environment'][ENV_VAR]
+            for m in client.actors.messages[-2:]]
+    assert keys[0] != keys[1]
+    with pytest.raises(TypeError):
+        r.send_messages([('actor-0', {'n': 1}), ('actor-0', {'n': 2})],
+                        idempotencyKey='order-42')
+    sent = len(client.actors.messages)
+    r.send_messages([('actor-0', {'n': 3}, {ENV_VAR: 'order-43'})],
+                    idempotencyKey=True)
+    assert len(client.actors.messages) == sent + 1
+    assert client.actors.messages[-1]['environment'][ENV_VAR] == \
+        'order-43'
+
+
+def test_is_duplicate(client):
+    '''Receivers drop a message whose key they have processed'''
+    assert not utils.Reactor(lazy=True).is_duplicate()
+    os.environ[ENV_VAR] = 'order-42'
+    assert not utils.Reactor(lazy=True).is_duplicate()
+    assert utils.Reactor(lazy=True).is_duplicate()
+    assert not utils.Reactor(lazy=True).is_duplicate('order-43')
@@ -0,0 +1,73 @@
+import os
+import sys
+from time import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.append('/reactors')
+import pytest
+from reactors import identity
+
+
+class FakeProfiles(object):
+    def __init__(self):
+        self.calls = 0
+
+    def get(self):
+        self.calls = self.calls + 1
+        return {'username': 'taco'}
+
+
+class FakeClient(object):
+    def __init__(self, token='VewyVewySekwitToken'):
+        self._token = token
+        self.username = None
+        self.api_server = 'https://api.sd2e.org'
+        self.created_at = time()
+        self.expires_in = 3600
+        self.profiles = FakeProfiles()
+
+
+@pytest.fixture
+def no_abaco_env(monkeypatch):
+    monkeypatch.delenv('_abaco_username', raising=False)
+    monkeypatch.delenv('_abaco_access_token', raising=False)
+    monkeypatch.setattr(identity, '_identities', {})
+
+
+def test_username_cached_in_memory(no_abaco_env):
+    '''profiles is called once per token'''
+    client = FakeClient()
+    assert identity.get_username(client) == 'taco'
+    assert identity.get_username(client) == 'taco'
+    assert client.profiles.calls == 1
+
+
+def test_username_cached_on_disk(no_abaco_env, tmpdir, monkeypatch):
+    '''A new process with the same token reads the cache file'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    identity.get_username(FakeClient())
+    assert 'VewyVewySekwitToken' not in tmpdir.join(
+        identity.CACHE_FILE).read()
+    monkeypatch.setattr(identity, '_identities', {})
+    client = FakeClient()
+    assert identity.get_username(client) == 'taco'
+    assert client.profiles.calls == 0
+
+
+def test_expired_token_not_reused(no_abaco_env):
+    '''Records expire with the token'''
+    client = FakeClient()
+    client.created_at = time() - 7200
+    identity.get_username(client)
+    identity.get_username(client)
+    assert client.profiles.calls == 2
+
+
+def test_username_from_env(no_abaco_env, monkeypatch):
+    '''The Abaco environment wins over everything else'''
+    monkeypatch.setenv('_abaco_username', 'burrito')
+    client = FakeClient()
+    assert identity.get_username(client) == 'burrito'
+    assert client.profiles.calls == 0
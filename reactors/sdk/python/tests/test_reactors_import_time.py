@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+import pytest
+
+# Importing the runtime must not pull these in
+HEAVY_MODULES = ('agavepy', 'jsonschema', 'requests', 'requests_futures',
+                 'hashids', 'petname', 'pytz', 'validators', 'tacconfig')
+# Cumulative import budget for reactors.runtime in microseconds
+IMPORT_BUDGET_USEC = 300000
+
+
+def importtime(statement):
+    '''Parse -X importtime output into {module: cumulative_usec}'''
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime',
+                             '-c', statement],
+                            cwd=PARENT,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    assert proc.returncode == 0, err
+    timings = {}
+    for line in err.decode('utf-8').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1].strip())
+        except ValueError:
+            continue
+        timings[fields[2].strip()] = cumulative
+    return timings
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason="Lazy imports rely on -X importtime and PEP 562")
+def test_runtime_import_is_lazy():
+    '''import reactors.runtime defers heavy dependencies'''
+    timings = importtime('import reactors.runtime')
+    assert 'reactors.runtime' in timings
+    for module in timings:
+        assert module.split('.')[0] not in HEAVY_MODULES, module
+    assert timings['reactors.runtime'] < IMPORT_BUDGET_USEC
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason="Lazy imports rely on PEP 562")
+def test_lazy_public_api():
+    '''Lazily resolved names are still importable from the runtime'''
+    from reactors.runtime import Agave, AgaveError, HTTPError, agaveutils
+    from agavepy.agave import AgaveError as _AgaveError
+    assert AgaveError is _AgaveError
+    assert agaveutils.uri.to_agave_uri('data-sd2e-community', '/sample') == \
+        'agave://data-sd2e-community/sample'
+
+
+def test_import_leaves_sys_path_alone():
+    '''Importing the SDK does not edit sys.path'''
+    statement = ('import sys; before = list(sys.path); '
+                 'import reactors.utils; assert sys.path == before')
+    subprocess.check_call([sys.executable, '-c', statement], cwd=PARENT)
@@ -110,3 +110,23 @@ def test_env_from_mock():
     assert os.environ.get('_abaco_access_token', None) == tok
     for k, v in ABACO_VARS_MAP.items():
         assert v in os.environ.keys()
+
+
+def test_init_lazy():
+    '''Lazy mode defers building components until first access'''
+    r = Reactor(lazy=True)
+    for attr in ('client', 'context', 'aliases', 'pemagent',
+                 'settings', 'loggers', 'nickname'):
+        assert attr not in r.__dict__
+    assert isinstance(r.local, bool)
+
+
+def test_init_lazy_on_access():
+    '''Lazy components are built and memoized on first access'''
+    r = Reactor(lazy=True)
+    assert isinstance(r.logger, Logger)
+    assert isinstance(r.context, AttrDict)
+    assert 'client' in r.__dict__
+    assert 'aliases' not in r.__dict__
+    assert 'pemagent' not in r.__dict__
+    assert r.logger is r.logger
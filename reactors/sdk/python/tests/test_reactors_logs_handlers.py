@@ -0,0 +1,80 @@
+import os
+import sys
+import logging
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.append('/reactors')
+from reactors import logtypes
+from reactors.logtypes.main import DynamicFieldsFilter
+
+NETWORK = {'logs': {'level': 'INFO', 'token': 'VewyVewySekwit'},
+           'logger': {'uri': 'http://127.0.0.1:9', 'path': '/logger'}}
+
+
+def _kinds(logger):
+    return sorted(type(h).__name__ for h in logger.handlers)
+
+
+def test_screen_logger_does_not_stack():
+    '''Building the same logger repeatedly keeps one STDERR handler'''
+    for attempt in range(5):
+        logger = logtypes.get_screen_logger('stack', 'once', settings={})
+    assert _kinds(logger) == ['StreamHandler']
+
+
+def test_screen_logger_network_reused():
+    '''The network handler is reused while its settings are unchanged'''
+    first = logtypes.get_screen_logger('stack', 'network', settings=NETWORK,
+                                       fields={'ip': lambda: '10.0.0.1'})
+    handlers = list(first.handlers)
+    second = logtypes.get_screen_logger('stack', 'network', settings=NETWORK,
+                                        fields={'ip': lambda: '10.0.0.1'})
+    assert second.handlers == handlers
+    network = [h for h in second.handlers
+               if type(h).__name__ == 'LogstashPlaintextHandler']
+    assert len(network) == 1
+    assert len([f for f in network[0].filters
+                if isinstance(f, DynamicFieldsFilter)]) == 1
+
+
+def test_screen_logger_reconfigures(tmpdir):
+    '''Changed settings replace, and absent settings remove, handlers'''
+    settings = {'logs': dict(NETWORK['logs']), 'logger': NETWORK['logger']}
+    logger = logtypes.get_screen_logger('stack', 'reconf', settings=settings)
+    old_network = [h for h in logger.handlers
+                   if type(h).__name__ == 'LogstashPlaintextHandler'][0]
+    settings['logs']['token'] = 'AnothewSekwit'
+    settings['logs']['file'] = str(tmpdir.join('one.log'))
+    logger = logtypes.get_screen_logger('stack', 'reconf', settings=settings)
+    assert old_network not in logger.handlers
+    assert _kinds(logger) == ['FileHandler', 'LogstashPlaintextHandler',
+                              'StreamHandler']
+    settings['logs']['file'] = str(tmpdir.join('two.log'))
+    logger = logtypes.get_screen_logger('stack', 'reconf', settings=settings)
+    files = [h for h in logger.handlers if isinstance(h, logging.FileHandler)]
+    assert len(files) == 1
+    assert files[0].baseFilename.endswith('two.log')
+    logger = logtypes.get_screen_logger('stack', 'reconf', settings={})
+    assert _kinds(logger) == ['StreamHandler']
+
+
+def test_slack_logger_does_not_stack():
+    '''Building the Slack logger repeatedly keeps one Slack handler'''
+    for attempt in range(3):
+        logger = logtypes.get_slack_logger('stack', 'slack',
+                                           settings={'slack': {}})
+    assert _kinds(logger) == ['SlackHandler']
+
+
+def test_keyval_store_levels():
+    '''Each kind of store keeps its level and all share one handler'''
+    from reactors.aliases.agavedb.keyval import AgaveKeyValStore, LOGGER
+    quiet = AgaveKeyValStore(None, aliasPrefix='quiet-', logLevel='ERROR')
+    for attempt in range(3):
+        chatty = AgaveKeyValStore(None, aliasPrefix='chatty-',
+                                  logLevel='DEBUG')
+    assert quiet.logging.level == logging.ERROR
+    assert chatty.logging.level == logging.DEBUG
+    assert _kinds(logging.getLogger(LOGGER)) == ['StreamHandler']
+    assert quiet.logging.handlers == chatty.logging.handlers == []
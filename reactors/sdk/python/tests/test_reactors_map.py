@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import scatter, utils
+from fakeagave import preserved_environ
+
+
+def run_workers(client, handler):
+    '''Run handler in a worker Reactor for every message sent'''
+    send = client.actors.sendMessage
+    lock = threading.Lock()
+
+    def send_and_run(actorId=None, body=None, environment=None):
+        response = send(actorId=actorId, body=body, environment=environment)
+        # Workers share os.environ, so run them one at a time
+        with lock, preserved_environ():
+            os.environ['MSG'] = json.dumps(body['message'])
+            os.environ.update(environment)
+            handler(utils.Reactor(lazy=True))
+        return response
+
+    client.actors.sendMessage = send_and_run
+
+
+@pytest.fixture
+def client(fake_client, no_temp):
+    return fake_client
+
+
+@pytest.fixture
+def reactor(client):
+    return utils.Reactor(lazy=True)
+
+
+def test_chunked():
+    '''Items are split into chunks of at most chunk_size'''
+    assert scatter.chunked(range(5), 2) == [[0, 1], [2, 3], [4]]
+    assert scatter.chunked([], 3) == []
+    assert scatter.chunked('ab', 0) == [['a'], ['b']]
+
+
+def test_map_gathers_results(client, reactor):
+    '''Every chunk is sent once and its worker's result comes back'''
+    run_workers(client, lambda worker: worker.map_result(
+        sum(worker.message[scatter.ITEMS_KEY])))
+    results = list(reactor.map('actor-0', range(10), chunk_size=3,
+                               maxWorkers=2))
+    assert len(client.actors.messages) == 4
+    assert sorted(r.index for r in results) == [0, 1, 2, 3]
+    for r in results:
+        assert r.ok
+        assert r.result == sum(r.items)
+        assert r.record['status'] == 'COMPLETE'
+    env = client.actors.messages[0]['environment']
+    assert env[scatter.MAP_ID_VAR]
+    assert env[scatter.USER_VAR] == 'taco'
+    assert env['x_session'] == reactor.session
+    assert client.meta.records == {}
+
+
+def test_large_results_are_claim_checked(client, reactor):
+    '''Results too big for one key/value entry go by claim check'''
+    reactor.claim_check.threshold = 1024
+    run_workers(client, lambda worker: worker.map_result(
+        ['x' * 100] * 100))
+    result = next(reactor.map('actor-0', [1]))
+    assert result.ok
+    assert result.result == ['x' * 100] * 100
+
+
+def test_worker_without_result(client, reactor):
+    '''Chunks whose worker stored nothing finish with result None'''
+    results = list(reactor.map('actor-0', ['a', 'b'], chunk_size=1))
+    assert [r.ok for r in results] == [True, True]
+    assert [r.result for r in results] == [None, None]
+    sent = [m['body']['message'] for m in client.actors.messages]
+    assert sorted(m['items'] for m in sent) == [['a'], ['b']]
+
+
+def test_map_timeout(client, reactor):
+    '''Chunks that do not finish in time carry an error'''
+    client.actors.polls_to_complete = 1000
+    results = list(reactor.map('actor-0', range(3), timeout=0.2))
+    assert len(results) == 3
+    assert not any(r.ok for r in results)
+    assert all(isinstance(r.error, utils.AgaveError) for r in results)
+
+
+def test_map_result_outside_map(reactor):
+    '''map_result does nothing in an execution not started by map'''
+    assert reactor.map_result({'key': 'value'}) is None
+
+
+def test_map_result_other_user(client, monkeypatch):
+    '''Workers running as another user refuse to store a result'''
+    monkeypatch.setenv(scatter.MAP_ID_VAR, 'map-0')
+    monkeypatch.setenv(scatter.CHUNK_VAR, '0')
+    monkeypatch.setenv(scatter.USER_VAR, 'taco')
+    assert utils.Reactor(lazy=True).map_result(1) == \
+        scatter.result_key('map-0', '0')
+    monkeypatch.setenv('_abaco_username', 'burrito')
+    with pytest.raises(ValueError) as excinfo:
+        utils.Reactor(lazy=True).map_result(1)
+    assert 'sent by taco' in str(excinfo.value)
+
+
+def test_map_stops_when_caller_does(client, reactor):
+    '''Closing the generator ends the waits of chunks still in flight'''
+    client.actors.polls_to_complete = 1000
+    send = client.actors.sendMessage
+
+    def first_finishes(actorId=None, body=None, environment=None):
+        response = send(actorId=actorId, body=body, environment=environment)
+        if len(client.actors.messages) == 1:
+            client.actors.executions[response['executionId']]['checks'] = \
+                1000
+        return response
+
+    client.actors.sendMessage = first_finishes
+    before = threading.active_count()
+    results = reactor.map('actor-0', range(4), maxWorkers=4)
+    assert next(results).ok
+    results.close()
+    deadline = time.time() + 5
+    while threading.active_count() > before and time.time() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() <= before
+    assert reactor.execution_poller.pending() == 0
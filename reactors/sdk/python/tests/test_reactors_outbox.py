@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import sys
+import threading
+
+from contextlib import closing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from reactors import outbox, utils
+from reactors.outbox import Outbox, THREAD_NAME
+
+
+class Sender(object):
+    '''Records batches, failing every message while down is True'''
+    def __init__(self, down=False):
+        self.down = down
+        self.batches = []
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        if self.down:
+            return [ValueError('service unavailable')] * len(batch)
+        return ['exec-{}'.format(item[1]['n']) for item in batch]
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(outbox, 'MIN_BACKOFF', 0.01)
+    monkeypatch.setattr(outbox, 'MAX_BACKOFF', 0.05)
+
+
+@pytest.fixture
+def reactor(fake_client, monkeypatch, tmpdir):
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    return utils.Reactor(lazy=True)
+
+
+def test_drains_in_batches(tmpdir):
+    '''Queued messages are all sent, in order, in bounded batches'''
+    sender = Sender()
+    queue = Outbox(sender, path=str(tmpdir.join('outbox.sqlite')),
+                   batch_size=2)
+    for n in range(5):
+        queue.put('actor-0', {'n': n}, {'x_session': 'abc'})
+    assert queue.flush(5) == 0
+    sent = [item for batch in sender.batches for item in batch]
+    assert [item[1]['n'] for item in sent] == list(range(5))
+    assert sent[0] == ('actor-0', {'n': 0}, {'x_session': 'abc'})
+    assert max(len(batch) for batch in sender.batches) <= 2
+    assert not [t for t in threading.enumerate() if t.name == THREAD_NAME]
+
+
+def test_gives_up_after_max_attempts(tmpdir, fast_backoff):
+    '''Failed messages are retried with backoff, then set aside'''
+    sender = Sender(down=True)
+    queue = Outbox(sender, path=str(tmpdir.join('outbox.sqlite')),
+                   max_attempts=3)
+    queue.put('actor-0', {'n': 0})
+    assert queue.flush(5) == 0
+    assert len(sender.batches) == 3
+    failed = queue.failed()
+    assert len(failed) == 1
+    assert failed[0]['attempts'] == 3
+    assert failed[0]['message'] == {'n': 0}
+    assert 'service unavailable' in failed[0]['last_error']
+
+
+def test_failed_messages_capped(tmpdir, fast_backoff):
+    '''Only the newest max_failed failed messages are kept'''
+    queue = Outbox(Sender(down=True), path=str(tmpdir.join('outbox.sqlite')),
+                   max_attempts=1, max_failed=2)
+    for n in range(5):
+        queue.put('actor-0', {'n': n})
+    assert queue.flush(5) == 0
+    assert [m['message']['n'] for m in queue.failed()] == [3, 4]
+
+
+class Recording(sqlite3.Connection):
+    '''Connection that records each statement it executes'''
+    statements = []
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        return sqlite3.Connection.execute(self, sql, *args)
+
+
+def test_failed_update_rolled_back(tmpdir, monkeypatch):
+    '''A delivery that cannot be recorded is rolled back'''
+    path = str(tmpdir.join('outbox.sqlite'))
+    queue = Outbox(Sender(), path=path)
+    queue.put('actor-0', {'n': 0})
+    rows = queue._claim()
+
+    def broken(conn, rows, results, now):
+        conn.execute('DELETE FROM messages')
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(queue, '_record', broken)
+    monkeypatch.setattr(queue, '_connect', lambda: closing(
+        sqlite3.connect(path, isolation_level=None, factory=Recording)))
+    with pytest.raises(sqlite3.OperationalError):
+        queue._deliver(rows)
+    assert Recording.statements[-1] == 'ROLLBACK'
+    assert queue.pending() == 1
+
+
+def test_handoff_to_next_execution(tmpdir, fast_backoff):
+    '''What one execution could not send, the next one does'''
+    path = str(tmpdir.join('outbox.sqlite'))
+    first = Outbox(Sender(down=True), path=path)
+    first.put('actor-0', {'n': 0})
+    assert first.flush(0.2) == 1
+    sender = Sender()
+    second = Outbox(sender, path=path)
+    assert second.flush(5) == 0
+    assert sender.batches[0][0][1] == {'n': 0}
+
+
+def test_default_path(monkeypatch, tmpdir):
+    '''The outbox is only durable if it can live in _REACTOR_TEMP'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    assert outbox.default_path() == (
+        str(tmpdir.join(outbox.OUTBOX_FILE)), True)
+    monkeypatch.delenv('_REACTOR_TEMP')
+    assert outbox.default_path()[1] is False
+
+
+def test_send_message_outbox(reactor):
+    '''outbox=True returns at once and the message is sent later'''
+    assert reactor.send_message('actor-0', {'key': 'value'},
+                                outbox=True) is None
+    assert reactor.outbox.durable
+    assert reactor.flush_outbox(5) == 0
+    sent = reactor.client.actors.messages
+    assert len(sent) == 1
+    assert sent[0]['body'] == {'message': {'key': 'value'}}
+    assert sent[0]['environment']['x_session'] == reactor.session
+
+
+def test_outbox_off_by_default(reactor):
+    '''Without outbox config, sends go out directly'''
+    assert reactor.send_message('actor-0', {}) is not None
+    assert 'outbox' not in reactor.__dict__
+    assert reactor.flush_outbox() == 0
+
+
+def test_on_success_flushes(reactor):
+    '''Queued messages are sent before the execution exits'''
+    reactor.send_message('actor-0', {'n': 1}, outbox=True)
+    with pytest.raises(SystemExit):
+        reactor.on_success('done')
+    assert len(reactor.client.actors.messages) == 1
@@ -0,0 +1,144 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from agavepy.agave import AgaveError
+from reactors import ratelimit, utils
+from reactors.agaveutils import files
+from reactors.circuit import CircuitBreaker
+from reactors.ratelimit import RetryBudget, TokenBucket
+from fakeagave import FakeAgave, FakeActors
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept = self.slept + seconds
+        self.now = self.now + seconds
+
+
+class DeadActors(FakeActors):
+    '''Every message fails'''
+    def __init__(self):
+        FakeActors.__init__(self)
+        self.attempts = 0
+
+    def sendMessage(self, actorId=None, body=None, environment=None):
+        self.attempts = self.attempts + 1
+        raise ValueError('service unavailable')
+
+
+class DeadFiles(object):
+    '''Every files call fails'''
+    def __init__(self):
+        self.attempts = 0
+
+    def manage(self, **kwargs):
+        self.attempts = self.attempts + 1
+        raise ValueError('service unavailable')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    monkeypatch.setattr(ratelimit, 'sleep', clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def limiters(monkeypatch):
+    '''Keep limiters configured by a test away from other tests'''
+    monkeypatch.setattr(ratelimit, '_limiters', {})
+
+
+def test_bucket_paces_after_burst(clock):
+    '''Calls beyond the burst wait for the bucket to refill'''
+    bucket = TokenBucket(rate=2, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+    clock.now = clock.now + 10
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    bucket.acquire()
+    assert clock.slept == 0.5
+
+
+def test_bucket_disabled(clock):
+    '''A rate of 0 never waits'''
+    bucket = TokenBucket(rate=0, burst=1)
+    for attempt in range(10):
+        assert bucket.reserve() == 0
+
+
+def test_retry_budget(clock):
+    '''Retries are capped at a minimum plus a share of recent requests'''
+    budget = RetryBudget(ratio=0.5, minimum=1, window=10)
+    assert budget.retry()
+    assert not budget.retry()
+    for request in range(4):
+        budget.request()
+    assert budget.retry()
+    assert budget.retry()
+    assert not budget.retry()
+    clock.now = clock.now + 11
+    assert budget.retry()
+    assert not budget.retry()
+
+
+def test_configure_per_family(limiters):
+    '''Keys under a family override the shared ones'''
+    ratelimit.configure({'rate': 5, 'burst': 7, 'files': {'rate': 1}})
+    assert ratelimit.get_limiter('actors').bucket.rate == 5
+    assert ratelimit.get_limiter('files').bucket.rate == 1
+    assert ratelimit.get_limiter('files').bucket.burst == 7
+    with pytest.raises(ValueError):
+        ratelimit.get_limiter('jobs')
+
+
+def test_defaults_from_config(limiters):
+    '''Limiters are built from config.yml on first use'''
+    limiter = ratelimit.get_limiter('meta')
+    assert limiter.bucket.rate == ratelimit.DEFAULT_RATE
+    assert limiter.budget.minimum == ratelimit.DEFAULT_RETRY_MINIMUM
+    assert ratelimit.get_limiter('meta') is limiter
+
+
+def test_send_message_stops_when_budget_spent(fake_client, monkeypatch):
+    '''A spent retry budget ends the retry loop early'''
+    ratelimit.configure({'rate': 0, 'retry_ratio': 0, 'retry_minimum': 1})
+    fake_client.actors = DeadActors()
+    monkeypatch.setattr(utils, 'sleep', lambda seconds: None)
+    r = utils.Reactor(lazy=True)
+    r.circuit_breaker = CircuitBreaker(threshold=0)
+    with pytest.raises(AgaveError) as excinfo:
+        r.send_message('dead-actor', {}, retryMaxAttempts=5,
+                       ignoreErrors=False)
+    assert 'retry budget' in str(excinfo.value)
+    assert fake_client.actors.attempts == 2
+
+
+def test_files_retries_share_budget(limiters):
+    '''agaveutils.files retry loops draw from the files budget'''
+    ratelimit.configure({'rate': 0, 'retry_ratio': 0, 'retry_minimum': 2})
+    client = FakeAgave()
+    client.files = DeadFiles()
+    with pytest.raises(Exception):
+        files.mkdir(client, 'newdir', 'data-sd2e-community', delay=0)
+    assert client.files.attempts == 3
+    with pytest.raises(Exception):
+        files.mkdir(client, 'newdir', 'data-sd2e-community', delay=0)
+    assert client.files.attempts == 4
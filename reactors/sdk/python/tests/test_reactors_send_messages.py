@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+from time import sleep, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from agavepy.agave import AgaveError
+from reactors import utils
+from fakeagave import FakeActors
+
+SEND_LATENCY = 0.2
+
+
+class SlowActors(FakeActors):
+    '''Takes a while to answer and rejects messages to bad-actor'''
+    def __init__(self):
+        FakeActors.__init__(self)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def sendMessage(self, actorId=None, body=None, environment=None):
+        with self.lock:
+            self.in_flight = self.in_flight + 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            sleep(SEND_LATENCY)
+            if actorId == 'bad-actor':
+                raise ValueError('no such actor')
+            return FakeActors.sendMessage(self, actorId, body, environment)
+        finally:
+            with self.lock:
+                self.in_flight = self.in_flight - 1
+
+
+@pytest.fixture
+def reactor(fake_client):
+    fake_client.actors = SlowActors()
+    return utils.Reactor(lazy=True)
+
+
+def test_send_messages_concurrent(reactor):
+    '''Fan-out takes about as long as one send, not the sum of them'''
+    messages = [('actor-{}'.format(i), {'n': i}) for i in range(8)]
+    start = time()
+    exec_ids = reactor.send_messages(messages, maxWorkers=8)
+    elapsed = time() - start
+    assert len(exec_ids) == 8
+    assert all(exec_ids)
+    assert elapsed < SEND_LATENCY * 4
+    assert reactor.client.actors.max_in_flight > 1
+
+
+def test_send_messages_bounded(reactor):
+    '''No more than maxWorkers sends are in flight at once'''
+    messages = [('actor-{}'.format(i), {'n': i}) for i in range(6)]
+    reactor.send_messages(messages, maxWorkers=2)
+    assert reactor.client.actors.max_in_flight == 2
+
+
+def test_send_messages_order_and_errors(reactor):
+    '''Results come back in input order with errors in place'''
+    messages = [('actor-0', {'n': 0}),
+                ('bad-actor', {'n': 1}, {'extra': 'value'}),
+                ('actor-2', {'n': 2}, None)]
+    results = reactor.send_messages(messages, retryMaxAttempts=0)
+    assert isinstance(results[1], AgaveError)
+    sent = reactor.client.actors.messages
+    by_id = dict((m['actorId'], m) for m in sent)
+    assert sorted(by_id.keys()) == ['actor-0', 'actor-2']
+    assert by_id['actor-0']['body'] == {'message': {'n': 0}}
+    assert by_id['actor-2']['body'] == {'message': {'n': 2}}
+    assert results[0] != results[2]
+    for item in sent:
+        assert item['environment']['x_session'] == reactor.session
+
+
+def test_send_messages_environment_not_shared(reactor):
+    '''Each message gets its own copy of the environment it was given'''
+    environment = {'extra': 'value'}
+    reactor.send_messages([('actor-0', {}, environment)])
+    assert environment == {'extra': 'value'}
+    assert reactor.client.actors.messages[0]['environment']['extra'] == \
+        'value'
+
+
+def test_send_message_uses_shared_retries(reactor):
+    '''send_message still raises after retries when ignoreErrors=False'''
+    with pytest.raises(AgaveError):
+        reactor.send_message('bad-actor', {}, retryMaxAttempts=0,
+                             ignoreErrors=False)
+    assert reactor.send_message('bad-actor', {}, retryMaxAttempts=0) is None
+    assert reactor.send_message('actor-0', {}) is not None
+
+
+def test_size_connection_pool():
+    '''Pools are resized in place and again after a client refresh'''
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+    from reactors.agaveutils import size_connection_pool
+
+    class Client(object):
+        def __init__(self):
+            self.refresh_aris()
+
+        def refresh_aris(self):
+            session = Session()
+            session.mount('https://', HTTPAdapter(max_retries=3))
+            self.all = type('All', (object,), {})()
+            self.all.http_client = type('Http', (object,), {})()
+            self.all.http_client.session = session
+
+    client = Client()
+    adapter = client.all.http_client.session.get_adapter('https://')
+    assert size_connection_pool(client, 20) is True
+    assert client.all.http_client.session.get_adapter('https://') is adapter
+    assert adapter._pool_maxsize == 20
+    assert adapter.max_retries.total == 3
+    client.refresh_aris()
+    adapter = client.all.http_client.session.get_adapter('https://')
+    assert adapter._pool_maxsize == 20
+    assert adapter.max_retries.total == 3
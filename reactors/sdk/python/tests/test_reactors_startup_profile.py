@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.insert(0, HERE)
+sys.path.append('/reactors')
+import pytest
+from attrdict import AttrDict
+from reactors import storage
+from reactors.utils import Reactor, lazy_property
+
+
+def test_profile_records_phases():
+    '''Building a component records its phase timing'''
+    r = Reactor(lazy=True)
+    assert len(r.startup_profile.phases) == 0
+    r.settings
+    assert 'settings' in r.startup_profile.phases
+    assert r.startup_profile.phases['settings'] >= 0
+
+
+def test_profile_own_time(fake_client):
+    '''A phase leaves out components it built along the way'''
+    class Slow(Reactor):
+        @lazy_property
+        def settings(self):
+            time.sleep(0.5)
+            return AttrDict({})
+
+    # Leave out first-use imports
+    Reactor(lazy=True).aliases
+    r = Slow(lazy=True)
+    r.aliases
+    assert r.startup_profile.phases['settings'] >= 500
+    assert r.startup_profile.phases['aliases'] < 500
+    r.actor_cache
+    assert 'actor_cache' not in r.startup_profile.phases
+
+
+def test_profile_eager():
+    '''Eager init profiles every phase and the total'''
+    r = Reactor()
+    for phase in ('client', 'context', 'settings', 'redactions',
+                  'loggers', 'aliases'):
+        assert phase in r.startup_profile.phases
+    assert r.startup_profile.total > 0
+
+
+def test_profile_file(tmpdir, monkeypatch):
+    '''Profile is written as JSON into scratch when configured'''
+    monkeypatch.setattr(storage, 'paths',
+                        AttrDict({'reactor': {'scratch': str(tmpdir)}}))
+    r = Reactor(lazy=True)
+    r.settings = AttrDict({'logs': {'profile_file': 'profile.json'}})
+    r.report_startup_profile()
+    with open(os.path.join(str(tmpdir), 'profile.json')) as pfile:
+        profile = json.load(pfile)
+    assert profile['lazy'] is True
+    assert 'phases' in profile
+
+
+def test_lazy_property_builds_once():
+    '''Threads reading an unbuilt attribute at once share one build'''
+    class Thing(object):
+        builds = []
+
+        @lazy_property
+        def value(self):
+            self.builds.append(1)
+            time.sleep(0.05)
+            return object()
+
+    thing = Thing()
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(thing.value))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(Thing.builds) == 1
+    assert len(set(id(v) for v in values)) == 1
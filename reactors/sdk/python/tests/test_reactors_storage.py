@@ -0,0 +1,81 @@
+import errno
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+sys.path.append('/reactors')
+import pytest
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from reactors import storage
+
+
+def test_temp_created_on_first_use():
+    '''No temp directory exists until it is asked for'''
+    reactor = storage.ReactorPaths()
+    assert 'temp' not in reactor._resolved
+    assert reactor.usage() == 0
+    temp = reactor.temp
+    assert os.path.isdir(temp)
+    assert reactor.temp == temp
+    storage._remove_temp(temp, os.getpid())
+    assert not os.path.exists(temp)
+
+
+def test_env_override(tmpdir, monkeypatch):
+    '''Environment overrides are honored when first resolved'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    monkeypatch.setenv('_PROJ_CORRAL', str(tmpdir))
+    assert storage.ReactorPaths().scratch == str(tmpdir)
+    assert storage._env_dir('_PROJ_CORRAL', None) == str(tmpdir)
+    monkeypatch.setenv('_PROJ_STOCKYARD', str(tmpdir.join('missing')))
+    assert storage._env_dir('_PROJ_STOCKYARD', None) is None
+
+
+def test_quota(monkeypatch):
+    '''Writes beyond the quota are refused'''
+    monkeypatch.delenv('_REACTOR_TEMP', raising=False)
+    monkeypatch.setenv(storage.QUOTA_ENV, '1024')
+    reactor = storage.ReactorPaths()
+    assert reactor.check_quota(512) == 512
+    with open(os.path.join(reactor.temp, 'blob'), 'wb') as blob:
+        blob.write(b'x' * 1000)
+    assert reactor.usage() == 1000
+    with pytest.raises(OSError) as exc:
+        reactor.check_quota(512)
+    assert exc.value.errno == errno.EDQUOT
+    storage._remove_temp(reactor.temp, os.getpid())
+
+
+def test_quota_covers_sdk_writes(tmpdir, monkeypatch):
+    '''Cache files in _REACTOR_TEMP count toward the configured quota'''
+    monkeypatch.setenv('_REACTOR_TEMP', str(tmpdir))
+    monkeypatch.setattr(storage, 'paths', storage.LazyPaths(
+        {'reactor': storage.ReactorPaths}))
+    storage.configure({'quota': 100})
+    assert storage.write_cache('small.json', {'a': 1}) is True
+    assert storage.write_cache('large.json', {'a': 'x' * 200}) is False
+    assert not os.path.exists(str(tmpdir.join('large.json')))
+    assert storage.check_quota() < 100
+
+
+def test_paths_mapping():
+    '''paths keeps the mapping interface it had as an AttrDict'''
+    assert isinstance(storage.paths, Mapping)
+    assert sorted(storage.paths) == ['default', 'project', 'reactor', 'user']
+    assert len(storage.paths.project) == 2
+    assert dict(storage.paths.user)['work'] == storage.paths.user.work
+    assert storage.paths['user']['work'] == storage.paths.user.work
+    assert storage.paths.get('reactor') is storage.paths.reactor
+    assert storage.paths.get('missing', 'x') == 'x'
+    with pytest.raises(KeyError):
+        storage.paths['missing']
+    user = storage.LazyPaths({'work': os.getcwd})
+    user['work'] = '/tmp/work'
+    assert user.work == '/tmp/work'
+    with pytest.raises(KeyError):
+        user['other'] = '/tmp'
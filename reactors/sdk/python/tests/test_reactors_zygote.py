@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PARENT = os.path.dirname(HERE)
+sys.path.insert(0, PARENT)
+import pytest
+
+SCRIPT = '''
+import os
+import sys
+from reactors.runtime import Reactor
+msg = os.environ.get('MSG')
+sys.exit(0 if msg.startswith('ok') else 3)
+'''
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="Requires os.fork")
+def test_zygote_runs_each_message(tmpdir):
+    '''Each message runs in its own child and exit codes are collected'''
+    script = tmpdir.join('reactor.py')
+    script.write(SCRIPT)
+    messages = tmpdir.join('messages.jsonl')
+    messages.write('ok-1\nfail-2\n\nok-3\n')
+    output = tmpdir.join('results.json')
+    proc = subprocess.Popen([sys.executable, '-m', 'reactors.zygote',
+                             '-s', str(script), '-j', '2',
+                             '-o', str(output), str(messages)],
+                            cwd=PARENT,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    proc.communicate()
+    assert proc.returncode == 1
+    summary = json.loads(output.read())
+    assert summary['messages'] == 3
+    assert summary['failed'] == 1
+    assert [r['exit_code'] for r in summary['results']] == [0, 3, 0]
+    for result in summary['results']:
+        assert result['elapsed_msec'] >= 0
+
+
+HANDLERS = '''
+import atexit
+import os
+msg = os.environ.get('MSG')
+
+
+def mark(name):
+    open(os.path.join(os.environ['MARKS'], name), 'w').close()
+
+
+def fail():
+    raise RuntimeError('handler failed')
+
+
+atexit.register(mark, msg)
+atexit.register(fail)
+atexit.register(mark, 'unregistered')
+atexit.unregister(mark)
+atexit.register(mark, msg + '-last')
+'''
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="Requires os.fork")
+def test_zygote_runs_child_exit_handlers(tmpdir):
+    '''Handlers a child registers run when it exits, even if one fails'''
+    script = tmpdir.join('reactor.py')
+    script.write(HANDLERS)
+    messages = tmpdir.join('messages.jsonl')
+    messages.write('one\ntwo\n')
+    marks = tmpdir.mkdir('marks')
+    env = dict(os.environ, MARKS=str(marks))
+    proc = subprocess.Popen([sys.executable, '-m', 'reactors.zygote',
+                             '-s', str(script), str(messages)],
+                            cwd=PARENT, env=env,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    assert proc.returncode == 0
+    assert sorted(marks.listdir()) == [marks.join('one-last'),
+                                      marks.join('two-last')]
+    assert b'handler failed' in err